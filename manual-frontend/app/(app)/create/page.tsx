@@ -3,7 +3,7 @@
 import { useState, useEffect } from "react";
 import { useRouter } from "next/navigation";
 import { useAuth } from "../../../context/AuthContext";
-import { createManual, getManual, createContentBlock, listCategories, listTags, ContentBlockType, Category, Tag } from "../../../lib/api";
+import { createManual, getManual, bulkSaveBlocks, listCategories, listTags, ContentBlockType, Category, Tag } from "../../../lib/api";
 import Button from "../../components/ui/Button";
 import Input from "../../components/ui/Input";
 import { Card, CardContent, CardHeader, CardTitle } from "../../components/ui/Card";
@@ -155,18 +155,15 @@ export default function CreateManualPage() {
       const fullManual = await getManual(manual.slug);
       
       if (fullManual.current_version) {
-        // Create content blocks for the existing version
-        for (const block of contentBlocks) {
-          await createContentBlock({
-            version: fullManual.current_version,
-            type: mapToBackendType(block.type) as any,
-            data: { 
-              ...block.content, 
-              originalType: block.type // Store original frontend type
-            },
-            order: block.order,
-          });
-        }
+        // Save content blocks for the existing version in one request
+        await bulkSaveBlocks(fullManual.current_version, contentBlocks.map((block) => ({
+          type: mapToBackendType(block.type) as any,
+          data: { 
+            ...block.content, 
+            originalType: block.type // Store original frontend type
+          },
+          // No explicit order: the server spaces blocks out in list order
+        })));
       }
 
       // Redirect to manual view using slug
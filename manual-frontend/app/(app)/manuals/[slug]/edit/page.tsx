@@ -9,7 +9,7 @@ import {
   listContentBlocks, 
   updateManual, 
   createVersion, 
-  createContentBlock, 
+  bulkSaveBlocks, 
   updateContentBlock, 
   deleteContentBlock,
   Manual, 
@@ -161,20 +161,17 @@ export default function EditManualPage() {
         changelog: `Updated manual: ${contentBlocks.length} content blocks`,
       });
 
-      // Create all content blocks for the new version
+      // Save all content blocks for the new version in one request
       // This includes both existing blocks (with changes) and new blocks
       // Each edit creates a new version that inherits all previous content plus changes
-      for (const block of contentBlocks) {
-        await createContentBlock({
-          version: newVersion.id,
-          type: mapToBackendType(block.type) as any,
-          data: { 
-            ...block.content, 
-            originalType: block.type // Store original frontend type
-          },
-          order: block.order,
-        });
-      }
+      await bulkSaveBlocks(newVersion.id, contentBlocks.map((block) => ({
+        type: mapToBackendType(block.type) as any,
+        data: { 
+          ...block.content, 
+          originalType: block.type // Store original frontend type
+        },
+        // No explicit order: the server spaces blocks out in list order
+      })));
 
       // Redirect to manual view
       router.push(`/manuals/${manual.slug}`);
@@ -1,7 +1,7 @@
 'use client';
 
 import React from 'react';
-import { ContentBlock } from '@/lib/api';
+import { ContentBlock, imageProps } from '@/lib/api';
 
 interface ContentPreviewProps {
   blocks: ContentBlock[];
@@ -53,7 +53,7 @@ const ContentPreview: React.FC<ContentPreviewProps> = ({ blocks, className = ''
             {block.data?.src && (
               <div className="text-center">
                 <img
-                  src={block.data.src}
+                  {...imageProps(block)}
                   alt={block.data.alt || 'Manual image'}
                   className="max-w-full h-auto rounded-lg shadow-sm mx-auto"
                 />
@@ -1,7 +1,7 @@
 "use client";
 
 import { useState, useRef } from "react";
-import { ContentBlockType } from "../../../lib/api";
+import { ContentBlockType, assetSrc, uploadAsset } from "../../../lib/api";
 
 export interface ContentBlockData {
   id: string;
@@ -37,18 +37,21 @@ export default function ContentBlock({
     onUpdate(block.id, newContent);
   };
 
-  const handleImageUpload = (event: React.ChangeEvent<HTMLInputElement>) => {
+  const handleImageUpload = async (event: React.ChangeEvent<HTMLInputElement>) => {
     const file = event.target.files?.[0];
     if (file) {
-      const reader = new FileReader();
-      reader.onload = (e) => {
+      try {
+        // Stored once on the server; the block only keeps a reference
+        const asset = await uploadAsset(file);
         handleContentChange({
           ...block.content,
-          src: e.target?.result as string,
+          src: asset.url,
+          asset: asset.digest,
           alt: file.name,
         });
-      };
-      reader.readAsDataURL(file);
+      } catch (error) {
+        console.error('Image upload failed:', error);
+      }
     }
   };
 
@@ -137,7 +140,7 @@ export default function ContentBlock({
                     <div className="space-y-2">
                       <div className="relative inline-block">
                         <img
-                          src={block.content.src}
+                          src={assetSrc(block.content.src)}
                           alt={block.content.alt || 'Uploaded image'}
                           className="max-w-full max-h-64 h-auto rounded-lg border border-gray-200"
                         />
@@ -189,7 +192,7 @@ export default function ContentBlock({
                 {block.content?.src ? (
                   <div className="text-center">
                     <img
-                      src={block.content.src}
+                      src={assetSrc(block.content.src)}
                       alt={block.content.alt || 'Uploaded image'}
                       className="max-w-full h-auto rounded-lg mx-auto"
                     />
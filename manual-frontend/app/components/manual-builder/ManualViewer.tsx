@@ -1,6 +1,6 @@
 "use client";
 
-import { Manual, ManualVersion, ContentBlock } from "../../../lib/api";
+import { Manual, ManualVersion, ContentBlock, imageProps } from "../../../lib/api";
 import { useAuth } from "../../../context/AuthContext";
 import Button from "../ui/Button";
 
@@ -65,7 +65,7 @@ export default function ManualViewer({ manual, version, contentBlocks, onEdit }:
             {block.data?.src && (
               <div className="text-center">
                 <img
-                  src={block.data.src}
+                  {...imageProps(block)}
                   alt={block.data.alt || 'Manual image'}
                   className="max-w-full h-auto rounded-lg shadow-sm mx-auto"
                 />
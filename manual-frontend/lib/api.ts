@@ -185,6 +185,11 @@ export async function listManuals(): Promise<Manual[]> {
   return apiFetch<Manual[]>('/api/manuals/');
 }
 
+export async function searchManuals(query: string, limit = 50): Promise<Manual[]> {
+  const params = new URLSearchParams({ q: query, limit: String(limit) });
+  return apiFetch<Manual[]>(`/api/manuals/search/?${params.toString()}`);
+}
+
 export async function createManual(payload: { title: string; slug: string; department?: string }): Promise<Manual> {
   await ensureCsrf();
   return apiFetch<Manual>('/api/manuals/', { method: 'POST', body: JSON.stringify(payload) });
@@ -312,15 +317,38 @@ export type ManualVersion = {
   created_by: number;
 };
 
-export async function listVersions(): Promise<ManualVersion[]> {
-  return apiFetch<ManualVersion[]>('/api/versions/');
+// Server-side list filters; since (inclusive) and until (exclusive) take ISO dates or datetimes
+function filterQuery(filters: Record<string, string | number | boolean | undefined | null>): string {
+  const params = new URLSearchParams();
+  for (const [key, value] of Object.entries(filters)) {
+    if (value !== undefined && value !== null && value !== '') params.set(key, String(value));
+  }
+  const query = params.toString();
+  return query ? `?${query}` : '';
+}
+
+export type VersionFilters = { manual?: number; published?: boolean; since?: string; until?: string };
+
+export async function listVersions(filters: VersionFilters = {}): Promise<ManualVersion[]> {
+  return apiFetch<ManualVersion[]>(`/api/versions/${filterQuery(filters)}`);
 }
 
 export async function getVersion(id: number): Promise<ManualVersion> {
   return apiFetch<ManualVersion>(`/api/versions/${id}/`);
 }
 
-export async function createVersion(payload: { manual: number; changelog?: string }): Promise<ManualVersion> {
+export type BlockPatchOperation =
+  | { op: 'insert'; type: ContentBlockType; data?: any; order?: number }
+  | { op: 'update'; id: number; type?: ContentBlockType; data?: any }
+  | { op: 'delete'; id: number }
+  | { op: 'move'; id: number; order: number };
+
+export async function createVersion(payload: {
+  manual: number;
+  changelog?: string;
+  base_version?: number;
+  operations?: BlockPatchOperation[]
+}): Promise<ManualVersion> {
   await ensureCsrf();
   return apiFetch<ManualVersion>('/api/versions/', { method: 'POST', body: JSON.stringify(payload) });
 }
@@ -329,6 +357,73 @@ export async function previewVersion(id: number): Promise<ManualVersion> {
   return apiFetch<ManualVersion>(`/api/versions/${id}/preview/`);
 }
 
+// "=" unchanged, "-" removed, "+" added; words/rows as strings, list items as arrays
+export type DiffSegment = ['=' | '-' | '+', string | string[]];
+
+export type BlockChange = {
+  op: 'insert' | 'delete' | 'modify' | 'move';
+  type: ContentBlockType;
+  from_block?: number;
+  from_position?: number;
+  to_block?: number;
+  to_position?: number;
+  data?: any;
+  fields?: Record<string, { diff: DiffSegment[] } | { old: any; new: any }>;
+};
+
+export type VersionDiff = {
+  from: number | null;
+  to: number;
+  summary: { unchanged: number; moved: number; modified: number; inserted: number; deleted: number };
+  changes: BlockChange[];
+};
+
+// Defaults to the changes since the manual's previous published version
+export async function getVersionDiff(id: number, fromId?: number): Promise<VersionDiff> {
+  return apiFetch<VersionDiff>(`/api/versions/${id}/diff/${filterQuery({ from: fromId })}`);
+}
+
+// Assets: files behind IMAGE/VIDEO blocks, stored once per SHA-256 and
+// referenced from block data as { asset: digest, src|url: '/api/assets/<digest>/' }
+export type Asset = { digest: string; url: string; content_type: string; size: number; created_at: string };
+
+const ASSET_CHUNK_SIZE = 1024 * 1024;
+
+export async function uploadAsset(file: File, onProgress?: (received: number, size: number) => void): Promise<Asset> {
+  await ensureCsrf();
+  const upload = await apiFetch<{ id: string; received: number }>('/api/assets/uploads/', {
+    method: 'POST',
+    body: JSON.stringify({ filename: file.name, content_type: file.type || 'application/octet-stream', size: file.size }),
+  });
+  let received = upload.received;
+  while (received < file.size) {
+    const result = await apiFetch<{ received: number }>(`/api/assets/uploads/${upload.id}/chunk/`, {
+      method: 'PUT',
+      headers: { 'Content-Type': 'application/octet-stream', 'Upload-Offset': String(received) },
+      body: file.slice(received, received + ASSET_CHUNK_SIZE),
+    });
+    received = result.received;
+    onProgress?.(received, file.size);
+  }
+  return apiFetch<Asset>(`/api/assets/uploads/${upload.id}/complete/`, { method: 'POST' });
+}
+
+// Asset URLs are stored relative to the API
+export function assetSrc(src: string | undefined): string | undefined {
+  return src && src.startsWith('/api/') ? `${API_BASE}${src}` : src;
+}
+
+// <img> attributes letting the browser pick the smallest variant that fits;
+// variant URLs end in their width (/api/assets/<digest>/<width>/)
+export function imageProps(block: ContentBlock): { src?: string; srcSet?: string; sizes?: string } {
+  const variants = block.variants;
+  if (!variants) return { src: assetSrc(block.data?.src) };
+  const srcSet = Object.values(variants)
+    .map((url) => `${assetSrc(url)} ${url.match(/\/(\d+)\/$/)?.[1]}w`)
+    .join(', ');
+  return { src: assetSrc(variants.medium ?? block.data?.src), srcSet, sizes: '(max-width: 768px) 100vw, 768px' };
+}
+
 // Content Blocks
 export type ContentBlockType = 'TEXT' | 'IMAGE' | 'VIDEO' | 'TABLE' | 'LIST' | 'CODE' | 'QUOTE' | 'DIVIDER' | 'CHECKLIST' | 'DIAGRAM' | 'TABS';
 
@@ -339,6 +434,8 @@ export type ContentBlock = {
   order: number;
   type: ContentBlockType;
   data: any;
+  // Resized image URLs by name ('thumbnail' | 'medium' | 'full') for IMAGE blocks backed by an asset
+  variants?: Record<string, string> | null;
   created_at: string;
   updated_at: string;
 };
@@ -358,6 +455,27 @@ export async function createContentBlock(payload: {
   return apiFetch<ContentBlock>('/api/blocks/', { method: 'POST', body: JSON.stringify(payload) });
 }
 
+export async function bulkSaveBlocks(versionId: number, blocks: Array<{
+  type: ContentBlockType;
+  data: any;
+  order?: number
+}>): Promise<ContentBlock[]> {
+  await ensureCsrf();
+  return apiFetch<ContentBlock[]>(`/api/versions/${versionId}/blocks/bulk/`, { method: 'POST', body: JSON.stringify({ blocks }) });
+}
+
+// Moves apply in order; `after: null` puts the block first. Only moved blocks
+// change order unless the server had to renumber the version (`rebalanced`).
+export type BlockMove = { id: number; after: number | null };
+
+export async function reorderBlocks(versionId: number, moves: BlockMove[]): Promise<{
+  rebalanced: boolean;
+  blocks: Array<{ id: number; order: number }>;
+}> {
+  await ensureCsrf();
+  return apiFetch(`/api/versions/${versionId}/reorder/`, { method: 'POST', body: JSON.stringify({ moves }) });
+}
+
 export async function updateContentBlock(id: number, payload: Partial<ContentBlock>): Promise<ContentBlock> {
   await ensureCsrf();
   return apiFetch<ContentBlock>(`/api/blocks/${id}/`, { method: 'PATCH', body: JSON.stringify(payload) });
@@ -391,8 +509,11 @@ export type ReviewRequest = {
   decided_at: string | null;
 };
 
-export async function listReviews(): Promise<ReviewRequest[]> {
-  return apiFetch<ReviewRequest[]>('/api/reviews/');
+// status takes a comma-separated list; reviewer takes a user id or 'none' for unassigned
+export type ReviewFilters = { status?: string; reviewer?: number | 'none'; department?: string };
+
+export async function listReviews(filters: ReviewFilters = {}): Promise<ReviewRequest[]> {
+  return apiFetch<ReviewRequest[]>(`/api/reviews/${filterQuery(filters)}`);
 }
 
 export async function getReview(id: number): Promise<ReviewRequest> {
@@ -416,6 +537,10 @@ export async function getReviewContent(id: number): Promise<ManualVersion> {
   return apiFetch<ManualVersion>(`/api/reviews/${id}/content/`);
 }
 
+export async function getReviewDiff(id: number): Promise<VersionDiff> {
+  return apiFetch<VersionDiff>(`/api/reviews/${id}/diff/`);
+}
+
 // Audit Logs
 export type AuditAction = 'CREATE' | 'UPDATE' | 'DELETE' | 'SUBMIT' | 'APPROVE' | 'REJECT' | 'PUBLISH' | 'ROLLBACK';
 
@@ -429,8 +554,11 @@ export type AuditLog = {
   details: any;
 };
 
-export async function listAuditLogs(): Promise<AuditLog[]> {
-  return apiFetch<AuditLog[]>('/api/audit/');
+// action takes a comma-separated list
+export type AuditLogFilters = { manual?: number; actor?: number; action?: string; since?: string; until?: string };
+
+export async function listAuditLogs(filters: AuditLogFilters = {}): Promise<AuditLog[]> {
+  return apiFetch<AuditLog[]>(`/api/audit/${filterQuery(filters)}`);
 }
 
 export async function getAuditLog(id: number): Promise<AuditLog> {
@@ -464,6 +592,7 @@ export const api = {
   // Manuals
   manuals: {
     list: listManuals,
+    search: searchManuals,
     get: getManual,
     create: createManual,
     update: updateManual,
@@ -503,6 +632,7 @@ export const api = {
   blocks: {
     list: listContentBlocks,
     create: createContentBlock,
+    bulkSave: bulkSaveBlocks,
     update: updateContentBlock,
     delete: deleteContentBlock,
   },
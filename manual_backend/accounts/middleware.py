@@ -1,65 +1,84 @@
 """
 Session timeout middleware for handling session expiration and warnings.
 """
+import logging
 import time
 from django.http import JsonResponse
 from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 
 
+logger = logging.getLogger(__name__)
+
+SESSION_TIMESTAMP_KEY = '_session_init_timestamp_'
+
+
 class SessionTimeoutMiddleware(MiddlewareMixin):
     """
     Middleware to handle session timeout and add session info to API responses.
+
+    The last-activity timestamp is only rewritten once it is older than
+    SESSION_ACTIVITY_WRITE_INTERVAL seconds, so a burst of API calls costs
+    one session write instead of one per request. As before, the reported
+    remaining time is measured from the stored timestamp, before this
+    request's activity is recorded.
     """
-    
+
     def process_response(self, request, response):
         """
         Add session timeout information to API responses.
         """
         # Only add session info to API responses (JSON)
-        if (hasattr(request, 'user') and 
-            request.user.is_authenticated and 
+        if (hasattr(request, 'user') and
+            request.user.is_authenticated and
             request.path.startswith('/api/') and
             response.get('Content-Type', '').startswith('application/json')):
-            
+
             try:
                 # Calculate session expiry time
                 session_age = settings.SESSION_COOKIE_AGE
-                last_activity = request.session.get('_session_init_timestamp_', time.time())
+                write_interval = getattr(settings, 'SESSION_ACTIVITY_WRITE_INTERVAL', 60)
                 current_time = time.time()
-                
-                # Update last activity timestamp
-                request.session['_session_init_timestamp_'] = current_time
-                
+                last_activity = request.session.get(SESSION_TIMESTAMP_KEY, current_time)
+
                 # Calculate remaining time
                 elapsed_time = current_time - last_activity
                 remaining_time = max(0, session_age - elapsed_time)
-                
-                # Add session info to response headers
-                response['X-Session-Remaining'] = str(int(remaining_time))
-                response['X-Session-Warning'] = 'true' if remaining_time < 300 else 'false'  # 5 minutes warning
-                response['X-Session-Expired'] = 'true' if remaining_time <= 0 else 'false'
-                
-                # If session is expired, return 401
+
+                # If session is expired, return 401 without extending it
                 if remaining_time <= 0:
-                    return JsonResponse({
+                    response = JsonResponse({
                         'error': 'Session expired',
                         'message': 'Your session has expired. Please log in again.',
                         'session_expired': True
                     }, status=401)
-                    
-            except Exception as e:
+                    response['X-Session-Remaining'] = '0'
+                    response['X-Session-Warning'] = 'true'
+                    response['X-Session-Expired'] = 'true'
+                    return response
+
+                # Coalesce activity updates: only touch the session (and so the
+                # session store) when the stored timestamp has gone stale
+                if SESSION_TIMESTAMP_KEY not in request.session or elapsed_time >= write_interval:
+                    request.session[SESSION_TIMESTAMP_KEY] = current_time
+
+                # Add session info to response headers
+                response['X-Session-Remaining'] = str(int(remaining_time))
+                response['X-Session-Warning'] = 'true' if remaining_time < 300 else 'false'  # 5 minutes warning
+                response['X-Session-Expired'] = 'false'
+
+            except Exception:
                 # Log error but don't break the response
-                print(f"Session timeout middleware error: {e}")
-        
+                logger.exception("Session timeout middleware error")
+
         return response
-    
+
     def process_request(self, request):
         """
         Initialize session timestamp if not present.
         """
         if hasattr(request, 'user') and request.user.is_authenticated:
-            if '_session_init_timestamp_' not in request.session:
-                request.session['_session_init_timestamp_'] = time.time()
-        
+            if SESSION_TIMESTAMP_KEY not in request.session:
+                request.session[SESSION_TIMESTAMP_KEY] = time.time()
+
         return None
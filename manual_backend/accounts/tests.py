@@ -1,3 +1,57 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APITestCase
+
+from .middleware import SESSION_TIMESTAMP_KEY
+from .models import User
+
+
+@override_settings(SESSION_COOKIE_AGE=1800, SESSION_ACTIVITY_WRITE_INTERVAL=60)
+class SessionTimeoutMiddlewareTests(APITestCase):
+    def setUp(self):
+        User.objects.create_user(username="reader", password="pass")
+        self.client.login(username="reader", password="pass")
+
+    def session_writes(self, path="/api/auth/me/"):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        writes = [query for query in queries if query["sql"].startswith("UPDATE \"django_session\"")]
+        return response, len(writes)
+
+    def test_requests_within_interval_do_not_write_session(self):
+        self.client.get("/api/auth/me/")
+        for _ in range(3):
+            response, writes = self.session_writes()
+            self.assertEqual(writes, 0)
+            self.assertEqual(response["X-Session-Warning"], "false")
+            self.assertGreater(int(response["X-Session-Remaining"]), 1700)
+
+    def test_stale_timestamp_is_refreshed(self):
+        self.client.get("/api/auth/me/")
+        started = self.client.session[SESSION_TIMESTAMP_KEY]
+        with mock.patch("accounts.middleware.time.time", return_value=started + 120):
+            response, writes = self.session_writes()
+        self.assertEqual(writes, 1)
+        self.assertEqual(response["X-Session-Remaining"], "1680")
+        self.assertEqual(self.client.session[SESSION_TIMESTAMP_KEY], started + 120)
+
+    def test_warning_and_expiry(self):
+        self.client.get("/api/auth/me/")
+        started = self.client.session[SESSION_TIMESTAMP_KEY]
+        with mock.patch("accounts.middleware.time.time", return_value=started + 1600):
+            response = self.client.get("/api/auth/me/")
+        self.assertEqual(response["X-Session-Warning"], "true")
+        with mock.patch("accounts.middleware.time.time", return_value=started + 1600 + 1900):
+            response = self.client.get("/api/auth/me/")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response["X-Session-Expired"], "true")
+
+    def test_extend_session_resets_timestamp(self):
+        self.client.get("/api/auth/me/")
+        started = self.client.session[SESSION_TIMESTAMP_KEY]
+        with mock.patch("accounts.views.time.time", return_value=started + 30):
+            response = self.client.post("/api/auth/extend-session/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.session[SESSION_TIMESTAMP_KEY], started + 30)
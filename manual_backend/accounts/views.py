@@ -7,8 +7,10 @@ from django.contrib.auth.password_validation import validate_password
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.utils.decorators import method_decorator
 from django.contrib.auth.hashers import make_password
+from django.conf import settings
 import time
 
+from .middleware import SESSION_TIMESTAMP_KEY
 from .models import User, Profile
 from .serializers import (
     UserSerializer,
@@ -210,12 +212,12 @@ def extend_session(request):
     """
     try:
         # Reset session timestamp to extend the session
-        request.session['_session_init_timestamp_'] = time.time()
+        request.session[SESSION_TIMESTAMP_KEY] = time.time()
         request.session.save()
         
         return Response({
             "detail": "Session extended successfully.",
-            "remaining_time": 1800,  # 30 minutes
+            "remaining_time": settings.SESSION_COOKIE_AGE,
             "extended_at": time.time()
         })
     except Exception as e:
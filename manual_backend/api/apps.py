@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Connect the signal handlers that keep the search index and visibility cache current,
+        # and the one instrumenting new database connections
+        from . import instrumentation, search, visibility  # noqa: F401
@@ -0,0 +1,556 @@
+"""
+NDJSON archives of whole manuals: versions, blocks, collaborators, reviews
+and audit trail.
+
+An archive holds one JSON record per line. A header line comes first. After
+it, each manual is written as a group: its ``manual`` record, then the records
+that belong to it. Users are referenced by username and categories/tags by
+slug, so an archive can move between environments. Every other id is local to
+the archive and remapped on import, and slugs and references are regenerated.
+
+Export reads manuals in batches and yields lines as it goes. Import buffers a
+few thousand records at a time and writes each table with one bulk_create per
+flush. Archives may be gzip- or zstd-compressed (zstd needs the optional
+``zstandard`` package); import detects compression from the first bytes.
+"""
+import datetime
+import gzip
+import io
+import json
+import zlib
+from collections import defaultdict
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import User
+from . import visibility
+from .models import (
+    AuditLog,
+    BlockPayload,
+    Category,
+    ContentBlock,
+    Manual,
+    ManualCollaborator,
+    ManualVersion,
+    ReviewRequest,
+    Tag,
+)
+from .search import schedule_reindex
+from .streaming import buffered
+
+
+FORMAT_VERSION = 1
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+CONTENT_TYPES = {"none": "application/x-ndjson", "gzip": "application/gzip", "zstd": "application/zstd"}
+EXTENSIONS = {"none": ".ndjson", "gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class ArchiveError(ValueError):
+    """The archive is malformed or refers to something that can't be resolved"""
+
+
+def zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ArchiveError("zstd archives need the zstandard package.") from None
+    return zstandard
+
+
+def batch_size():
+    return getattr(settings, "MANUAL_ARCHIVE_BATCH_SIZE", 200)
+
+
+def flush_size():
+    return getattr(settings, "MANUAL_ARCHIVE_FLUSH_SIZE", 5000)
+
+
+# Export
+
+def encode(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def group_by(objects, key):
+    groups = defaultdict(list)
+    for obj in objects:
+        groups[key(obj)].append(obj)
+    return groups
+
+
+def username(user):
+    return user.username if user is not None else None
+
+
+def export_records(manuals):
+    """Yield the archive records for ``manuals`` as dicts, header first"""
+    yield {"type": "archive", "format": FORMAT_VERSION, "exported_at": timezone.now()}
+    seen = set()
+    queryset = (
+        manuals.prefetch_related(None)
+        .select_related("category", "created_by")
+        .prefetch_related("tags")
+        .order_by("pk")
+    )
+    batch = []
+    for manual in queryset.iterator(chunk_size=batch_size()):
+        batch.append(manual)
+        if len(batch) >= batch_size():
+            yield from export_batch(batch, seen)
+            batch = []
+    if batch:
+        yield from export_batch(batch, seen)
+
+
+def export_batch(manuals, seen):
+    """Records for one batch of manuals; ``seen`` tracks categories/tags already written"""
+    ids = [manual.pk for manual in manuals]
+    collaborators = group_by(
+        ManualCollaborator.objects.filter(manual_id__in=ids).select_related("user", "added_by").order_by("pk"),
+        lambda collaborator: collaborator.manual_id,
+    )
+    versions = group_by(
+        ManualVersion.objects.filter(manual_id__in=ids).select_related("created_by").order_by("version_number"),
+        lambda version: version.manual_id,
+    )
+    reviews = group_by(
+        ReviewRequest.objects.filter(version__manual_id__in=ids)
+        .select_related("submitted_by", "reviewer")
+        .annotate(manual_id=F("version__manual_id"))
+        .order_by("pk"),
+        lambda review: review.manual_id,
+    )
+    audits = group_by(
+        AuditLog.objects.filter(manual_id__in=ids).select_related("actor").order_by("created_at", "pk"),
+        lambda entry: entry.manual_id,
+    )
+    # Manuals come in pk order, so each manual's blocks are the next group
+    blocks = groupby(batch_blocks(ids), lambda block: block.manual_id)
+    next_blocks = next(blocks, None)
+    for manual in manuals:
+        if manual.category_id and ("category", manual.category_id) not in seen:
+            seen.add(("category", manual.category_id))
+            category = manual.category
+            yield {
+                "type": "category", "slug": category.slug, "name": category.name,
+                "description": category.description, "color": category.color,
+            }
+        tags = list(manual.tags.all())
+        for tag in tags:
+            if ("tag", tag.pk) not in seen:
+                seen.add(("tag", tag.pk))
+                yield {"type": "tag", "slug": tag.slug, "name": tag.name, "color": tag.color}
+        yield {
+            "type": "manual",
+            "id": manual.pk,
+            "title": manual.title,
+            "slug": manual.slug,
+            "department": manual.department,
+            "category": manual.category.slug if manual.category_id else None,
+            "tags": [tag.slug for tag in tags],
+            "status": manual.status,
+            "created_by": manual.created_by.username,
+            "current_version": manual.current_version_id,
+            "created_at": manual.created_at,
+            "updated_at": manual.updated_at,
+        }
+        for collaborator in collaborators[manual.pk]:
+            yield {
+                "type": "collaborator",
+                "user": collaborator.user.username,
+                "role": collaborator.role,
+                "added_by": collaborator.added_by.username,
+                "created_at": collaborator.created_at,
+                "updated_at": collaborator.updated_at,
+            }
+        for version in versions[manual.pk]:
+            yield {
+                "type": "version",
+                "id": version.pk,
+                "version_number": version.version_number,
+                "changelog": version.changelog,
+                "created_by": version.created_by.username,
+                "is_published": version.is_published,
+                "published_html": version.published_html,
+                "created_at": version.created_at,
+                "updated_at": version.updated_at,
+            }
+        if next_blocks is not None and next_blocks[0] == manual.pk:
+            yield from export_blocks(next_blocks[1])
+            next_blocks = next(blocks, None)
+        for review in reviews[manual.pk]:
+            yield {
+                "type": "review",
+                "version": review.version_id,
+                "submitted_by": review.submitted_by.username,
+                "reviewer": username(review.reviewer),
+                "status": review.status,
+                "feedback": review.feedback,
+                "submitted_at": review.submitted_at,
+                "decided_at": review.decided_at,
+                "created_at": review.created_at,
+                "updated_at": review.updated_at,
+            }
+        for entry in audits[manual.pk]:
+            yield {
+                "type": "audit",
+                "version": entry.version_id,
+                "action": entry.action,
+                "actor": entry.actor.username,
+                "metadata": entry.metadata,
+                "created_at": entry.created_at,
+            }
+
+
+def batch_blocks(ids):
+    """Blocks of every version of the manuals ``ids``, in one query read a chunk at a time"""
+    blocks = (
+        ContentBlock.objects.filter(version__manual_id__in=ids)
+        .select_related("payload")
+        .annotate(manual_id=F("version__manual_id"))
+        .order_by("manual_id", "version_id", "order", "created_at")
+    )
+    return blocks.iterator(chunk_size=getattr(settings, "STREAMING_BLOCK_CHUNK_SIZE", 500))
+
+
+def export_blocks(blocks):
+    """Records for one manual's blocks, each payload written once before its first use"""
+    digests = set()
+    for block in blocks:
+        payload = block.payload
+        if payload.digest not in digests:
+            digests.add(payload.digest)
+            yield {"type": "payload", "digest": payload.digest, "block_type": payload.type, "data": payload.data}
+        yield {"type": "block", "version": block.version_id, "order": block.order, "payload": payload.digest}
+
+
+def export_lines(manuals):
+    for record in export_records(manuals):
+        yield json.dumps(record, default=encode, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def compress(chunks, compression):
+    if compression == "none":
+        yield from chunks
+        return
+    if compression == "gzip":
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+    elif compression == "zstd":
+        compressor = zstandard().ZstdCompressor().compressobj()
+    else:
+        raise ArchiveError(f"Unknown compression {compression!r}.")
+    for chunk in chunks:
+        output = compressor.compress(chunk)
+        if output:
+            yield output
+    yield compressor.flush()
+
+
+def export_archive(manuals, compression="none"):
+    """The archive for ``manuals`` as an iterator of (optionally compressed) bytes"""
+    if compression not in COMPRESSIONS:
+        raise ArchiveError(f"Unknown compression {compression!r}.")
+    if compression == "zstd":
+        zstandard()
+    return compress(buffered(export_lines(manuals)), compression)
+
+
+# Import
+
+def open_archive(fileobj):
+    """A text stream over a binary archive file, decompressing it if needed"""
+    if not hasattr(fileobj, "peek"):
+        fileobj = io.BufferedReader(fileobj)
+    magic = fileobj.peek(4)[:4]
+    if magic.startswith(GZIP_MAGIC):
+        fileobj = gzip.GzipFile(fileobj=fileobj)
+    elif magic == ZSTD_MAGIC:
+        fileobj = io.BufferedReader(zstandard().ZstdDecompressor().stream_reader(fileobj))
+    return io.TextIOWrapper(fileobj, encoding="utf-8")
+
+
+class ArchiveImporter:
+    """
+    Recreates the manuals of an archive. Records are buffered and written in
+    dependency order once ``flush_size()`` have accumulated, so each table
+    gets one bulk insert per flush. Rows keep their archived timestamps,
+    except blocks, which are stamped with the import time.
+    """
+
+    def __init__(self, default_user=None):
+        self.default_user = default_user
+        self.users = {}
+        self.categories = {}
+        self.tags = {}
+        self.reserved_slugs = set()
+        self.counts = defaultdict(int)
+        self.pending = defaultdict(list)
+        self.pending_count = 0
+        self.manual_ids = []
+        self.user_ids = set()
+        # State of the manual group being read
+        self.manual = None
+        self.versions = {}
+        self.payloads = {}
+        self.collaborators = set()
+
+    def run(self, lines):
+        records = self.parse(lines)
+        header = next(records, None)
+        if header is None or header.get("type") != "archive":
+            raise ArchiveError("Missing archive header.")
+        if header.get("format") != FORMAT_VERSION:
+            raise ArchiveError(f"Unsupported archive format {header.get('format')!r}.")
+        with transaction.atomic():
+            for record in records:
+                handler = getattr(self, f"read_{record.get('type')}", None)
+                if handler is None:
+                    raise ArchiveError(f"Unknown record type {record.get('type')!r}.")
+                try:
+                    handler(record)
+                except KeyError as exc:
+                    raise ArchiveError(f"{record['type'].capitalize()} record is missing {exc}.") from None
+                if self.pending_count >= flush_size():
+                    self.flush()
+            self.flush()
+            visibility.invalidate(self.user_ids)
+            schedule_reindex(self.manual_ids)
+        return dict(self.counts)
+
+    def parse(self, lines):
+        lines = enumerate(lines, start=1)
+        while True:
+            try:
+                number, line = next(lines)
+            except StopIteration:
+                return
+            except (UnicodeDecodeError, OSError, EOFError, zlib.error) as exc:
+                # Undecodable text or a corrupt/truncated compressed stream
+                raise ArchiveError(f"Unreadable archive: {exc}") from None
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                raise ArchiveError(f"Line {number}: {exc}") from None
+            if not isinstance(record, dict):
+                raise ArchiveError(f"Line {number}: expected a JSON object.")
+            yield record
+
+    def add(self, kind, obj, **timestamps):
+        self.pending[kind].append((obj, timestamps))
+        self.pending_count += 1
+
+    def user_id(self, name, required=True):
+        if name is None and not required:
+            return None
+        if name not in self.users:
+            user = User.objects.filter(username=name).only("pk").first() if name is not None else None
+            if user is None:
+                if self.default_user is None:
+                    raise ArchiveError(f"Unknown user {name!r}.")
+                user = self.default_user
+            self.users[name] = user.pk
+        self.user_ids.add(self.users[name])
+        return self.users[name]
+
+    def current(self, record):
+        if self.manual is None:
+            raise ArchiveError(f"{record['type'].capitalize()} record before any manual.")
+        return self.manual
+
+    def version(self, version_id, required=True):
+        if version_id is None and not required:
+            return None
+        try:
+            return self.versions[version_id]
+        except KeyError:
+            raise ArchiveError(f"Unknown version {version_id!r} in manual {self.manual.title!r}.") from None
+
+    def read_category(self, record):
+        if record["slug"] not in self.categories:
+            category, _ = Category.objects.get_or_create(
+                slug=record["slug"],
+                defaults={key: record[key] for key in ("name", "description", "color") if key in record},
+            )
+            self.categories[record["slug"]] = category.pk
+
+    def read_tag(self, record):
+        if record["slug"] not in self.tags:
+            tag, _ = Tag.objects.get_or_create(
+                slug=record["slug"], defaults={key: record[key] for key in ("name", "color") if key in record}
+            )
+            self.tags[record["slug"]] = tag.pk
+
+    def read_manual(self, record):
+        manual = Manual(
+            title=record["title"],
+            slug=record["slug"],
+            department=record.get("department", ""),
+            category_id=self.categories.get(record.get("category")),
+            status=record.get("status", Manual.ManualStatus.DRAFT),
+            created_by_id=self.user_id(record["created_by"]),
+        )
+        manual._archived_tags = [self.tags[slug] for slug in record.get("tags", []) if slug in self.tags]
+        manual._archived_current_version = record.get("current_version")
+        self.manual, self.versions, self.payloads, self.collaborators = manual, {}, {}, set()
+        self.add("manuals", manual, created_at=record.get("created_at"), updated_at=record.get("updated_at"))
+
+    def read_collaborator(self, record):
+        manual = self.current(record)
+        collaborator = ManualCollaborator(
+            manual=manual,
+            user_id=self.user_id(record["user"]),
+            role=record.get("role", ManualCollaborator.CollaboratorRole.EDITOR),
+            added_by_id=self.user_id(record["added_by"]),
+        )
+        if collaborator.user_id == manual.created_by_id or collaborator.user_id in self.collaborators:
+            # Collapsed onto the owner or a duplicate by the default user fallback
+            return
+        self.collaborators.add(collaborator.user_id)
+        self.add(
+            "collaborators", collaborator, created_at=record.get("created_at"), updated_at=record.get("updated_at")
+        )
+
+    def read_version(self, record):
+        manual = self.current(record)
+        version = ManualVersion(
+            manual=manual,
+            version_number=record["version_number"],
+            changelog=record.get("changelog", ""),
+            created_by_id=self.user_id(record["created_by"]),
+            is_published=record.get("is_published", False),
+            published_html=record.get("published_html", ""),
+        )
+        self.versions[record["id"]] = version
+        if record["id"] == manual._archived_current_version:
+            self.pending["current_versions"].append((manual, version))
+        self.add("versions", version, created_at=record.get("created_at"), updated_at=record.get("updated_at"))
+
+    def read_payload(self, record):
+        self.current(record)
+        self.payloads[record["digest"]] = (record["block_type"], record.get("data", {}))
+
+    def read_block(self, record):
+        self.current(record)
+        try:
+            block_type, data = self.payloads[record["payload"]]
+        except KeyError:
+            raise ArchiveError(f"Block refers to unknown payload {record['payload']!r}.") from None
+        block = ContentBlock(version=self.version(record["version"]), order=record["order"])
+        block.type, block.data = block_type, data
+        self.add("blocks", block)
+
+    def read_review(self, record):
+        self.current(record)
+        review = ReviewRequest(
+            version=self.version(record["version"]),
+            submitted_by_id=self.user_id(record["submitted_by"]),
+            reviewer_id=self.user_id(record.get("reviewer"), required=False),
+            status=record.get("status", ReviewRequest.ReviewStatus.PENDING),
+            feedback=record.get("feedback", ""),
+            decided_at=parse_datetime(record["decided_at"]) if record.get("decided_at") else None,
+        )
+        self.add(
+            "reviews", review, submitted_at=record.get("submitted_at"),
+            created_at=record.get("created_at"), updated_at=record.get("updated_at"),
+        )
+
+    def read_audit(self, record):
+        manual = self.current(record)
+        entry = AuditLog(
+            manual=manual,
+            version=self.version(record.get("version"), required=False),
+            action=record["action"],
+            actor_id=self.user_id(record["actor"]),
+            metadata=record.get("metadata", {}),
+        )
+        self.add("audits", entry, created_at=record.get("created_at"))
+
+    def free_slugs(self, manuals):
+        """Give each manual a slug unused in the database and in this import"""
+        max_length = Manual._meta.get_field("slug").max_length
+        wanted = [(manual, manual.slug) for manual in manuals]
+        attempt = 1
+        while wanted:
+            candidates = [
+                (manual, slug, slug if attempt == 1 else f"{slug[:max_length - 12]}-{attempt}")
+                for manual, slug in wanted
+            ]
+            taken = set(
+                Manual.objects.filter(slug__in=[candidate for _, _, candidate in candidates])
+                .values_list("slug", flat=True)
+            )
+            wanted = []
+            for manual, slug, candidate in candidates:
+                if candidate in taken or candidate in self.reserved_slugs:
+                    wanted.append((manual, slug))
+                else:
+                    manual.slug = candidate
+                    self.reserved_slugs.add(candidate)
+            attempt += 1
+
+    def insert(self, kind, model):
+        entries = self.pending.pop(kind, [])
+        if not entries:
+            return []
+        objects = [obj for obj, _ in entries]
+        model.objects.bulk_create(objects)
+        self.counts[kind] += len(objects)
+        # bulk_create applies auto_now/auto_now_add; put the archived times back
+        fields = set()
+        for obj, timestamps in entries:
+            for name, value in timestamps.items():
+                if value:
+                    setattr(obj, name, parse_datetime(value))
+                    fields.add(name)
+        if fields:
+            model.objects.bulk_update(objects, sorted(fields), batch_size=batch_size())
+        return objects
+
+    def flush(self):
+        manuals = [manual for manual, _ in self.pending["manuals"]]
+        self.free_slugs(manuals)
+        # Manual.objects.bulk_create assigns fresh references
+        self.insert("manuals", Manual)
+        self.manual_ids += [manual.pk for manual in manuals]
+        Manual.tags.through.objects.bulk_create([
+            Manual.tags.through(manual_id=manual.pk, tag_id=tag_id)
+            for manual in manuals for tag_id in manual._archived_tags
+        ])
+        self.insert("collaborators", ManualCollaborator)
+        self.insert("versions", ManualVersion)
+        current = []
+        for manual, version in self.pending.pop("current_versions", []):
+            manual.current_version = version
+            current.append(manual)
+        if current:
+            Manual.objects.bulk_update(current, ["current_version"], batch_size=batch_size())
+        blocks = [block for block, _ in self.pending["blocks"]]
+        BlockPayload.objects.attach(blocks)
+        self.insert("blocks", ContentBlock)
+        self.insert("reviews", ReviewRequest)
+        self.insert("audits", AuditLog)
+        self.pending.clear()
+        self.pending_count = 0
+
+
+def import_archive(lines, default_user=None):
+    """
+    Import every manual in an archive (an iterable of NDJSON lines) in one
+    transaction. Archived users missing here are replaced by ``default_user``,
+    or the import fails if none is given. Returns the number of rows created
+    per kind.
+    """
+    return ArchiveImporter(default_user).run(lines)
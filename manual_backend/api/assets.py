@@ -0,0 +1,212 @@
+"""
+Content-addressed storage for the files behind IMAGE and VIDEO blocks.
+
+Blocks reference an asset by its SHA-256 (``data["asset"]``) and point their
+``src`` (IMAGE) or ``url`` (VIDEO) at ``/api/assets/<digest>/``, so a file is
+stored once however many blocks and versions use it, and manual JSON carries
+a short reference instead of the file. Files are kept in the Django storage
+named by ``settings.ASSET_STORAGE`` under ``ab/cd/<digest>``.
+
+Only image and video types browsers display without running script are
+accepted (ASSET_CONTENT_TYPES): assets are served from the API origin to
+anyone holding the digest, so an HTML or SVG file would be stored XSS.
+
+Large files arrive in chunks through an AssetUpload, appended in order to a
+part file in ``settings.ASSET_UPLOAD_DIR`` and hashed once complete. Blocks
+saved with an inline ``data:`` URL (older editors, API clients) have it
+extracted into an asset by ``extract_inline_assets`` before their payload is
+interned.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import storages
+
+from .models import Asset
+
+
+ASSET_URL = "/api/assets/{digest}/"
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# The data field holding each asset-backed block type's file URL
+ASSET_FIELDS = {"IMAGE": "src", "VIDEO": "url"}
+
+# Types an asset may be stored as; notably not text/html or image/svg+xml
+ASSET_CONTENT_TYPES = {
+    "image/jpeg", "image/png", "image/gif", "image/webp", "image/avif", "image/bmp", "image/tiff",
+    "video/mp4", "video/webm", "video/ogg", "video/quicktime",
+}
+
+DATA_URL_RE = re.compile(r"^data:(?P<type>[\w.+-]+/[\w.+-]+)?(?P<params>(?:;[^,;]*)*?)(?P<base64>;base64)?,", re.I)
+
+
+class AssetError(ValueError):
+    """An upload or data URL that can't be stored"""
+
+
+class UploadOffsetError(AssetError):
+    """A chunk that doesn't start where the upload left off"""
+
+    def __init__(self, expected):
+        super().__init__(f"Expected a chunk at offset {expected}.")
+        self.expected = expected
+
+
+def get_storage():
+    return storages[getattr(settings, "ASSET_STORAGE", "assets")]
+
+
+def storage_name(digest):
+    return f"{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def asset_url(digest):
+    return ASSET_URL.format(digest=digest)
+
+
+def max_size():
+    return getattr(settings, "ASSET_MAX_SIZE", 200 * 1024 * 1024)
+
+
+def normalize_content_type(content_type):
+    return (content_type or "").split(";", 1)[0].strip().lower()
+
+
+def is_allowed_type(content_type):
+    return normalize_content_type(content_type) in ASSET_CONTENT_TYPES
+
+
+def check_content_type(content_type):
+    """The normalized ``content_type``, or AssetError unless it is allowed"""
+    if not is_allowed_type(content_type):
+        raise AssetError(f"Assets must be images or videos, not {content_type or 'an unknown type'}.")
+    return normalize_content_type(content_type)
+
+
+def upload_dir():
+    return Path(getattr(settings, "ASSET_UPLOAD_DIR", settings.BASE_DIR / "asset_uploads"))
+
+
+def hash_file(fileobj):
+    """SHA-256 hex digest and size of a file, read from the start"""
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: fileobj.read(COPY_CHUNK_SIZE), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+def save(fileobj, content_type, user=None):
+    """
+    Store a seekable file under its digest, unless that content is already
+    stored, and return its Asset
+    """
+    content_type = check_content_type(content_type)
+    digest, size = hash_file(fileobj)
+    if size > max_size():
+        raise AssetError(f"Assets are limited to {max_size()} bytes.")
+    storage = get_storage()
+    name = storage_name(digest)
+    if not storage.exists(name):
+        # Concurrent writers of the same digest write the same bytes
+        storage.save(name, File(fileobj))
+    asset, _ = Asset.objects.get_or_create(
+        digest=digest,
+        defaults={"content_type": content_type, "size": size, "created_by": user},
+    )
+    return asset
+
+
+def open_asset(asset):
+    return get_storage().open(storage_name(asset.digest), "rb")
+
+
+def upload_path(upload):
+    return upload_dir() / f"{upload.pk}.part"
+
+
+def append_chunk(upload, offset, stream):
+    """
+    Append a chunk read from ``stream`` at ``offset``, which must be the
+    number of bytes received so far. Call with the upload row locked.
+    """
+    if offset != upload.received:
+        raise UploadOffsetError(upload.received)
+    path = upload_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    received = upload.received
+    with open(path, "ab") as part:
+        # Drop anything a failed earlier attempt wrote past the recorded offset
+        part.truncate(received)
+        for chunk in iter(lambda: stream.read(COPY_CHUNK_SIZE), b""):
+            received += len(chunk)
+            if received > upload.size:
+                part.truncate(upload.received)
+                raise AssetError(f"Upload is larger than the declared {upload.size} bytes.")
+            part.write(chunk)
+    upload.received = received
+    upload.save(update_fields=["received", "updated_at"])
+    return received
+
+
+def complete_upload(upload):
+    """Store a fully received upload as an asset and discard the upload"""
+    check_content_type(upload.content_type)
+    if upload.received != upload.size:
+        raise AssetError(f"Received {upload.received} of {upload.size} bytes.")
+    path = upload_path(upload)
+    with open(path, "rb") as part:
+        asset = save(part, upload.content_type, upload.created_by)
+    discard_upload(upload)
+    return asset
+
+
+def discard_upload(upload):
+    try:
+        os.remove(upload_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def save_data_url(value, user=None):
+    """Store the content of a ``data:`` URL as an asset"""
+    match = DATA_URL_RE.match(value)
+    if match is None:
+        raise AssetError("Not a data: URL.")
+    payload = value[match.end():]
+    try:
+        content = base64.b64decode(payload, validate=False) if match.group("base64") else payload.encode("utf-8")
+    except (binascii.Error, ValueError):
+        raise AssetError("Malformed base64 in data: URL.")
+    with tempfile.TemporaryFile() as spool:
+        spool.write(content)
+        return save(spool, match.group("type") or "text/plain", user)
+
+
+def extract_inline_assets(block_type, data):
+    """
+    ``data`` with an inline ``data:`` URL in the block's file field replaced
+    by a reference to a stored asset; other data is returned as is
+    """
+    field = ASSET_FIELDS.get(block_type)
+    if field is None or not isinstance(data, dict):
+        return data
+    value = data.get(field)
+    if not isinstance(value, str) or not value[:5].lower() == "data:":
+        return data
+    try:
+        asset = save_data_url(value)
+    except AssetError:
+        return data
+    return {**data, field: asset_url(asset.digest), "asset": asset.digest}
@@ -0,0 +1,136 @@
+"""
+Native async views for the hot read endpoints, served by the ASGI app (see
+manual_backend.asgi and manual_backend.asgi_urls).
+
+Each view answers a plain JSON GET from a session-authenticated user with the
+async ORM and fully prefetched querysets. Once the rows are loaded, the
+regular DRF serializers run on the event loop without touching the database,
+so responses match the DRF viewsets byte for byte. Everything else goes to
+the DRF view registered for the same path: other methods, anonymous or
+basic-auth clients, the browsable API, paginated lists, and 404s.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.urls import resolve
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .conditional import amanual_etag, aversion_etag, not_modified, with_etag
+from .filters import filter_audit_log
+from .models import AuditLog, ManualVersion, ReviewRequest
+from .permissions import ManualPermissionResolver
+from .serializers import AuditLogSerializer, ManualSerializer, requested_fields
+from .streaming import astream_version
+from .views import ManualViewSet
+
+
+def json_response(data):
+    # Same renderer and content type as a DRF Response
+    return HttpResponse(JSONRenderer().render(data), content_type="application/json")
+
+
+class AsyncReadView(View):
+    """
+    Serves GET natively when it can and hands every other request to the DRF
+    view resolved from ``fallback_urlconf``. ``get`` returns None to fall back.
+    """
+    fallback_urlconf = "manual_backend.urls"
+    # Lists render in full; cursor pagination stays with the DRF view
+    paginated_params = ("cursor", "page_size")
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Like the DRF views: SessionAuthentication enforces CSRF for unsafe methods
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        if self.can_serve(request):
+            user = await request.auser()
+            if user.is_authenticated:
+                # Later middleware reads request.user; don't load the user twice
+                request.user = user
+                response = await self.get(self.drf_request(request, user), *args, **kwargs)
+                if response is not None:
+                    return response
+        return await self.fallback(request)
+
+    def can_serve(self, request):
+        if request.method != "GET" or "text/html" in request.headers.get("Accept", ""):
+            return False
+        return not any(param in request.GET for param in self.paginated_params)
+
+    def drf_request(self, request, user):
+        # Serializer context expects a DRF request (query_params, user)
+        drf_request = Request(request)
+        drf_request.user = user
+        return drf_request
+
+    async def fallback(self, request):
+        match = resolve(request.path_info, urlconf=self.fallback_urlconf)
+        return await sync_to_async(match.func)(request, *match.args, **match.kwargs)
+
+
+class ManualListView(AsyncReadView):
+    async def get(self, request):
+        grants = await ManualPermissionResolver.for_request(request).aprime()
+        queryset = ManualViewSet.visible_queryset(requested_fields(request), request.user, grants)
+        manuals = [manual async for manual in queryset]
+        return json_response(ManualSerializer(manuals, many=True, context={"request": request}).data)
+
+
+class ManualDetailView(AsyncReadView):
+    async def get(self, request, slug):
+        grants = await ManualPermissionResolver.for_request(request).aprime()
+        queryset = ManualViewSet.visible_queryset(requested_fields(request), request.user, grants).filter(slug=slug)
+        etag = await amanual_etag(queryset, request.user)
+        if etag is None:
+            return None
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        manual = await queryset.afirst()
+        if manual is None:
+            return None
+        return with_etag(json_response(ManualSerializer(manual, context={"request": request}).data), etag)
+
+
+async def version_response(request, version_id):
+    etag = await aversion_etag(version_id)
+    if etag is None:
+        return None
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    version = await ManualVersion.objects.filter(pk=version_id).afirst()
+    if version is None:
+        return None
+    return with_etag(astream_version(version), etag)
+
+
+class VersionPreviewView(AsyncReadView):
+    async def get(self, request, pk):
+        return await version_response(request, pk)
+
+
+class ReviewContentView(AsyncReadView):
+    async def get(self, request, pk):
+        version_id = await ReviewRequest.objects.filter(pk=pk).values_list("version_id", flat=True).afirst()
+        if version_id is None:
+            return None
+        return await version_response(request, version_id)
+
+
+class AuditLogListView(AsyncReadView):
+    async def get(self, request):
+        try:
+            queryset = filter_audit_log(AuditLog.objects.all(), request.query_params)
+        except ValidationError:
+            # Let the DRF view render the 400
+            return None
+        # The serializer only renders the related ids, so no joins are needed
+        entries = [entry async for entry in queryset]
+        return json_response(AuditLogSerializer(entries, many=True, context={"request": request}).data)
@@ -0,0 +1,201 @@
+"""
+Buffered audit trail.
+
+Views call ``record()`` instead of creating AuditLog rows directly. An entry
+is only released once the surrounding transaction commits (and dropped if it
+rolls back). During a request, released entries are collected by
+AuditBufferMiddleware and handed to the sink as one batch when the response
+is ready. Outside a request they go to the sink straight away.
+
+The sink is chosen by ``settings.AUDIT_SINK``. InlineAuditSink writes each
+batch with one bulk_create in the calling thread. ThreadedAuditSink queues
+entries for a background worker that batches across requests and drains the
+queue at interpreter exit.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import AuditLog
+
+
+logger = logging.getLogger(__name__)
+
+# Entries released during the current request, or None outside one
+_request_entries = ContextVar("audit_request_entries", default=None)
+
+
+class InlineAuditSink:
+    """Writes every batch immediately in the calling thread"""
+
+    def submit(self, entries):
+        self.write(entries)
+
+    def write(self, entries):
+        AuditLog.objects.bulk_create(entries, batch_size=getattr(settings, "AUDIT_BATCH_SIZE", 500))
+
+    def flush(self):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+_STOP = object()
+
+
+class ThreadedAuditSink(InlineAuditSink):
+    """
+    Queues entries for a daemon worker thread. The worker writes a batch once
+    AUDIT_BATCH_SIZE entries are waiting or AUDIT_FLUSH_INTERVAL seconds have
+    passed since the first. ``flush()`` blocks until everything submitted so
+    far is written; ``shutdown()`` (run at exit) drains the queue and stops
+    the worker, after which entries are written inline.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None):
+        self.batch_size = batch_size or getattr(settings, "AUDIT_BATCH_SIZE", 500)
+        self.flush_interval = flush_interval if flush_interval is not None else getattr(
+            settings, "AUDIT_FLUSH_INTERVAL", 0.5
+        )
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+        atexit.register(self.shutdown)
+
+    def submit(self, entries):
+        with self.lock:
+            if not self.closed:
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(target=self.run, name="audit-sink", daemon=True)
+                    self.thread.start()
+                for entry in entries:
+                    self.queue.put(entry)
+                return
+        self.write(entries)
+
+    def run(self):
+        try:
+            stop = False
+            while not stop:
+                item = self.queue.get()
+                if item is _STOP:
+                    self.queue.task_done()
+                    return
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        self.queue.task_done()
+                        break
+                    batch.append(item)
+                self.write_batch(batch)
+                for _ in batch:
+                    self.queue.task_done()
+        finally:
+            # The worker owns its own connection
+            connections.close_all()
+
+    def write_batch(self, batch):
+        try:
+            self.write(batch)
+        except Exception:
+            logger.warning("Audit batch write failed, retrying on a fresh connection", exc_info=True)
+            connections.close_all()
+            try:
+                self.write(batch)
+            except Exception:
+                logger.exception("Dropped %d audit entries", len(batch))
+
+    def flush(self):
+        self.queue.join()
+
+    def shutdown(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            thread = self.thread
+        if thread is not None and thread.is_alive():
+            self.queue.put(_STOP)
+            thread.join()
+        # Whatever a dead worker left behind
+        leftover = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+            self.queue.task_done()
+        if leftover:
+            self.write_batch(leftover)
+
+
+_sink = None
+
+
+def get_audit_sink():
+    global _sink
+    if _sink is None:
+        path = getattr(settings, "AUDIT_SINK", None)
+        _sink = import_string(path)() if path else InlineAuditSink()
+    return _sink
+
+
+def release(entry):
+    entries = _request_entries.get()
+    if entries is None:
+        get_audit_sink().submit([entry])
+    else:
+        entries.append(entry)
+
+
+def record(manual, action, actor, version=None, metadata=None):
+    """Queue an audit entry to be written once the current transaction commits"""
+    entry = AuditLog(
+        manual=manual,
+        version=version,
+        action=action,
+        actor=actor,
+        metadata=metadata or {},
+        created_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: release(entry))
+    return entry
+
+
+def begin_request():
+    return _request_entries.set([])
+
+
+def end_request(token):
+    """Hand the entries released during the request to the sink in one batch"""
+    entries = _request_entries.get()
+    _request_entries.reset(token)
+    if entries:
+        get_audit_sink().submit(entries)
+
+
+async def aend_request(token):
+    """end_request for async requests; the sink may write, so it runs off the event loop"""
+    entries = _request_entries.get()
+    _request_entries.reset(token)
+    if entries:
+        await sync_to_async(get_audit_sink().submit)(entries)
@@ -0,0 +1,532 @@
+"""
+Synthetic data and load generation for measuring the API.
+
+``seed`` builds a reproducible dataset from a random seed: users in every
+role, categories, tags, manuals with several versions of generated blocks,
+collaborators, reviews and audit logs. Its users are named
+``<prefix>-<n>`` and its other rows carry the same prefix, so ``clear``
+removes the dataset again and reseeding gives the same shape.
+
+``run`` drives SCENARIOS against a seeded dataset, either through the Django
+test client in this process or over HTTP against a running server, and
+reports p50/p95 latency, SQL queries per request and peak RSS for each.
+Query counts come from the Server-Timing header (see api/instrumentation.py),
+so a server under test needs REQUEST_INSTRUMENTATION on for them. Results
+are plain JSON; ``compare`` lists where a run regressed against a saved one.
+"""
+import datetime
+import http.cookiejar
+import json
+import random
+import re
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Callable, NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from accounts.models import Profile, User
+from .models import (
+    AuditLog,
+    BlockPayload,
+    Category,
+    ContentBlock,
+    Manual,
+    ManualCollaborator,
+    ManualVersion,
+    ReviewRequest,
+    Tag,
+    new_reference,
+)
+from .ordering import gapped
+from .search import schedule_reindex
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+APPROVER_ROLES = [User.Role.SUPERVISOR, User.Role.MANAGER, User.Role.CHIEF_MANAGER, User.Role.ADMIN]
+
+DEPARTMENTS = ["Operations", "Maintenance", "Quality", "Safety", "Finance", "Logistics"]
+
+WORDS = (
+    "valve pressure inspect record torque seal calibrate report shift safety log isolate verify sample "
+    "batch clean approve align sensor pump filter gauge lock permit escalate measure replace drain"
+).split()
+
+# Manual statuses drawn when seeding; submitted manuals get a pending review
+STATUS_WEIGHTS = {
+    Manual.ManualStatus.DRAFT: 3,
+    Manual.ManualStatus.SUBMITTED: 4,
+    Manual.ManualStatus.APPROVED: 2,
+    Manual.ManualStatus.REJECTED: 1,
+}
+
+# Blocks rewritten in each later version, as a fraction of the version
+EDIT_FRACTION = 0.1
+
+BLOCK_BATCH_SIZE = 2000
+
+# Latency changes smaller than this are noise, whatever the tolerance
+LATENCY_FLOOR_MS = 1.0
+
+SERVER_TIMING_QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class BenchmarkError(ValueError):
+    """A dataset or server that can't be benchmarked"""
+
+
+def sentence(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + "."
+
+
+def paragraph(rng):
+    return " ".join(sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(1, 4)))
+
+
+BLOCK_MAKERS = {
+    "TEXT": lambda rng, index: {"title": f"Section {index + 1}", "text": paragraph(rng)},
+    "LIST": lambda rng, index: {
+        "title": f"Steps {index + 1}",
+        "items": [sentence(rng, 6) for _ in range(rng.randint(3, 8))],
+        "listType": rng.choice(["bulleted", "numbered"]),
+    },
+    "CHECKLIST": lambda rng, index: {"items": [sentence(rng, 4) for _ in range(rng.randint(3, 6))]},
+    "TABLE": lambda rng, index: {
+        "csvData": "\n".join(",".join(rng.choice(WORDS) for _ in range(4)) for _ in range(rng.randint(3, 10))),
+    },
+    "CODE": lambda rng, index: {
+        "code": "\n".join(f"{rng.choice(WORDS)} --{rng.choice(WORDS)}" for _ in range(rng.randint(2, 6))),
+        "language": "bash",
+    },
+    "QUOTE": lambda rng, index: {"quote": sentence(rng, 12), "author": rng.choice(WORDS).title()},
+}
+
+# TEXT-heavy, like real manuals
+BLOCK_WEIGHTS = {"TEXT": 6, "LIST": 2, "CHECKLIST": 1, "TABLE": 1, "CODE": 1, "QUOTE": 1}
+
+
+def make_block(rng, index):
+    """Generated (type, data) of the block at ``index``"""
+    block_type = rng.choices(list(BLOCK_WEIGHTS), weights=list(BLOCK_WEIGHTS.values()))[0]
+    return block_type, BLOCK_MAKERS[block_type](rng, index)
+
+
+def clear(prefix):
+    """Delete a seeded dataset; rows protected by its users go first"""
+    users = User.objects.filter(username__startswith=f"{prefix}-")
+    with transaction.atomic():
+        AuditLog.objects.filter(actor__in=users).delete()
+        # Not a raw delete: the search index and visibility cache follow deleted manuals
+        Manual.objects.filter(slug__startswith=f"{prefix}-").delete()
+        Category.objects.filter(slug__startswith=f"{prefix}-").delete()
+        Tag.objects.filter(slug__startswith=f"{prefix}-").delete()
+        users.delete()
+
+
+def seed(
+    prefix="bench", users=20, categories=8, tags=20, manuals=100, versions=3, blocks=40, collaborators=2,
+    audit=10, seed=0, password="bench",
+):
+    """
+    Create a dataset (see the module docstring) and return the number of
+    rows of each kind. The same arguments produce the same dataset.
+    """
+    if users < 1 or manuals < 1 or versions < 1:
+        raise BenchmarkError("A dataset needs at least one user, manual and version.")
+    rng = random.Random(seed)
+    roles = list(User.Role)
+    now = timezone.now()
+    with transaction.atomic():
+        # One hash for everyone: hashing per user would dominate seeding
+        hashed = make_password(password)
+        people = User.objects.bulk_create([
+            User(
+                username=f"{prefix}-{index}", password=hashed, role=roles[index % len(roles)],
+                department=rng.choice(DEPARTMENTS), email=f"{prefix}-{index}@example.com",
+            )
+            for index in range(users)
+        ])
+        # bulk_create skips the signal that gives each user a profile
+        Profile.objects.bulk_create([Profile(user=user) for user in people])
+        approvers = [user for user in people if user.role in APPROVER_ROLES] or people
+        category_rows = Category.objects.bulk_create([
+            Category(name=f"{prefix} category {index}", slug=f"{prefix}-category-{index}")
+            for index in range(categories)
+        ])
+        tag_rows = Tag.objects.bulk_create([
+            Tag(name=f"{prefix} tag {index}", slug=f"{prefix}-tag-{index}") for index in range(tags)
+        ])
+
+        manual_rows = Manual.objects.bulk_create([
+            Manual(
+                title=f"{sentence(rng, rng.randint(2, 5))[:-1]} ({prefix} {index})", slug=f"{prefix}-{index}",
+                reference=new_reference(), department=rng.choice(DEPARTMENTS),
+                category=rng.choice(category_rows) if category_rows else None,
+                status=rng.choices(list(STATUS_WEIGHTS), weights=list(STATUS_WEIGHTS.values()))[0],
+                created_by=rng.choice(people),
+            )
+            for index in range(manuals)
+        ])
+        Manual.tags.through.objects.bulk_create([
+            Manual.tags.through(manual=manual, tag=tag)
+            for manual in manual_rows
+            for tag in rng.sample(tag_rows, min(len(tag_rows), rng.randint(0, 3)))
+        ])
+        collaborator_rows = ManualCollaborator.objects.bulk_create([
+            ManualCollaborator(
+                manual=manual, user=user, added_by=manual.created_by,
+                role=rng.choice(list(ManualCollaborator.CollaboratorRole)),
+            )
+            for manual in manual_rows
+            for user in rng.sample(
+                [user for user in people if user.pk != manual.created_by_id],
+                min(collaborators, len(people) - 1),
+            )
+        ])
+
+        version_rows = ManualVersion.objects.bulk_create([
+            ManualVersion(
+                manual=manual, version_number=number, created_by=manual.created_by,
+                changelog=sentence(rng, 6) if number > 1 else "",
+                # Earlier versions were approved; the current one follows the manual
+                is_published=number < versions or manual.status == Manual.ManualStatus.APPROVED,
+            )
+            for manual in manual_rows
+            for number in range(1, versions + 1)
+        ])
+        by_manual = {}
+        for version in version_rows:
+            by_manual.setdefault(version.manual_id, []).append(version)
+
+        block_count = 0
+        pending_blocks = []
+        for manual in manual_rows:
+            content = [make_block(rng, index) for index in range(blocks)]
+            for version in by_manual[manual.pk]:
+                if version.version_number > 1:
+                    # Later versions change a few blocks and share the rest's payloads
+                    content = list(content)
+                    for index in rng.sample(range(blocks), min(blocks, max(1, round(blocks * EDIT_FRACTION)))):
+                        content[index] = make_block(rng, index)
+                pending_blocks += [
+                    ContentBlock(version=version, order=gapped(position), type=block_type, data=data)
+                    for position, (block_type, data) in enumerate(content)
+                ]
+            if len(pending_blocks) >= BLOCK_BATCH_SIZE:
+                block_count += save_blocks(pending_blocks)
+                pending_blocks = []
+        block_count += save_blocks(pending_blocks)
+
+        for manual in manual_rows:
+            manual.current_version = by_manual[manual.pk][-1]
+        Manual.objects.bulk_update(manual_rows, ["current_version"])
+
+        reviews = []
+        for manual in manual_rows:
+            for version in by_manual[manual.pk]:
+                current = version.pk == manual.current_version_id
+                status = ReviewRequest.ReviewStatus.APPROVED
+                if current and manual.status == Manual.ManualStatus.DRAFT:
+                    continue
+                if current and manual.status == Manual.ManualStatus.SUBMITTED:
+                    status = ReviewRequest.ReviewStatus.PENDING
+                elif current and manual.status == Manual.ManualStatus.REJECTED:
+                    status = ReviewRequest.ReviewStatus.REJECTED
+                decided = status != ReviewRequest.ReviewStatus.PENDING
+                reviews.append(ReviewRequest(
+                    version=version, submitted_by=manual.created_by, status=status,
+                    reviewer=rng.choice(approvers) if decided else None,
+                    feedback=sentence(rng, 8) if status == ReviewRequest.ReviewStatus.REJECTED else "",
+                    decided_at=now if decided else None,
+                ))
+        ReviewRequest.objects.bulk_create(reviews)
+
+        actors = {manual.pk: [manual.created_by] for manual in manual_rows}
+        for collaborator in collaborator_rows:
+            actors[collaborator.manual_id].append(collaborator.user)
+        audit_rows = AuditLog.objects.bulk_create([
+            AuditLog(
+                manual=manual, version=rng.choice(by_manual[manual.pk]), actor=rng.choice(actors[manual.pk]),
+                action=rng.choice(list(AuditLog.Action)),
+                created_at=now - datetime.timedelta(minutes=rng.randrange(90 * 24 * 60)),
+            )
+            for manual in manual_rows
+            for _ in range(audit)
+        ])
+        # bulk_create skips the handlers that keep search current
+        schedule_reindex(manual.pk for manual in manual_rows)
+    return {
+        "users": len(people),
+        "categories": len(category_rows),
+        "tags": len(tag_rows),
+        "manuals": len(manual_rows),
+        "versions": len(version_rows),
+        "blocks": block_count,
+        "collaborators": len(collaborator_rows),
+        "reviews": len(reviews),
+        "audit_logs": len(audit_rows),
+    }
+
+
+def save_blocks(blocks):
+    BlockPayload.objects.attach(blocks)
+    ContentBlock.objects.bulk_create(blocks)
+    return len(blocks)
+
+
+class Dataset(NamedTuple):
+    """What the scenarios need to know about a seeded dataset"""
+    prefix: str
+    author: User  # The user owning the most manuals
+    approver: User
+    versions: list  # Ids of every version of the author's manuals
+    current_versions: list  # Ids of the author's manuals' current versions
+    reviews: list  # Ids of pending reviews, oldest first
+    blocks: int  # Blocks per version
+
+
+def load_dataset(prefix):
+    users = User.objects.filter(username__startswith=f"{prefix}-").order_by("id")
+    manuals = Manual.objects.filter(slug__startswith=f"{prefix}-")
+    owners = {}
+    for owner_id in manuals.order_by("id").values_list("created_by_id", flat=True):
+        owners[owner_id] = owners.get(owner_id, 0) + 1
+    if not owners:
+        raise BenchmarkError(f"No benchmark data with prefix {prefix!r}; seed it first.")
+    author = users.get(pk=max(owners, key=owners.get))
+    approver = users.filter(role__in=APPROVER_ROLES).first()
+    if approver is None:
+        raise BenchmarkError(f"The {prefix!r} dataset has no user who can approve reviews.")
+    own = ManualVersion.objects.filter(manual__in=manuals.filter(created_by=author)).order_by("id")
+    current = list(manuals.filter(created_by=author).order_by("id").values_list("current_version_id", flat=True))
+    return Dataset(
+        prefix=prefix,
+        author=author,
+        approver=approver,
+        versions=list(own.values_list("id", flat=True)),
+        current_versions=current,
+        reviews=list(
+            ReviewRequest.objects.filter(version__manual__in=manuals, status=ReviewRequest.ReviewStatus.PENDING)
+            .order_by("id").values_list("id", flat=True)
+        ),
+        blocks=ContentBlock.objects.filter(version_id=current[0]).count(),
+    )
+
+
+def saved_blocks(dataset, iteration):
+    """A version's worth of blocks, one of them new in every iteration"""
+    blocks = [
+        {"type": "TEXT", "data": {"title": f"Section {index + 1}", "text": f"Benchmark block {index}. " * 20}}
+        for index in range(max(dataset.blocks - 1, 0))
+    ]
+    return blocks + [{"type": "TEXT", "data": {"text": f"Revision {iteration}"}}]
+
+
+class Scenario(NamedTuple):
+    actor: str  # Dataset attribute of the user making the requests
+    request: Callable  # (dataset, iteration) -> (method, path, JSON body or None)
+    # Requests change state the scenario depends on, so it runs at most once
+    # per available item and without warm-up (e.g. a review can be approved once)
+    limit: Callable = None
+
+
+SCENARIOS = {
+    "manual_list": Scenario("author", lambda dataset, index: ("GET", "/api/manuals/", None)),
+    "version_detail": Scenario(
+        "author",
+        lambda dataset, index: ("GET", f"/api/versions/{dataset.versions[index % len(dataset.versions)]}/", None),
+    ),
+    "block_save": Scenario(
+        "author",
+        lambda dataset, index: (
+            "POST",
+            f"/api/versions/{dataset.current_versions[index % len(dataset.current_versions)]}/blocks/bulk/",
+            saved_blocks(dataset, index),
+        ),
+    ),
+    "review_approve": Scenario(
+        "approver",
+        lambda dataset, index: ("POST", f"/api/reviews/{dataset.reviews[index]}/approve/", {}),
+        limit=lambda dataset: len(dataset.reviews),
+    ),
+}
+
+
+class ClientTransport:
+    """Requests through the Django test client, in this process"""
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def request(self, method, path, body=None):
+        response = self.client.generic(
+            method, path, json.dumps(body) if body is not None else "",
+            content_type="application/json", headers={"accept": "application/json"},
+        )
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response.status_code, response.headers
+
+
+class HttpTransport:
+    """Requests to a running server, logged in as ``user`` with the seeded password"""
+
+    def __init__(self, base_url, user, password):
+        self.base_url = base_url.rstrip("/")
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        status, _ = self.request("POST", "/api/auth/login/", {"username": user.username, "password": password})
+        if status != 200:
+            raise BenchmarkError(f"Could not log in to {self.base_url} as {user.username} (HTTP {status}).")
+        # Logging in rotates the CSRF token; writes need the new one
+        self.request("GET", "/api/auth/csrf/")
+
+    def request(self, method, path, body=None):
+        headers = {"Accept": "application/json", "Referer": f"{self.base_url}/"}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        token = next((cookie.value for cookie in self.cookies if cookie.name == settings.CSRF_COOKIE_NAME), None)
+        if token:
+            headers["X-CSRFToken"] = token
+        request = urllib.request.Request(f"{self.base_url}{path}", data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status, response.headers
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code, error.headers
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def queries_from(headers):
+    """The query count in a Server-Timing header, or None without one"""
+    match = SERVER_TIMING_QUERIES_RE.search(headers.get("Server-Timing") or "")
+    return int(match.group(1)) if match else None
+
+
+def peak_rss_kb(pid=None):
+    """
+    Peak resident set size in KiB of this process, or of process ``pid`` on
+    Linux; None where it can't be read
+    """
+    if pid is not None:
+        try:
+            with open(f"/proc/{pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return None
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_scenario(transport, scenario, dataset, requests, warmup=0):
+    """Time ``requests`` requests of a scenario and summarize them"""
+    if scenario.limit is not None:
+        requests, warmup = min(requests, scenario.limit(dataset)), 0
+    for index in range(warmup):
+        transport.request(*scenario.request(dataset, index))
+    latencies, queries, errors = [], [], []
+    for index in range(warmup, warmup + requests):
+        method, path, body = scenario.request(dataset, index)
+        started = time.perf_counter()
+        status, headers = transport.request(method, path, body)
+        elapsed = time.perf_counter() - started
+        if status >= 400:
+            errors.append(status)
+            continue
+        latencies.append(elapsed * 1000)
+        queries.append(queries_from(headers))
+    counted = [count for count in queries if count is not None]
+    return {
+        "requests": requests,
+        "errors": len(errors),
+        "error_statuses": sorted(set(errors)),
+        "p50_ms": round(percentile(latencies, 0.5), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95), 2) if latencies else None,
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else None,
+        "queries": round(statistics.fmean(counted), 1) if counted else None,
+        "max_queries": max(counted) if counted else None,
+    }
+
+
+def run(dataset, scenarios, requests, warmup=0, base_url=None, password=None, server_pid=None):
+    """
+    Run the named scenarios in order, in process or against ``base_url``,
+    and return the results as a JSON-serializable dict
+    """
+    results = {
+        "dataset": dataset.prefix,
+        "target": base_url or "in-process",
+        "database": settings.DATABASES["default"]["ENGINE"],
+        "python": sys.version.split()[0],
+        "requests": requests,
+        "scenarios": {},
+    }
+    # In process, the instrumentation middleware supplies the query counts
+    instrumented = override_settings(REQUEST_INSTRUMENTATION=True, REQUEST_SLOW_MS=float("inf"))
+    with instrumented:
+        transports = {}
+        for name in scenarios:
+            scenario = SCENARIOS[name]
+            if scenario.actor not in transports:
+                user = getattr(dataset, scenario.actor)
+                transports[scenario.actor] = (
+                    HttpTransport(base_url, user, password) if base_url else ClientTransport(user)
+                )
+            summary = run_scenario(transports[scenario.actor], scenario, dataset, requests, warmup)
+            summary["peak_rss_kb"] = peak_rss_kb(server_pid)
+            results["scenarios"][name] = summary
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Where ``results`` regressed against ``baseline``: latency or peak RSS
+    more than ``tolerance`` above it, more queries per request, or errors
+    """
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        if current["errors"] > previous.get("errors", 0):
+            regressions.append(f"{name}: {current['errors']} errors (was {previous.get('errors', 0)})")
+        for metric in ("p50_ms", "p95_ms"):
+            now, before = current.get(metric), previous.get(metric)
+            if now is None or before is None:
+                continue
+            if now > before * (1 + tolerance) and now - before > LATENCY_FLOOR_MS:
+                regressions.append(f"{name}: {metric} {now} (was {before})")
+        now, before = current.get("queries"), previous.get("queries")
+        if now is not None and before is not None and now > before:
+            regressions.append(f"{name}: {now} queries per request (was {before})")
+        now, before = current.get("peak_rss_kb"), previous.get("peak_rss_kb")
+        if now is not None and before is not None and now > before * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {now} KiB (was {before})")
+    return regressions
@@ -0,0 +1,106 @@
+"""
+Strong ETags for conditional GETs on manuals, versions and review content.
+
+Each ETag comes from one aggregate query over the row's timestamps and its
+block or collaborator set; a manual's tags take a second query, since
+joining them too would multiply the collaborator aggregates. Views compare
+the ETag with If-None-Match and answer 304 before loading or serializing
+anything.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .models import ManualVersion, Tag
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest())
+
+
+def manual_etag_row(queryset):
+    return (
+        queryset.prefetch_related(None)
+        .annotate(
+            collaborator_count=Count("collaborators"),
+            collaborators_updated=Max("collaborators__updated_at"),
+        )
+        .values_list(
+            "pk", "updated_at", "status", "current_version_id", "collaborator_count", "collaborators_updated",
+            "category_id", "category__name", "category__updated_at",
+        )
+    )
+
+
+def manual_tags(manual_id):
+    # Tag changes don't touch the manual row, and renames only the tag's
+    return Tag.objects.filter(manuals=manual_id).order_by("pk").values_list("pk", "name", "updated_at")
+
+
+def version_etag_row(version_id):
+    return (
+        ManualVersion.objects.filter(pk=version_id)
+        .annotate(
+            block_count=Count("blocks"),
+            last_block_id=Max("blocks__id"),
+            blocks_updated=Max("blocks__updated_at"),
+        )
+        .values_list("pk", "updated_at", "is_published", "block_count", "last_block_id", "blocks_updated")
+    )
+
+
+def manual_etag(queryset, user):
+    """
+    ETag for a manual's detail payload, or None if ``queryset`` is empty.
+    The user is part of the tag because can_edit/can_view are per user.
+    """
+    row = manual_etag_row(queryset).first()
+    if row is None:
+        return None
+    return make_etag("manual", user.pk, *row, *manual_tags(row[0]))
+
+
+async def amanual_etag(queryset, user):
+    row = await manual_etag_row(queryset).afirst()
+    if row is None:
+        return None
+    return make_etag("manual", user.pk, *row, *[tag async for tag in manual_tags(row[0])])
+
+
+def version_etag(version_id):
+    """
+    ETag for a version and its blocks, or None if it doesn't exist. Block
+    edits bump the block's updated_at and deletes change the count.
+    """
+    if not str(version_id).isdigit():
+        return None
+    row = version_etag_row(version_id).first()
+    if row is None:
+        return None
+    return make_etag("version", *row)
+
+
+async def aversion_etag(version_id):
+    if not str(version_id).isdigit():
+        return None
+    row = await version_etag_row(version_id).afirst()
+    if row is None:
+        return None
+    return make_etag("version", *row)
+
+
+def not_modified(request, etag):
+    """The 304 (or 412) response for a matching conditional request, else None"""
+    if etag is None:
+        return None
+    return get_conditional_response(request, etag=etag)
+
+
+def with_etag(response, etag):
+    if etag is not None and response.status_code == 200:
+        response["ETag"] = etag
+        # Let browsers keep the payload but revalidate it on every use
+        response["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,128 @@
+"""
+Resized variants of image assets.
+
+Each image asset gets one variant per entry of
+``settings.ASSET_IMAGE_VARIANTS`` (name -> maximum width), recompressed as
+WebP where Pillow supports it. Variants are stored next to the originals
+under ``derivatives/ab/<digest>-<width>.<ext>`` and recorded in
+``Asset.variants``, keyed by width, so changing a size produces new files
+rather than overwriting ones browsers have cached as immutable.
+
+Variants are rendered when a block payload first references the asset,
+after the transaction commits, in a process pool of
+``settings.ASSET_DERIVATIVE_WORKERS`` processes (0 renders inline). A
+variant requested before it exists is rendered on the spot.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+
+from . import imaging
+from .assets import asset_url, get_storage, open_asset
+from .models import Asset
+
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg", "PNG": "png"}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_sizes():
+    return getattr(settings, "ASSET_IMAGE_VARIANTS", {"thumbnail": 320, "medium": 1024, "full": 2048})
+
+
+def variant_urls(digest):
+    """URLs of an image asset's variants by name; they need no lookup to build"""
+    base = asset_url(digest)
+    return {name: f"{base}{width}/" for name, width in variant_sizes().items()}
+
+
+def derivative_name(digest, width, fmt):
+    return f"derivatives/{digest[:2]}/{digest}-{width}.{EXTENSIONS[fmt]}"
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned, not forked, so workers don't inherit the server's threads and connections
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, "ASSET_DERIVATIVE_WORKERS", 2),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def generate(asset, widths=None, pool=False):
+    """
+    Render and store the missing variants of an image asset and record them
+    on it. Returns the updated ``asset.variants``.
+    """
+    if asset.content_type not in imaging.SOURCE_TYPES:
+        return asset.variants
+    widths = [width for width in widths or sorted(set(variant_sizes().values())) if str(width) not in asset.variants]
+    if not widths:
+        return asset.variants
+    with open_asset(asset) as original:
+        content = original.read()
+    options = {
+        "quality": getattr(settings, "ASSET_IMAGE_QUALITY", 80),
+        "webp": imaging.webp_available(),
+    }
+    try:
+        if pool:
+            rendered = get_executor().submit(imaging.render, content, widths, **options).result()
+        else:
+            rendered = imaging.render(content, widths, **options)
+    except Exception:
+        logger.warning("Could not render variants of asset %s", asset.digest, exc_info=True)
+        return asset.variants
+    storage = get_storage()
+    variants = dict(asset.variants)
+    for width, (data, fmt, (actual_width, height)) in rendered.items():
+        name = derivative_name(asset.digest, width, fmt)
+        if not storage.exists(name):
+            storage.save(name, ContentFile(data))
+        variants[str(width)] = {
+            "name": name, "content_type": imaging.CONTENT_TYPES[fmt], "size": len(data),
+            "width": actual_width, "height": height,
+        }
+    with transaction.atomic():
+        # Merge with whatever a concurrent render recorded meanwhile
+        current = Asset.objects.select_for_update().get(pk=asset.pk)
+        current.variants = {**current.variants, **variants}
+        current.save(update_fields=["variants"])
+    asset.variants = current.variants
+    return asset.variants
+
+
+def generate_all(digests):
+    try:
+        for asset in Asset.objects.filter(digest__in=digests, content_type__in=imaging.SOURCE_TYPES):
+            generate(asset, pool=True)
+    finally:
+        # The background thread owns its own connection
+        connections.close_all()
+
+
+def schedule(digests):
+    """Render the variants of newly referenced image assets once the transaction commits"""
+    digests = list(digests)
+    if not digests:
+        return
+    if getattr(settings, "ASSET_DERIVATIVE_WORKERS", 2) <= 0:
+        transaction.on_commit(
+            lambda: [generate(asset) for asset in Asset.objects.filter(digest__in=digests)]
+        )
+        return
+    transaction.on_commit(
+        lambda: threading.Thread(target=generate_all, args=(digests,), name="asset-derivatives", daemon=True).start()
+    )
@@ -0,0 +1,272 @@
+"""
+Block-level diffs between two versions of a manual.
+
+Blocks are aligned by payload: copy-on-write versions share BlockPayload rows
+for untouched blocks, so the longest common run of payload ids is the
+unchanged content and only the blocks around it need their data loaded. Of
+the rest, blocks whose payload reappears elsewhere are moves, blocks of the
+same type in the same gap that are similar enough are modifications (with a
+word, item or row diff of their TEXT/LIST/TABLE fields), and the remainder
+are deletions and insertions.
+
+A diff depends only on the content of the two versions, so it is cached
+under both versions' ETags in the cache named by
+``settings.VERSION_DIFF_CACHE``; any block edit changes an ETag and with it
+the key.
+"""
+import difflib
+import json
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .conditional import make_etag
+from .models import BlockPayload, ContentBlock
+
+
+CACHE_KEY = "version-diff:{from_etag}:{to_etag}"
+
+# Minimum similarity for a changed block to count as a modification of an
+# old one rather than a deletion plus an insertion
+SIMILARITY = 0.5
+
+WORD_RE = re.compile(r"\s+|\w+|[^\w\s]")
+
+
+def get_cache():
+    return caches[getattr(settings, "VERSION_DIFF_CACHE", "default")]
+
+
+def words(value):
+    return WORD_RE.findall(value)
+
+
+def lines(value):
+    return value.split("\n")
+
+
+def sequence(value):
+    return value
+
+
+# Fields diffed inside a modified block, and how each is split into tokens.
+# Other fields are reported as a whole old/new pair when they change.
+TEXT_FIELDS = {
+    "TEXT": {"title": words, "text": words},
+    "LIST": {"title": words, "items": sequence},
+    "TABLE": {"title": words, "csvData": lines},
+}
+
+
+def diff_tokens(old, new, split):
+    """
+    ``[["=", ...], ["-", ...], ["+", ...]]`` segments turning ``old`` into
+    ``new``. Word and line segments are joined back into strings; item
+    segments stay lists.
+    """
+    a, b = split(old), split(new)
+    segments = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        parts = []
+        if tag == "equal":
+            parts.append(("=", a[i1:i2]))
+        else:
+            if i1 < i2:
+                parts.append(("-", a[i1:i2]))
+            if j1 < j2:
+                parts.append(("+", b[j1:j2]))
+        for op, tokens in parts:
+            if split is words:
+                tokens = "".join(tokens)
+            elif split is lines:
+                tokens = "\n".join(tokens)
+            segments.append([op, tokens])
+    return merge_whitespace(segments) if split is words else segments
+
+
+def merge_whitespace(segments):
+    """
+    Fold whitespace-only "=" segments between two changes into the changes,
+    so "hard hat" -> "safety helmet" reads as one replacement, not two
+    """
+    merged = []
+    removed = added = ""
+    for index, (op, text) in enumerate(segments):
+        if op == "=":
+            following = segments[index + 1][0] if index + 1 < len(segments) else "="
+            if text.isspace() and (removed or added) and following != "=":
+                removed += text
+                added += text
+                continue
+            merged.extend([change, value] for change, value in (("-", removed), ("+", added)) if value)
+            removed = added = ""
+            merged.append([op, text])
+        elif op == "-":
+            removed += text
+        else:
+            added += text
+    merged.extend([change, value] for change, value in (("-", removed), ("+", added)) if value)
+    return merged
+
+
+def diff_data(block_type, old, new):
+    """Per-field changes between two data dicts of the same block type"""
+    splitters = TEXT_FIELDS.get(block_type, {})
+    fields = {}
+    for key in sorted(set(old) | set(new)):
+        before, after = old.get(key), new.get(key)
+        if before == after:
+            continue
+        split = splitters.get(key)
+        if split is sequence and all(isinstance(value, list) for value in (before or [], after or [])):
+            fields[key] = {"diff": diff_tokens(before or [], after or [], split)}
+        elif split is not None and all(isinstance(value, str) for value in (before or "", after or "")):
+            fields[key] = {"diff": diff_tokens(before or "", after or "", split)}
+        else:
+            fields[key] = {"old": before, "new": after}
+    return fields
+
+
+def similarity(old, new):
+    a = json.dumps(old, sort_keys=True, ensure_ascii=False)
+    b = json.dumps(new, sort_keys=True, ensure_ascii=False)
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    if matcher.real_quick_ratio() < SIMILARITY or matcher.quick_ratio() < SIMILARITY:
+        return 0
+    return matcher.ratio()
+
+
+def load_blocks(version):
+    """``(block_id, payload_id, type)`` in document order; empty for no version"""
+    if version is None:
+        return []
+    return list(
+        ContentBlock.objects.filter(version=version)
+        .order_by("order", "created_at")
+        .values_list("id", "payload_id", "payload__type")
+    )
+
+
+def pair_modified(old, new, removed, added, data):
+    """
+    Map new positions to the old positions they modify, within one gap. A
+    lone block replaced by a lone block of the same type always pairs;
+    otherwise each new block takes the most similar unpaired old block of
+    its type, if that is similar enough.
+    """
+    if len(removed) == 1 and len(added) == 1 and old[removed[0]][2] == new[added[0]][2]:
+        return {added[0]: removed[0]}
+    pairs = {}
+    available = list(removed)
+    for j in added:
+        best, best_score = None, SIMILARITY
+        for i in available:
+            if old[i][2] != new[j][2]:
+                continue
+            score = similarity(data[old[i][1]], data[new[j][1]])
+            if score >= best_score:
+                best, best_score = i, score
+        if best is not None:
+            pairs[j] = best
+            available.remove(best)
+    return pairs
+
+
+def compute_diff(from_version, to_version):
+    """
+    The change set turning ``from_version`` (None for an empty manual) into
+    ``to_version``. Changes are listed in the order of the new document, each
+    deletion just before the blocks that replaced it; unchanged blocks are
+    only counted.
+    """
+    old = load_blocks(from_version)
+    new = load_blocks(to_version)
+    matcher = difflib.SequenceMatcher(
+        None, [entry[1] for entry in old], [entry[1] for entry in new], autojunk=False
+    )
+    gaps = []
+    unchanged = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            unchanged += i2 - i1
+        else:
+            gaps.append((range(i1, i2), range(j1, j2)))
+
+    # Moves: the same payload left one gap and turned up in another
+    departed = {}
+    for old_positions, _ in gaps:
+        for i in old_positions:
+            departed.setdefault(old[i][1], []).append(i)
+    moves = {}
+    for _, new_positions in gaps:
+        for j in new_positions:
+            if departed.get(new[j][1]):
+                moves[j] = departed[new[j][1]].pop(0)
+    moved = set(moves.values())
+
+    # Only blocks that may be modified, inserted or deleted need their data
+    needed = {old[i][1] for old_positions, _ in gaps for i in old_positions if i not in moved}
+    needed |= {new[j][1] for _, new_positions in gaps for j in new_positions if j not in moves}
+    data = dict(BlockPayload.objects.filter(pk__in=needed).values_list("pk", "data"))
+
+    def block(op, i=None, j=None, **extra):
+        entry = {"op": op, "type": new[j][2] if j is not None else old[i][2]}
+        if i is not None:
+            entry.update(from_block=old[i][0], from_position=i)
+        if j is not None:
+            entry.update(to_block=new[j][0], to_position=j)
+        entry.update(extra)
+        return entry
+
+    counts = {"unchanged": unchanged, "moved": len(moves), "modified": 0, "inserted": 0, "deleted": 0}
+    changes = []
+    for old_positions, new_positions in gaps:
+        removed = [i for i in old_positions if i not in moved]
+        added = [j for j in new_positions if j not in moves]
+        pairs = pair_modified(old, new, removed, added, data)
+        paired = set(pairs.values())
+        for i in removed:
+            if i not in paired:
+                counts["deleted"] += 1
+                changes.append(block("delete", i=i, data=data[old[i][1]]))
+        for j in new_positions:
+            if j in moves:
+                changes.append(block("move", i=moves[j], j=j))
+            elif j in pairs:
+                counts["modified"] += 1
+                i = pairs[j]
+                changes.append(block("modify", i=i, j=j, fields=diff_data(new[j][2], data[old[i][1]], data[new[j][1]])))
+            else:
+                counts["inserted"] += 1
+                changes.append(block("insert", j=j, data=data[new[j][1]]))
+    return {
+        "from": from_version.pk if from_version is not None else None,
+        "to": to_version.pk,
+        "summary": counts,
+        "changes": changes,
+    }
+
+
+def diff_etag(from_etag, to_etag):
+    return make_etag("diff", from_etag, to_etag)
+
+
+def get_diff(from_version, to_version, from_etag, to_etag):
+    """``compute_diff`` through the cache, keyed by the two versions' ETags"""
+    key = CACHE_KEY.format(from_etag=from_etag.strip('"'), to_etag=to_etag.strip('"'))
+    cache = get_cache()
+    result = cache.get(key)
+    if result is None:
+        result = compute_diff(from_version, to_version)
+        cache.set(key, result, getattr(settings, "VERSION_DIFF_CACHE_TIMEOUT", 86400))
+    return result
+
+
+def previous_published(version):
+    """The latest published version of the manual before ``version``, if any"""
+    return (
+        version.manual.versions.filter(is_published=True, version_number__lt=version.version_number)
+        .order_by("-version_number")
+        .first()
+    )
@@ -0,0 +1,126 @@
+"""
+Query-parameter filters for the audit, review and version lists.
+
+Each ``filter_*`` function narrows a queryset by the parameters it knows and
+ignores the rest. Every parameter maps to a column that leads one of the
+model's composite indexes, with the list's ordering column second, so a
+filtered page is an index range scan rather than a table scan. Malformed
+values raise ValidationError, which DRF turns into a 400.
+"""
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import AuditLog, ReviewRequest
+
+
+TRUE_VALUES = {"1", "true", "yes"}
+FALSE_VALUES = {"0", "false", "no"}
+
+
+def int_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Must be an integer."})
+
+
+def bool_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    if value.lower() in TRUE_VALUES:
+        return True
+    if value.lower() in FALSE_VALUES:
+        return False
+    raise ValidationError({name: "Must be true or false."})
+
+
+def datetime_param(params, name):
+    """An ISO date (midnight UTC) or datetime (UTC if naive)"""
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: "Must be an ISO 8601 date or datetime."})
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.timezone.utc)
+    return moment
+
+
+def choices_param(params, name, choices):
+    """Comma-separated values, each one of ``choices``"""
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    values = [item.strip().upper() for item in value.split(",") if item.strip()]
+    unknown = sorted(set(values) - set(choices))
+    if unknown:
+        raise ValidationError({name: f"Unknown value(s): {', '.join(unknown)}."})
+    return values
+
+
+def filter_date_range(queryset, params, field):
+    """?since= (inclusive) and ?until= (exclusive) on ``field``"""
+    since = datetime_param(params, "since")
+    until = datetime_param(params, "until")
+    if since is not None:
+        queryset = queryset.filter(**{f"{field}__gte": since})
+    if until is not None:
+        queryset = queryset.filter(**{f"{field}__lt": until})
+    return queryset
+
+
+def filter_audit_log(queryset, params):
+    """?manual=, ?actor=, ?action=A,B, ?since=, ?until= (indexes: manual/actor/action + created_at)"""
+    manual = int_param(params, "manual")
+    if manual is not None:
+        queryset = queryset.filter(manual_id=manual)
+    actor = int_param(params, "actor")
+    if actor is not None:
+        queryset = queryset.filter(actor_id=actor)
+    actions = choices_param(params, "action", AuditLog.Action.values)
+    if actions:
+        queryset = queryset.filter(action__in=actions)
+    return filter_date_range(queryset, params, "created_at")
+
+
+def filter_reviews(queryset, params):
+    """
+    ?status=A,B, ?reviewer= (a user id, or "none" for unassigned) and
+    ?department= (the manual's; uses the Manual department index)
+    """
+    statuses = choices_param(params, "status", ReviewRequest.ReviewStatus.values)
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    if params.get("reviewer", "").lower() == "none":
+        queryset = queryset.filter(reviewer__isnull=True)
+    else:
+        reviewer = int_param(params, "reviewer")
+        if reviewer is not None:
+            queryset = queryset.filter(reviewer_id=reviewer)
+    department = params.get("department")
+    if department:
+        queryset = queryset.filter(version__manual__department=department)
+    return queryset
+
+
+def filter_versions(queryset, params):
+    """?manual=, ?published=true|false, ?since=, ?until= (indexes: manual/is_published + created_at)"""
+    manual = int_param(params, "manual")
+    if manual is not None:
+        queryset = queryset.filter(manual_id=manual)
+    published = bool_param(params, "published")
+    if published is not None:
+        # IN rather than a bare boolean column, which SQLite won't match to an index
+        queryset = queryset.filter(is_published__in=[published])
+    return filter_date_range(queryset, params, "created_at")
@@ -0,0 +1,49 @@
+"""
+Resizing for image asset derivatives (see api/derivatives.py).
+
+Kept free of Django imports so ``render`` can run in a spawned worker
+process without setting Django up there.
+"""
+import io
+
+from PIL import Image, ImageOps, features
+
+
+# Formats Pillow may decode here; anything else keeps only its original
+SOURCE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/bmp", "image/tiff"}
+
+CONTENT_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+
+def webp_available():
+    return features.check("webp")
+
+
+def output_format(image, webp):
+    if webp:
+        return "WEBP"
+    return "PNG" if image.mode in ("RGBA", "LA", "P") else "JPEG"
+
+
+def render(content, widths, quality=80, webp=True):
+    """
+    Scale the image in ``content`` down to each of ``widths`` (never up) and
+    recompress it. Returns ``{width: (bytes, format, (width, height))}``.
+    """
+    image = Image.open(io.BytesIO(content))
+    image = ImageOps.exif_transpose(image)
+    fmt = output_format(image, webp)
+    if fmt == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        image = image.convert("RGBA")
+    results = {}
+    for width in widths:
+        variant = image
+        if image.width > width:
+            variant = image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        options = {"quality": quality} if fmt in ("WEBP", "JPEG") else {"optimize": True}
+        variant.save(buffer, fmt, **options)
+        results[width] = (buffer.getvalue(), fmt, variant.size)
+    return results
@@ -0,0 +1,187 @@
+"""
+Per-request timing and SQL instrumentation.
+
+With ``settings.REQUEST_INSTRUMENTATION`` on, InstrumentationMiddleware
+collects a RequestMetrics for each request: the number and total time of
+its SQL queries (through a database execute wrapper installed on every
+connection), the time spent in ``to_representation`` of serializers using
+TimedSerializerMixin, the view
+time and the total time. They are returned in a ``Server-Timing`` header,
+and requests slower than ``settings.REQUEST_SLOW_MS`` are logged to
+``api.instrumentation`` as one JSON object that includes the statements run
+most often, which is how N+1 queries show up.
+
+Streamed response bodies are produced after the headers are sent, so their
+queries are not counted.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+logger = logging.getLogger(__name__)
+
+# Metrics of the request being handled, or None when not instrumenting
+_current = ContextVar("request_metrics", default=None)
+
+IN_LIST_RE = re.compile(r"\((?:%s, )+%s\)")
+
+
+def normalize(sql):
+    """Collapse IN lists so statements differing only in list length group together"""
+    return IN_LIST_RE.sub("(%s, ...)", sql)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.finished = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.statements = {}  # normalized SQL -> [count, seconds]
+        self.lock = threading.Lock()
+        self.serialize_depth = threading.local()
+
+    def record_query(self, sql, duration):
+        with self.lock:
+            self.queries += 1
+            self.db_time += duration
+            entry = self.statements.setdefault(normalize(sql), [0, 0.0])
+            entry[0] += 1
+            entry[1] += duration
+
+    def duplicates(self, limit=5):
+        """The statements run more than once, most frequent first"""
+        repeated = sorted(
+            ((count, duration, sql) for sql, (count, duration) in self.statements.items() if count > 1), reverse=True
+        )
+        return [
+            {"sql": sql, "count": count, "ms": round(duration * 1000, 2)} for count, duration, sql in repeated[:limit]
+        ]
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def total_time(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def view_time(self):
+        if self.view_started is None:
+            return None
+        return (self.finished or time.perf_counter()) - self.view_started
+
+    def server_timing(self):
+        entries = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f"serialize;dur={self.serialize_time * 1000:.1f}",
+        ]
+        if self.view_time is not None:
+            entries.append(f"view;dur={self.view_time * 1000:.1f}")
+        entries.append(f"total;dur={self.total_time * 1000:.1f}")
+        return ", ".join(entries)
+
+    def as_log_record(self, request, response):
+        view_time = self.view_time
+        return {
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "total_ms": round(self.total_time * 1000, 2),
+            "view_ms": round(view_time * 1000, 2) if view_time is not None else None,
+            "db_ms": round(self.db_time * 1000, 2),
+            "queries": self.queries,
+            "serialize_ms": round(self.serialize_time * 1000, 2),
+            "duplicates": self.duplicates(),
+        }
+
+
+def current():
+    return _current.get()
+
+
+def instrument(execute, sql, params, many, context):
+    """Database execute wrapper timing each query of an instrumented request"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - started)
+
+
+def install(connection):
+    if instrument not in connection.execute_wrappers:
+        connection.execute_wrappers.append(instrument)
+
+
+@receiver(connection_created)
+def install_on_new_connection(sender, connection, **kwargs):
+    install(connection)
+
+
+def begin():
+    """Start collecting metrics for the current request"""
+    for connection in connections.all(initialized_only=True):
+        # Connections opened before this module was loaded
+        install(connection)
+    return _current.set(RequestMetrics())
+
+
+def discard(token):
+    _current.reset(token)
+
+
+def end(token, request, response):
+    """Stop collecting, add the Server-Timing header and log a slow request"""
+    metrics = _current.get()
+    _current.reset(token)
+    metrics.finish()
+    response["Server-Timing"] = metrics.server_timing()
+    if metrics.total_time * 1000 >= getattr(settings, "REQUEST_SLOW_MS", 500):
+        logger.warning(json.dumps(metrics.as_log_record(request, response)))
+    return response
+
+
+@contextmanager
+def serializing():
+    """
+    Time serializer output. Nested and list serializers run inside an outer
+    one, so only the outermost call on each thread is counted.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    depth = getattr(metrics.serialize_depth, "value", 0)
+    metrics.serialize_depth.value = depth + 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialize_depth.value = depth
+        if depth == 0:
+            with metrics.lock:
+                metrics.serialize_time += time.perf_counter() - started
+
+
+class TimedSerializerMixin:
+    """Counts a serializer's ``to_representation`` as serialize time"""
+
+    def to_representation(self, instance):
+        with serializing():
+            return super().to_representation(instance)
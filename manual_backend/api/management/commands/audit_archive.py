@@ -0,0 +1,59 @@
+import datetime
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.archive import encode
+from api.retention import archive_dir, archive_expired, read_archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move audit entries past their retention period (AUDIT_RETENTION_DAYS) into "
+        "monthly gzip NDJSON files in AUDIT_ARCHIVE_DIR, or with --query print archived "
+        "entries matching the filters as NDJSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be archived")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows moved per transaction")
+        query = parser.add_argument_group("query")
+        query.add_argument("--query", action="store_true", help="Read archived entries instead of archiving")
+        query.add_argument("--month", action="append", default=[], help="YYYY-MM file to scan (repeatable)")
+        query.add_argument("--manual", type=int, help="Manual id")
+        query.add_argument("--actor", help="Actor username or id")
+        query.add_argument("--action", help="Audit action, e.g. APPROVE")
+        query.add_argument("--since", help="YYYY-MM-DD, inclusive")
+        query.add_argument("--until", help="YYYY-MM-DD, exclusive")
+
+    def handle(self, *args, **options):
+        if options["query"]:
+            self.query(options)
+            return
+        counts = archive_expired(batch_size=options["batch_size"], dry_run=options["dry_run"])
+        verb = "Would archive" if options["dry_run"] else "Archived"
+        for month, count in sorted(counts.items()):
+            self.stdout.write(f"{month}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"{verb} {sum(counts.values())} audit entries to {archive_dir()}."))
+
+    def query(self, options):
+        actor = options["actor"]
+        records = read_archive(
+            months=set(options["month"]),
+            manual=options["manual"],
+            actor=int(actor) if actor and actor.isdigit() else actor,
+            action=options["action"],
+            since=self.parse_day(options["since"]),
+            until=self.parse_day(options["until"]),
+        )
+        for record in records:
+            self.stdout.write(json.dumps(record, default=encode, ensure_ascii=False, separators=(",", ":")))
+
+    def parse_day(self, value):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date {value!r}; expected YYYY-MM-DD.")
+        return datetime.datetime.combine(day, datetime.time.min, tzinfo=datetime.timezone.utc)
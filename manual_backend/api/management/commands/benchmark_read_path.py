@@ -0,0 +1,179 @@
+import asyncio
+import io
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+
+from accounts.models import User
+from api.models import AuditLog, BlockPayload, ContentBlock, Manual, ManualVersion, ReviewRequest
+from manual_backend.asgi import ManualBackendASGIHandler
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the WSGI path (DRF views on a thread pool) with the ASGI app "
+        "(async read views on one event loop) for the hot read endpoints. "
+        "Requests are driven in-process, so the numbers exclude HTTP parsing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000, help="Requests per mode")
+        parser.add_argument("--threads", type=int, default=8, help="WSGI worker threads")
+        parser.add_argument("--concurrency", type=int, default=64, help="Concurrent ASGI requests")
+        parser.add_argument("--manuals", type=int, default=50)
+        parser.add_argument("--blocks", type=int, default=20, help="Blocks per version")
+        parser.add_argument(
+            "--modes", default="wsgi,asgi-sync,asgi",
+            help="Comma-separated: wsgi, asgi-sync (DRF views under ASGI), asgi (async views)",
+        )
+
+    def handle(self, *args, **options):
+        user, manuals = self.seed(options["manuals"], options["blocks"])
+        try:
+            client = Client()
+            client.force_login(user)
+            cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+            paths = self.paths(manuals)
+            runners = {
+                "wsgi": lambda: self.run_wsgi(paths, cookie, options["requests"], options["threads"]),
+                "asgi-sync": lambda: asyncio.run(
+                    self.run_asgi(ASGIHandler(), paths, cookie, options["requests"], options["concurrency"])
+                ),
+                "asgi": lambda: asyncio.run(
+                    self.run_asgi(ManualBackendASGIHandler(), paths, cookie, options["requests"], options["concurrency"])
+                ),
+            }
+            self.stdout.write(f"{len(paths)} endpoints, {options['requests']} requests per mode")
+            for mode in options["modes"].split(","):
+                connections.close_all()
+                wall, latencies, errors = runners[mode.strip()]()
+                self.report(mode.strip(), wall, latencies, errors)
+            client.logout()
+        finally:
+            connections.close_all()
+            self.cleanup(user, manuals)
+
+    def seed(self, manual_count, block_count):
+        run_id = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(username=f"readbench-{run_id}", password=uuid.uuid4().hex)
+        manuals = []
+        for index in range(manual_count):
+            manual = Manual.objects.create(
+                title=f"Read benchmark {run_id} #{index}", slug=f"readbench-{run_id}-{index}", created_by=user,
+                status=Manual.ManualStatus.APPROVED if index % 2 else Manual.ManualStatus.DRAFT,
+            )
+            version = ManualVersion.objects.create(manual=manual, version_number=1, created_by=user)
+            blocks = [
+                ContentBlock(version=version, order=order, type="TEXT", data={"text": f"Section {order} " * 30})
+                for order in range(block_count)
+            ]
+            BlockPayload.objects.attach(blocks)
+            ContentBlock.objects.bulk_create(blocks)
+            manual.current_version = version
+            manual.save(update_fields=["current_version"])
+            ReviewRequest.objects.create(version=version, submitted_by=user)
+            AuditLog.objects.create(manual=manual, version=version, action=AuditLog.Action.CREATE, actor=user)
+            manuals.append(manual)
+        return user, manuals
+
+    def paths(self, manuals):
+        paths = ["/api/manuals/", "/api/audit/"]
+        for manual in manuals[:10]:
+            review = manual.current_version.review_requests.first()
+            paths += [
+                f"/api/manuals/{manual.slug}/",
+                f"/api/versions/{manual.current_version_id}/preview/",
+                f"/api/reviews/{review.pk}/content/",
+            ]
+        return paths
+
+    def run_wsgi(self, paths, cookie, total, threads):
+        handler = WSGIHandler()
+
+        def request(path):
+            status = []
+            environ = {
+                "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SCRIPT_NAME": "",
+                "SERVER_NAME": "localhost", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+                "HTTP_HOST": "localhost", "HTTP_COOKIE": cookie, "HTTP_ACCEPT": "application/json",
+                "wsgi.input": io.BytesIO(), "wsgi.errors": io.StringIO(), "wsgi.url_scheme": "http",
+                "wsgi.version": (1, 0), "wsgi.multithread": True, "wsgi.multiprocess": False, "wsgi.run_once": False,
+            }
+            started = time.perf_counter()
+            response = handler(environ, lambda code, headers: status.append(int(code.split()[0])))
+            try:
+                b"".join(response)
+            finally:
+                response.close()
+            return time.perf_counter() - started, status[0]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(request, (paths[index % len(paths)] for index in range(total))))
+        return time.perf_counter() - started, *self.split(results)
+
+    async def run_asgi(self, application, paths, cookie, total, concurrency):
+        limit = asyncio.Semaphore(concurrency)
+
+        async def request(path):
+            async with limit:
+                scope = {
+                    "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                    "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+                    "headers": [(b"host", b"localhost"), (b"cookie", cookie.encode()), (b"accept", b"application/json")],
+                    "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+                }
+                done = asyncio.Event()
+                messages = iter([{"type": "http.request", "body": b"", "more_body": False}])
+                status = []
+
+                async def receive():
+                    message = next(messages, None)
+                    if message is None:
+                        # Django listens for a disconnect until the response is sent
+                        await done.wait()
+                        return {"type": "http.disconnect"}
+                    return message
+
+                async def send(message):
+                    if message["type"] == "http.response.start":
+                        status.append(message["status"])
+                    elif not message.get("more_body"):
+                        done.set()
+
+                started = time.perf_counter()
+                await application(scope, receive, send)
+                return time.perf_counter() - started, status[0]
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(request(paths[index % len(paths)]) for index in range(total)))
+        return time.perf_counter() - started, *self.split(results)
+
+    def split(self, results):
+        latencies = [elapsed for elapsed, code in results if code == 200]
+        errors = [code for _, code in results if code != 200]
+        return latencies, errors
+
+    def report(self, mode, wall, latencies, errors):
+        line = f"{mode:10} {len(latencies) / wall:8.1f} req/s"
+        if latencies:
+            ordered = sorted(latencies)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            line += f"   p50 {statistics.median(ordered) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms"
+        self.stdout.write(line)
+        if errors:
+            self.stdout.write(self.style.WARNING(f"{mode}: {len(errors)} failed, first statuses {errors[:5]}"))
+
+    def cleanup(self, user, manuals):
+        AuditLog.objects.filter(manual__in=manuals).delete()
+        for manual in manuals:
+            manual.delete()
+        user.delete()
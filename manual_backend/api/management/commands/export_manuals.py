@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.archive import COMPRESSIONS, ArchiveError, export_archive
+from api.models import Manual
+
+
+class Command(BaseCommand):
+    help = (
+        "Export manuals with their versions, blocks, collaborators, reviews and audit trail "
+        "as an NDJSON archive (see api/archive.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--slug", action="append", default=[], help="Manual to export (repeatable; default: all)")
+        parser.add_argument("--output", "-o", default="-", help="Archive path, or - for stdout")
+        parser.add_argument(
+            "--compression", choices=COMPRESSIONS,
+            help="Defaults to gzip for .gz, zstd for .zst and none otherwise",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        compression = options["compression"]
+        if compression is None:
+            compression = "gzip" if output.endswith(".gz") else "zstd" if output.endswith(".zst") else "none"
+        manuals = Manual.objects.all()
+        if options["slug"]:
+            manuals = manuals.filter(slug__in=options["slug"])
+        try:
+            chunks = export_archive(manuals, compression)
+            if output == "-":
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+                return
+            with open(output, "wb") as archive:
+                for chunk in chunks:
+                    archive.write(chunk)
+        except ArchiveError as exc:
+            raise CommandError(str(exc))
+        self.stderr.write(self.style.SUCCESS(f"Exported {manuals.count()} manuals to {output}."))
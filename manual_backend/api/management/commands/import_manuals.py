@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from api.archive import ArchiveError, import_archive, open_archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Import an NDJSON manual archive (plain, gzip or zstd) written by export_manuals. "
+        "Ids are remapped and slugs/references regenerated; the import is all or nothing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archive", help="Archive path, or - for stdin")
+        parser.add_argument("--user", help="Username to stand in for archived users missing here")
+
+    def handle(self, *args, **options):
+        default_user = None
+        if options["user"]:
+            default_user = User.objects.filter(username=options["user"]).first()
+            if default_user is None:
+                raise CommandError(f"User {options['user']!r} does not exist.")
+        try:
+            if options["archive"] == "-":
+                counts = import_archive(open_archive(sys.stdin.buffer), default_user=default_user)
+            else:
+                with open(options["archive"], "rb") as archive:
+                    counts = import_archive(open_archive(archive), default_user=default_user)
+        except ArchiveError as exc:
+            raise CommandError(str(exc))
+        summary = ", ".join(f"{count} {kind}" for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Imported {summary or 'nothing'}."))
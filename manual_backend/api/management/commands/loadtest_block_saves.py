@@ -0,0 +1,92 @@
+import statistics
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from api.models import AuditLog, Manual
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent block-save throughput against the configured database. "
+        "Each worker repeatedly creates a version and bulk-saves its blocks through the API. "
+        "Run once per DB_ENGINE profile to compare them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+        parser.add_argument("--blocks", type=int, default=50, help="Blocks per save")
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(username=f"loadtest-{run_id}", password=uuid.uuid4().hex)
+        manuals = [
+            Manual.objects.create(title=f"Load test {run_id} #{index}", slug=f"loadtest-{run_id}-{index}", created_by=user)
+            for index in range(options["workers"])
+        ]
+        blocks = [
+            {"type": "TEXT", "data": {"title": f"Section {index}", "text": "Lorem ipsum " * 20}}
+            for index in range(options["blocks"])
+        ]
+        deadline = time.monotonic() + options["duration"]
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def worker(manual):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                revision = 0
+                while time.monotonic() < deadline:
+                    revision += 1
+                    # Vary one block so every save writes at least one new payload
+                    payload = blocks[:-1] + [{"type": "TEXT", "data": {"text": f"revision {revision}"}}]
+                    started = time.perf_counter()
+                    version = client.post("/api/versions/", {"manual": manual.pk}, format="json")
+                    saved = None
+                    if version.status_code == 201:
+                        saved = client.post(f"/api/versions/{version.data['id']}/blocks/bulk/", payload, format="json")
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        if saved is not None and saved.status_code == 201:
+                            latencies.append(elapsed)
+                        else:
+                            errors.append(version.status_code if saved is None else saved.status_code)
+            except Exception as exc:
+                with lock:
+                    errors.append(repr(exc))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(manual,)) for manual in manuals]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        database = settings.DATABASES["default"]
+        self.stdout.write(f"engine:     {database['ENGINE']} {database.get('OPTIONS', {})}")
+        self.stdout.write(f"workers:    {options['workers']}, blocks per save: {options['blocks']}")
+        self.stdout.write(f"saves:      {len(latencies)} ok, {len(errors)} failed in {wall:.1f}s")
+        self.stdout.write(f"throughput: {len(latencies) / wall:.1f} saves/s")
+        if latencies:
+            ordered = sorted(latencies)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            self.stdout.write(f"latency:    p50 {statistics.median(ordered) * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms")
+        if errors:
+            self.stdout.write(self.style.WARNING(f"first errors: {errors[:5]}"))
+
+        connections.close_all()
+        AuditLog.objects.filter(manual__in=manuals).delete()
+        for manual in manuals:
+            manual.delete()
+        user.delete()
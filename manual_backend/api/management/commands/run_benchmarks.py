@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarking import SCENARIOS, BenchmarkError, compare, load_dataset, run
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main endpoints against a dataset from seed_benchmark_data and report p50/p95 latency, "
+        "queries per request and peak RSS. Runs in process through the test client, or against a running "
+        "server with --url (start it with REQUEST_INSTRUMENTATION on for query counts). review_approve uses "
+        "up the dataset's pending reviews, so reseed before comparable runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="bench", help="Prefix the dataset was seeded with")
+        parser.add_argument(
+            "--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated, from: {', '.join(SCENARIOS)}",
+        )
+        parser.add_argument("--requests", type=int, default=200, help="Timed requests per scenario")
+        parser.add_argument("--warmup", type=int, default=10, help="Untimed requests before each scenario")
+        parser.add_argument("--url", help="Base URL of a running server, e.g. http://localhost:8000")
+        parser.add_argument("--password", default="bench", help="Password the dataset was seeded with")
+        parser.add_argument("--server-pid", type=int, help="Report the peak RSS of this server process (Linux)")
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument("--baseline", help="Compare with results saved by an earlier --output")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.2, help="Allowed latency/RSS increase over the baseline (0.2 = 20%%)",
+        )
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options["scenarios"].split(",") if name.strip()]
+        unknown = [name for name in scenarios if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(unknown)}.")
+        baseline = None
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text())
+        try:
+            results = run(
+                load_dataset(options["prefix"]), scenarios, options["requests"], options["warmup"],
+                base_url=options["url"], password=options["password"], server_pid=options["server_pid"],
+            )
+        except BenchmarkError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(f"{results['target']}, {results['database']}")
+        self.stdout.write(
+            f"{'scenario':16} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'peak RSS':>12}"
+        )
+        for name, summary in results["scenarios"].items():
+            self.stdout.write(
+                f"{name:16} {summary['requests']:8} {summary['errors']:6} {self.number(summary['p50_ms']):>9} "
+                f"{self.number(summary['p95_ms']):>9} {self.number(summary['queries']):>8} "
+                f"{self.number(summary['peak_rss_kb'], ' KiB'):>12}"
+            )
+            if summary["errors"]:
+                self.stdout.write(self.style.WARNING(f"{name}: HTTP {summary['error_statuses']}"))
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(results, indent=2) + "\n")
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options["tolerance"])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions against {options['baseline']}.")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}."))
+
+    def number(self, value, unit=""):
+        return "-" if value is None else f"{value}{unit}"
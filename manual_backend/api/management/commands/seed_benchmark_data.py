@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarking import BenchmarkError, clear, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a reproducible synthetic dataset for run_benchmarks: users in every role, categories, tags, "
+        "manuals with N versions of M blocks, collaborators, reviews and audit logs. "
+        "Any earlier dataset with the same prefix is replaced."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="bench", help="Prefix of the dataset's usernames and slugs")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same data")
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--categories", type=int, default=8)
+        parser.add_argument("--tags", type=int, default=20)
+        parser.add_argument("--manuals", type=int, default=100)
+        parser.add_argument("--versions", type=int, default=3, help="Versions per manual")
+        parser.add_argument("--blocks", type=int, default=40, help="Blocks per version")
+        parser.add_argument("--collaborators", type=int, default=2, help="Collaborators per manual")
+        parser.add_argument("--audit", type=int, default=10, help="Audit log entries per manual")
+        parser.add_argument("--password", default="bench", help="Password of every seeded user")
+        parser.add_argument("--clear", action="store_true", help="Only delete the dataset")
+
+    def handle(self, *args, **options):
+        clear(options["prefix"])
+        if options["clear"]:
+            self.stdout.write(self.style.SUCCESS(f"Deleted the {options['prefix']!r} dataset."))
+            return
+        try:
+            counts = seed(
+                prefix=options["prefix"], users=options["users"], categories=options["categories"],
+                tags=options["tags"], manuals=options["manuals"], versions=options["versions"],
+                blocks=options["blocks"], collaborators=options["collaborators"], audit=options["audit"],
+                seed=options["seed"], password=options["password"],
+            )
+        except BenchmarkError as exc:
+            raise CommandError(str(exc))
+        summary = ", ".join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded the {options['prefix']!r} dataset: {summary}."))
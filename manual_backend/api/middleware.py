@@ -0,0 +1,83 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import audit, instrumentation
+
+
+class AuditBufferMiddleware:
+    """
+    Collects the audit entries committed while handling a request and writes
+    them as one batch once the response is ready (see api/audit.py). Runs
+    natively in both modes, so async views aren't pushed through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = audit.begin_request()
+        try:
+            return self.get_response(request)
+        finally:
+            audit.end_request(token)
+
+    async def __acall__(self, request):
+        token = audit.begin_request()
+        try:
+            return await self.get_response(request)
+        finally:
+            await audit.aend_request(token)
+
+
+class InstrumentationMiddleware:
+    """
+    Adds a Server-Timing header (SQL, serializer, view and total time) to
+    every response and logs slow requests, when REQUEST_INSTRUMENTATION is
+    on (see api/instrumentation.py). Goes first in MIDDLEWARE so the total
+    covers the whole stack; it removes itself when disabled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = instrumentation.begin()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            instrumentation.discard(token)
+            raise
+        return instrumentation.end(token, request, response)
+
+    async def __acall__(self, request):
+        token = instrumentation.begin()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            instrumentation.discard(token)
+            raise
+        return instrumentation.end(token, request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = instrumentation.current()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
@@ -0,0 +1,119 @@
+import hashlib
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 1000
+
+
+def compute_digest(block_type, data):
+    # Frozen copy of BlockPayload.compute_digest so the migration stays stable
+    canonical = json.dumps([block_type, data], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def backfill_payloads(apps, schema_editor):
+    ContentBlock = apps.get_model("api", "ContentBlock")
+    BlockPayload = apps.get_model("api", "BlockPayload")
+
+    payload_ids = {}
+    batch = []
+
+    def flush(batch):
+        wanted = {}
+        for block in batch:
+            wanted.setdefault(compute_digest(block.type, block.data), (block.type, block.data))
+        missing = [digest for digest in wanted if digest not in payload_ids]
+        payload_ids.update(BlockPayload.objects.filter(digest__in=missing).values_list("digest", "id"))
+        BlockPayload.objects.bulk_create(
+            [
+                BlockPayload(digest=digest, type=wanted[digest][0], data=wanted[digest][1])
+                for digest in missing
+                if digest not in payload_ids
+            ],
+            ignore_conflicts=True,
+        )
+        payload_ids.update(BlockPayload.objects.filter(digest__in=missing).values_list("digest", "id"))
+        for block in batch:
+            block.payload_id = payload_ids[compute_digest(block.type, block.data)]
+        ContentBlock.objects.bulk_update(batch, ["payload"])
+
+    for block in ContentBlock.objects.only("id", "type", "data").order_by("id").iterator(chunk_size=BATCH_SIZE):
+        batch.append(block)
+        if len(batch) >= BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+
+def restore_inline_content(apps, schema_editor):
+    ContentBlock = apps.get_model("api", "ContentBlock")
+    batch = []
+    for block in ContentBlock.objects.select_related("payload").order_by("id").iterator(chunk_size=BATCH_SIZE):
+        block.type = block.payload.type
+        block.data = block.payload.data
+        batch.append(block)
+        if len(batch) >= BATCH_SIZE:
+            ContentBlock.objects.bulk_update(batch, ["type", "data"])
+            batch = []
+    if batch:
+        ContentBlock.objects.bulk_update(batch, ["type", "data"])
+
+
+class Migration(migrations.Migration):
+    # The backfill updates api_contentblock rows whose payload FK is checked
+    # deferred; PostgreSQL refuses to ALTER that table while those checks are
+    # pending in the same transaction. Commit the backfill on its own instead.
+    atomic = False
+
+    dependencies = [
+        ('api', '0006_add_content_block_types'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockPayload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(editable=False, max_length=64, unique=True)),
+                ('type', models.CharField(choices=[('TEXT', 'Text'), ('IMAGE', 'Image'), ('VIDEO', 'Video'), ('TABLE', 'Table'), ('LIST', 'List'), ('CODE', 'Code'), ('QUOTE', 'Quote'), ('DIVIDER', 'Divider'), ('CHECKLIST', 'Checklist'), ('DIAGRAM', 'Diagram'), ('TABS', 'Tabs')], max_length=20)),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['type'], name='api_blockpa_type_6f1938_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='contentblock',
+            name='payload',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='blocks', to='api.blockpayload'),
+        ),
+        # Inline columns get a default so the backwards migration can re-add them on populated tables
+        migrations.AlterField(
+            model_name='contentblock',
+            name='type',
+            field=models.CharField(choices=[('TEXT', 'Text'), ('IMAGE', 'Image'), ('VIDEO', 'Video'), ('TABLE', 'Table'), ('LIST', 'List'), ('CODE', 'Code'), ('QUOTE', 'Quote'), ('DIVIDER', 'Divider'), ('CHECKLIST', 'Checklist'), ('DIAGRAM', 'Diagram'), ('TABS', 'Tabs')], default='TEXT', max_length=20),
+        ),
+        migrations.RunPython(backfill_payloads, restore_inline_content, atomic=True),
+        migrations.RemoveIndex(
+            model_name='contentblock',
+            name='api_content_type_164e45_idx',
+        ),
+        migrations.RemoveField(
+            model_name='contentblock',
+            name='data',
+        ),
+        migrations.RemoveField(
+            model_name='contentblock',
+            name='type',
+        ),
+        migrations.AlterField(
+            model_name='contentblock',
+            name='payload',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='blocks', to='api.blockpayload'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations
+
+
+# Frozen copy of api.search.extract_text as of this migration
+SKIP_KEYS = {"originalType", "src", "url", "listType", "language", "diagramType"}
+
+
+def extract_text(data):
+    parts = []
+
+    def walk(value, key=None):
+        if key in SKIP_KEYS:
+            return
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, dict):
+            for child_key, child in value.items():
+                walk(child, child_key)
+        elif isinstance(value, list):
+            for child in value:
+                walk(child)
+
+    walk(data)
+    return "\n".join(parts)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS api_manual_search USING fts5("
+        "title, department, reference, tags, category, content, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    Manual = apps.get_model("api", "Manual")
+    ContentBlock = apps.get_model("api", "ContentBlock")
+    for manual in Manual.objects.select_related("category").iterator(chunk_size=500):
+        blocks = ContentBlock.objects.filter(version_id=manual.current_version_id).select_related("payload")
+        schema_editor.execute(
+            "INSERT INTO api_manual_search (rowid, title, department, reference, tags, category, content) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [
+                manual.pk,
+                manual.title,
+                manual.department,
+                manual.reference or "",
+                " ".join(manual.tags.values_list("name", flat=True)),
+                manual.category.name if manual.category_id else "",
+                "\n".join(extract_text(block.payload.data) for block in blocks),
+            ],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS api_manual_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_content_addressed_block_payloads'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,57 @@
+import secrets
+import string
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def random_reference():
+    # Frozen: any unused 16-character value will do for backfilled rows
+    return "".join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(16))
+
+
+def backfill_references(apps, schema_editor):
+    """Give manuals without a reference (bulk-created) or with a duplicate one a fresh reference"""
+    Manual = apps.get_model("api", "Manual")
+    seen = set()
+    changed = []
+    for manual in Manual.objects.order_by("pk").only("pk", "reference").iterator(chunk_size=BATCH_SIZE):
+        if manual.reference and manual.reference not in seen:
+            seen.add(manual.reference)
+            continue
+        changed.append(manual)
+    for manual in changed:
+        reference = random_reference()
+        while reference in seen:
+            reference = random_reference()
+        seen.add(reference)
+        manual.reference = reference
+    Manual.objects.bulk_update(changed, ["reference"], batch_size=BATCH_SIZE)
+    if schema_editor.connection.vendor == "sqlite":
+        # Keep the FTS index from 0008 in step with the new references
+        for manual in changed:
+            schema_editor.execute(
+                "UPDATE api_manual_search SET reference = %s WHERE rowid = %s", [manual.reference, manual.pk]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_manual_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_references, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='manual',
+            name='api_manual_referen_d524a4_idx',
+        ),
+        migrations.AlterField(
+            model_name='manual',
+            name='reference',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_auditlog_time_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='manualversion',
+            name='api_manualv_is_publ_74d189_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='reviewrequest',
+            name='api_reviewr_status_a074f0_idx',
+        ),
+        migrations.AlterField(
+            model_name='manualversion',
+            name='manual',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='api.manual'),
+        ),
+        migrations.AlterField(
+            model_name='reviewrequest',
+            name='reviewer',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='assigned_reviews', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='manualversion',
+            index=models.Index(fields=['manual', 'created_at'], name='api_manualv_manual__5cad5f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='manualversion',
+            index=models.Index(fields=['is_published', 'created_at'], name='api_manualv_is_publ_9bb99a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reviewrequest',
+            index=models.Index(fields=['status', 'submitted_at'], name='api_reviewr_status_7cad7c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reviewrequest',
+            index=models.Index(fields=['reviewer', 'submitted_at'], name='api_reviewr_reviewe_167158_idx'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+import base64
+import binascii
+import hashlib
+import json
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import storages
+from django.db import migrations
+from django.utils import timezone
+
+
+# Frozen copies of api.assets / BlockPayload.compute_digest as of this migration
+ASSET_FIELDS = {"IMAGE": "src", "VIDEO": "url"}
+# Data URLs of other types (HTML, SVG, ...) stay inline rather than becoming servable assets
+ASSET_CONTENT_TYPES = {
+    "image/jpeg", "image/png", "image/gif", "image/webp", "image/avif", "image/bmp", "image/tiff",
+    "video/mp4", "video/webm", "video/ogg", "video/quicktime",
+}
+DATA_URL_RE = re.compile(r"^data:(?P<type>[\w.+-]+/[\w.+-]+)?(?P<params>(?:;[^,;]*)*?)(?P<base64>;base64)?,", re.I)
+
+
+def compute_digest(block_type, data):
+    canonical = json.dumps([block_type, data], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def store(Asset, value):
+    match = DATA_URL_RE.match(value)
+    if match is None:
+        return None
+    content_type = (match.group("type") or "").lower()
+    if content_type not in ASSET_CONTENT_TYPES:
+        return None
+    payload = value[match.end():]
+    try:
+        content = base64.b64decode(payload) if match.group("base64") else payload.encode("utf-8")
+    except (binascii.Error, ValueError):
+        return None
+    digest = hashlib.sha256(content).hexdigest()
+    storage = storages["assets"]
+    name = f"{digest[:2]}/{digest[2:4]}/{digest}"
+    if not storage.exists(name):
+        with tempfile.TemporaryFile() as spool:
+            spool.write(content)
+            spool.seek(0)
+            storage.save(name, File(spool))
+    Asset.objects.get_or_create(
+        digest=digest, defaults={"content_type": content_type, "size": len(content)}
+    )
+    return digest
+
+
+def extract_inline_assets(apps, schema_editor):
+    """Move data: URLs out of IMAGE/VIDEO payloads into stored assets"""
+    Asset = apps.get_model("api", "Asset")
+    BlockPayload = apps.get_model("api", "BlockPayload")
+    ContentBlock = apps.get_model("api", "ContentBlock")
+    candidates = list(BlockPayload.objects.filter(type__in=ASSET_FIELDS).values_list("pk", flat=True))
+    for pk in candidates:
+        # One row at a time: inline files can be megabytes each
+        payload = BlockPayload.objects.get(pk=pk)
+        field = ASSET_FIELDS[payload.type]
+        value = payload.data.get(field) if isinstance(payload.data, dict) else None
+        if not isinstance(value, str) or value[:5].lower() != "data:":
+            continue
+        digest = store(Asset, value)
+        if digest is None:
+            continue
+        data = {**payload.data, field: f"/api/assets/{digest}/", "asset": digest}
+        new_digest = compute_digest(payload.type, data)
+        existing = BlockPayload.objects.filter(digest=new_digest).exclude(pk=pk).first()
+        blocks = ContentBlock.objects.filter(payload_id=pk)
+        if existing is not None:
+            # Another payload already references the same asset with the same fields
+            blocks.update(payload_id=existing.pk, updated_at=timezone.now())
+            payload.delete()
+        else:
+            payload.data = data
+            payload.digest = new_digest
+            payload.save(update_fields=["data", "digest"])
+            # Bump the blocks so version ETags change with the new src
+            blocks.update(updated_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_assets'),
+    ]
+
+    operations = [
+        migrations.RunPython(extract_inline_assets, migrations.RunPython.noop),
+    ]
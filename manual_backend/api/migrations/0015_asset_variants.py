@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_extract_inline_assets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
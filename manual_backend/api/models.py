@@ -1,10 +1,15 @@
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
+import hashlib
+import json
 import uuid
 import secrets
 import string
+import threading
+import time
 from accounts.models import User
 
 
@@ -41,6 +46,43 @@ class Tag(TimestampedModel):
         return self.name
 
 
+REFERENCE_ALPHABET = string.digits + string.ascii_uppercase
+REFERENCE_RANDOM_SPACE = 36 ** 6
+REFERENCE_ATTEMPTS = 3
+
+_reference_lock = threading.Lock()
+_last_reference = 0
+
+
+def new_reference():
+    """
+    A 16-character base-36 reference: 10 characters of millisecond timestamp
+    followed by 6 random ones, so references sort by creation time and need
+    no lookup to be unique. Within a process they strictly increase; across
+    processes two only clash if minted in the same millisecond with the same
+    random part, which the unique constraint on Manual.reference catches.
+    """
+    global _last_reference
+    with _reference_lock:
+        value = (time.time_ns() // 1_000_000) * REFERENCE_RANDOM_SPACE + secrets.randbelow(REFERENCE_RANDOM_SPACE)
+        value = _last_reference = max(value, _last_reference + 1)
+    digits = []
+    for _ in range(16):
+        value, digit = divmod(value, 36)
+        digits.append(REFERENCE_ALPHABET[digit])
+    return "".join(reversed(digits))
+
+
+class ManualQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create bypasses Manual.save(), so assign references here
+        objs = list(objs)
+        for manual in objs:
+            if not manual.reference:
+                manual.reference = new_reference()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Manual(TimestampedModel):
     class ManualStatus(models.TextChoices):
         DRAFT = "DRAFT", "Draft"
@@ -50,7 +92,7 @@ class Manual(TimestampedModel):
 
     title = models.CharField(max_length=300)
     slug = models.SlugField(max_length=320, unique=True)
-    reference = models.CharField(max_length=16, editable=False, null=True, blank=True)
+    reference = models.CharField(max_length=16, unique=True, editable=False, null=True, blank=True)
     department = models.CharField(max_length=200, blank=True)
     category = models.ForeignKey(
         Category, on_delete=models.SET_NULL, null=True, blank=True, related_name="manuals"
@@ -66,56 +108,50 @@ class Manual(TimestampedModel):
         "ManualVersion", on_delete=models.SET_NULL, null=True, blank=True, related_name="current_for_manuals"
     )
 
+    objects = ManualQuerySet.as_manager()
+
     class Meta:
         ordering = ["-updated_at", "title"]
         indexes = [
             models.Index(fields=["slug"]),
-            models.Index(fields=["reference"]),
             models.Index(fields=["status"]),
             models.Index(fields=["department"]),
         ]
 
     def __str__(self) -> str:  # pragma: no cover
         return self.title
-    
-    def generate_reference(self):
-        """Generate a unique 16-character reference"""
-        while True:
-            # Generate 16 character alphanumeric string (uppercase)
-            reference = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(16))
-            # Ensure uniqueness
-            if not Manual.objects.filter(reference=reference).exists():
-                return reference
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded owner so an ownership change can invalidate both users' cached grants
+        instance._loaded_created_by_id = instance.__dict__.get("created_by_id")
+        return instance
     
     def save(self, *args, **kwargs):
-        # Generate reference if not set
-        if not self.reference:
-            self.reference = self.generate_reference()
-        super().save(*args, **kwargs)
+        if self.reference:
+            return super().save(*args, **kwargs)
+        # Generate a reference and rely on the unique constraint instead of a pre-check query
+        for attempt in range(REFERENCE_ATTEMPTS):
+            self.reference = new_reference()
+            try:
+                with transaction.atomic(using=kwargs.get("using")):
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Only retry when the reference clashed, not e.g. the slug
+                if attempt + 1 == REFERENCE_ATTEMPTS or not Manual.objects.filter(reference=self.reference).exists():
+                    self.reference = None
+                    raise
     
     def can_edit(self, user):
         """Check if a user can edit this manual"""
-        if not user or not user.is_authenticated:
-            return False
-        
-        # Creator can always edit
-        if self.created_by == user:
-            return True
-        
-        # Check if user is a collaborator with EDITOR role
-        return self.collaborators.filter(user=user, role=ManualCollaborator.CollaboratorRole.EDITOR).exists()
+        from .permissions import ManualPermissionResolver
+        return ManualPermissionResolver(user).can_edit(self)
     
     def can_view(self, user):
         """Check if a user can view this manual"""
-        if not user or not user.is_authenticated:
-            return False
-        
-        # Creator can always view
-        if self.created_by == user:
-            return True
-        
-        # Check if user is a collaborator (any role)
-        return self.collaborators.filter(user=user).exists()
+        from .permissions import ManualPermissionResolver
+        return ManualPermissionResolver(user).can_view(self)
 
 
 class ManualCollaborator(TimestampedModel):
@@ -144,7 +180,8 @@ class ManualCollaborator(TimestampedModel):
 
 
 class ManualVersion(TimestampedModel):
-    manual = models.ForeignKey(Manual, on_delete=models.CASCADE, related_name="versions")
+    # Indexed by the (manual, ...) composites below
+    manual = models.ForeignKey(Manual, on_delete=models.CASCADE, related_name="versions", db_index=False)
     version_number = models.PositiveIntegerField()
     changelog = models.TextField(blank=True)
     created_by = models.ForeignKey(
@@ -158,12 +195,67 @@ class ManualVersion(TimestampedModel):
         unique_together = ("manual", "version_number")
         indexes = [
             models.Index(fields=["manual", "version_number"]),
-            models.Index(fields=["is_published"]),
+            # Version list filters (see api/filters.py), newest first
+            models.Index(fields=["manual", "created_at"]),
+            models.Index(fields=["is_published", "created_at"]),
         ]
 
     def __str__(self) -> str:  # pragma: no cover
         return f"{self.manual.title} v{self.version_number}"
 
+    def copy_blocks_from(self, base, operations=()):
+        """
+        Populate this version with the blocks of ``base`` after applying a patch.
+
+        Each operation is a dict keyed by base block id:
+          {"op": "insert", "type": ..., "data": ..., "order": n}  (order defaults to the end)
+          {"op": "update", "id": block_id, "type": ..., "data": ...}
+          {"op": "delete", "id": block_id}
+          {"op": "move", "id": block_id, "order": n}
+        ``order`` is the position in the block list at the time the operation
+        is applied. Unchanged blocks are copied as references to their existing
+        payload, so only inserted or updated content is written.
+        """
+        entries = list(base.blocks.order_by("order", "created_at").values_list("id", "payload_id"))
+        blocks = [(block_id, ContentBlock(version=self, payload_id=payload_id)) for block_id, payload_id in entries]
+
+        update_ids = [operation["id"] for operation in operations if operation["op"] == "update"]
+        payloads = {
+            block.id: block.payload
+            for block in ContentBlock.objects.filter(id__in=update_ids).select_related("payload")
+        }
+
+        def position(block_id):
+            for index, (source_id, _) in enumerate(blocks):
+                if source_id == block_id:
+                    return index
+            raise ValueError(f"Block {block_id} is not part of version {base.pk}.")
+
+        for operation in operations:
+            op = operation["op"]
+            if op == "insert":
+                block = ContentBlock(version=self, type=operation["type"], data=operation.get("data", {}))
+                blocks.insert(operation.get("order", len(blocks)), (None, block))
+            elif op == "update":
+                block = blocks[position(operation["id"])][1]
+                block.payload = payloads[operation["id"]]
+                if "type" in operation:
+                    block.type = operation["type"]
+                if "data" in operation:
+                    block.data = operation["data"]
+            elif op == "delete":
+                del blocks[position(operation["id"])]
+            elif op == "move":
+                entry = blocks.pop(position(operation["id"]))
+                blocks.insert(operation["order"], entry)
+
+        from .ordering import gapped
+        new_blocks = [block for _, block in blocks]
+        for index, block in enumerate(new_blocks):
+            block.order = gapped(index)
+        BlockPayload.objects.attach(new_blocks)
+        return ContentBlock.objects.bulk_create(new_blocks)
+
 
 class ContentBlock(TimestampedModel):
     class BlockType(models.TextChoices):
@@ -183,19 +275,156 @@ class ContentBlock(TimestampedModel):
         ManualVersion, on_delete=models.CASCADE, related_name="blocks"
     )
     order = models.PositiveIntegerField()
-    type = models.CharField(max_length=20, choices=BlockType.choices)
-    data = models.JSONField(default=dict)  # Block-specific payload (e.g., text content, images, etc.)
+    # Shared, immutable (type, data) blob; identical blocks across versions point at the same row
+    payload = models.ForeignKey(
+        "BlockPayload", on_delete=models.PROTECT, related_name="blocks"
+    )
+
+    # (type, data) assigned since the last save, interned into a payload on save
+    _pending_payload = None
 
     class Meta:
         ordering = ["order", "created_at"]
         indexes = [
             models.Index(fields=["version", "order"]),
-            models.Index(fields=["type"]),
         ]
 
     def __str__(self) -> str:  # pragma: no cover
         return f"Block {self.order} ({self.type}) for {self.version}"
 
+    def _current_payload(self):
+        if self._pending_payload is not None:
+            return self._pending_payload
+        if self.payload_id:
+            return self.payload.type, self.payload.data
+        return None, {}
+
+    @property
+    def type(self):
+        return self._current_payload()[0]
+
+    @type.setter
+    def type(self, value):
+        self._pending_payload = (value, self._current_payload()[1])
+
+    @property
+    def data(self):
+        return self._current_payload()[1]
+
+    @data.setter
+    def data(self, value):
+        self._pending_payload = (self._current_payload()[0], value if value is not None else {})
+
+    def save(self, *args, **kwargs):
+        # Swap pending type/data for a reference to the shared payload row
+        if self._pending_payload is not None:
+            BlockPayload.objects.attach([self])
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = (
+                    {"payload" if name in ("type", "data") else name for name in update_fields}
+                )
+        super().save(*args, **kwargs)
+
+
+class BlockPayloadManager(models.Manager):
+    def attach(self, blocks):
+        """
+        Point each block with pending type/data at its shared payload,
+        creating any missing payloads in one bulk insert. Needed before
+        bulk_create, which bypasses ContentBlock.save().
+        """
+        pending = [block for block in blocks if block._pending_payload is not None]
+        if not pending:
+            return blocks
+        from .assets import extract_inline_assets
+        for block in pending:
+            # Inline data: URLs become stored assets before the payload is hashed
+            block_type, data = block._pending_payload
+            block._pending_payload = (block_type, extract_inline_assets(block_type, data))
+        wanted = {}
+        for block in pending:
+            block_type, data = block._pending_payload
+            wanted.setdefault(BlockPayload.compute_digest(block_type, data), (block_type, data))
+        existing = {payload.digest: payload for payload in self.filter(digest__in=wanted.keys())}
+        missing = [
+            BlockPayload(digest=digest, type=block_type, data=data)
+            for digest, (block_type, data) in wanted.items()
+            if digest not in existing
+        ]
+        if missing:
+            # ignore_conflicts tolerates a concurrent writer interning the same payload
+            self.bulk_create(missing, ignore_conflicts=True)
+            existing.update(
+                (payload.digest, payload)
+                for payload in self.filter(digest__in=[payload.digest for payload in missing])
+            )
+            from .derivatives import schedule
+            # First reference to an image asset: render its variants
+            schedule({
+                payload.data["asset"] for payload in missing
+                if payload.type == ContentBlock.BlockType.IMAGE and isinstance(payload.data, dict) and payload.data.get("asset")
+            })
+        for block in pending:
+            block_type, data = block._pending_payload
+            block.payload = existing[BlockPayload.compute_digest(block_type, data)]
+            block._pending_payload = None
+        return blocks
+
+
+class BlockPayload(models.Model):
+    """Immutable block content, content-addressed by a hash of (type, data)"""
+    digest = models.CharField(max_length=64, unique=True, editable=False)
+    type = models.CharField(max_length=20, choices=ContentBlock.BlockType.choices)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BlockPayloadManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["type"]),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"{self.type} payload {self.digest[:12]}"
+
+    @staticmethod
+    def compute_digest(block_type, data):
+        canonical = json.dumps([block_type, data], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Asset(models.Model):
+    """An uploaded image or video, stored once under its SHA-256 (see api/assets.py)"""
+    digest = models.CharField(max_length=64, unique=True, editable=False)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    # Rendered image variants by width (see api/derivatives.py)
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="assets"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"{self.content_type} asset {self.digest[:12]}"
+
+
+class AssetUpload(TimestampedModel):
+    """A chunked upload in progress; its bytes so far live in ASSET_UPLOAD_DIR"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="asset_uploads"
+    )
+    filename = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"Upload {self.pk} ({self.received}/{self.size})"
+
 
 class ReviewRequest(TimestampedModel):
     class ReviewStatus(models.TextChoices):
@@ -209,8 +438,10 @@ class ReviewRequest(TimestampedModel):
     submitted_by = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="submitted_reviews"
     )
+    # Leads the composite (reviewer, submitted_at) index below
     reviewer = models.ForeignKey(
-        settings.AUTH_USER_MODEL, on_delete=models.PROTECT, null=True, blank=True, related_name="assigned_reviews"
+        settings.AUTH_USER_MODEL, on_delete=models.PROTECT, null=True, blank=True, related_name="assigned_reviews",
+        db_index=False,
     )
     status = models.CharField(max_length=20, choices=ReviewStatus.choices, default=ReviewStatus.PENDING)
     feedback = models.TextField(blank=True)
@@ -220,7 +451,9 @@ class ReviewRequest(TimestampedModel):
     class Meta:
         ordering = ["-submitted_at"]
         indexes = [
-            models.Index(fields=["status"]),
+            # Review list filters (see api/filters.py), newest first
+            models.Index(fields=["status", "submitted_at"]),
+            models.Index(fields=["reviewer", "submitted_at"]),
             models.Index(fields=["submitted_at"]),
         ]
 
@@ -237,18 +470,28 @@ class AuditLog(models.Model):
         REJECT = "REJECT", "Reject"
         ROLLBACK = "ROLLBACK", "Rollback"
 
-    manual = models.ForeignKey(Manual, on_delete=models.CASCADE, null=True, blank=True, related_name="audit_logs")
+    # manual and actor lead the composite (manual/actor, created_at) indexes below
+    manual = models.ForeignKey(
+        Manual, on_delete=models.CASCADE, null=True, blank=True, related_name="audit_logs", db_index=False
+    )
     version = models.ForeignKey(ManualVersion, on_delete=models.CASCADE, null=True, blank=True, related_name="audit_logs")
     action = models.CharField(max_length=20, choices=Action.choices)
-    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="audit_logs")
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="audit_logs", db_index=False
+    )
     metadata = models.JSONField(default=dict, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the action is recorded, not when the buffered row is written (see api/audit.py)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
         indexes = [
-            models.Index(fields=["action"]),
+            # Retention sweeps filter by action and age (see api/retention.py)
+            models.Index(fields=["action", "created_at"]),
             models.Index(fields=["created_at"]),
+            # Per-manual and per-user audit views
+            models.Index(fields=["manual", "created_at"]),
+            models.Index(fields=["actor", "created_at"]),
         ]
 
     def __str__(self) -> str:  # pragma: no cover
@@ -0,0 +1,105 @@
+"""
+Gapped ordering of a version's blocks.
+
+New blocks get ContentBlock.order values ORDER_GAP apart, so a moved or
+inserted block takes an order between its new neighbours and is the only
+row written. When the neighbours have no integer left between them, the
+version's blocks are renumbered with fresh gaps ("rebalanced") as part of
+the same write. Versions written with dense orders before this scheme are
+rebalanced by their first move.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ContentBlock, ManualVersion
+
+
+ORDER_GAP = 1024
+
+
+def gapped(position):
+    """The order of the block at ``position`` in a freshly numbered version"""
+    return (position + 1) * ORDER_GAP
+
+
+def rank_between(before, after):
+    """
+    An order strictly between two neighbouring orders (None for the start or
+    end of the version), or None if there is no room left between them
+    """
+    low = before if before is not None else -1
+    if after is None:
+        return low + ORDER_GAP
+    if after - low < 2:
+        return None
+    return (low + after) // 2
+
+
+class Reorder:
+    """
+    Moves applied to an in-memory copy of a version's ``[block_id, order]``
+    list in document order, remembering which blocks' orders changed
+    """
+
+    def __init__(self, entries):
+        self.entries = [list(entry) for entry in entries]
+        self.changed = set()
+        self.rebalanced = False
+
+    def index(self, block_id):
+        for index, (entry_id, _) in enumerate(self.entries):
+            if entry_id == block_id:
+                return index
+        raise ValueError(f"Block {block_id} is not part of this version.")
+
+    def move(self, block_id, after=None):
+        """Place ``block_id`` right after block ``after``, or first if None"""
+        if block_id == after:
+            raise ValueError(f"Block {block_id} can't be placed after itself.")
+        entry = self.entries.pop(self.index(block_id))
+        position = self.index(after) + 1 if after is not None else 0
+        self.entries.insert(position, entry)
+        before = self.entries[position - 1][1] if position > 0 else None
+        following = self.entries[position + 1][1] if position + 1 < len(self.entries) else None
+        if (before is None or before < entry[1]) and (following is None or entry[1] < following):
+            # Its current order already fits here
+            return
+        rank = rank_between(before, following)
+        if rank is None:
+            self.rebalance()
+        else:
+            entry[1] = rank
+            self.changed.add(block_id)
+
+    def rebalance(self):
+        self.rebalanced = True
+        for position, entry in enumerate(self.entries):
+            if entry[1] != gapped(position):
+                entry[1] = gapped(position)
+                self.changed.add(entry[0])
+
+    def orders(self):
+        return {block_id: order for block_id, order in self.entries if block_id in self.changed}
+
+
+def apply_moves(version, moves):
+    """
+    Apply ``[{"id": block_id, "after": block_id or None}, ...]`` in order, in
+    one transaction, writing only the blocks whose order changed. Returns the
+    Reorder; raises ValueError for blocks outside the version.
+    """
+    with transaction.atomic():
+        # Serialize concurrent reorders of the same version
+        list(ManualVersion.objects.select_for_update().filter(pk=version.pk).values_list("pk"))
+        reorder = Reorder(
+            ContentBlock.objects.filter(version=version).order_by("order", "created_at").values_list("id", "order")
+        )
+        for move in moves:
+            reorder.move(move["id"], move.get("after"))
+        orders = reorder.orders()
+        if orders:
+            now = timezone.now()
+            # bulk_update skips auto_now; the version ETag follows block updated_at
+            blocks = [ContentBlock(pk=block_id, order=order, updated_at=now) for block_id, order in orders.items()]
+            ContentBlock.objects.bulk_update(blocks, ["order", "updated_at"])
+    return reorder
@@ -0,0 +1,26 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OptionalCursorPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination that clients opt into by sending ``cursor`` or
+    ``page_size``. Requests without either keep receiving a plain list, so
+    existing callers are unaffected.
+
+    Views declare a stable ordering through ``cursor_ordering``; it should end
+    in a unique column so ties on the leading column still page deterministically.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = ("-pk",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "cursor_ordering", None) or self.ordering
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
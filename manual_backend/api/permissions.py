@@ -0,0 +1,72 @@
+from . import visibility
+from .models import ManualCollaborator
+
+
+class ManualPermissionResolver:
+    """
+    Answers can_edit/can_view for a batch of manuals without a query per manual.
+
+    Collaborator roles come from the user's cached grants (see api.visibility),
+    loaded at most once per resolver. A single resolver is kept on each request
+    (see ``for_request``) so serializers and permission classes share it.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._grants = None
+
+    @classmethod
+    def for_request(cls, request):
+        resolver = getattr(request, "_manual_permissions", None)
+        if resolver is None or resolver.user != request.user:
+            resolver = cls(request.user)
+            request._manual_permissions = resolver
+        return resolver
+
+    @property
+    def is_authenticated(self):
+        return bool(self.user and self.user.is_authenticated)
+
+    @property
+    def grants(self):
+        if self._grants is None:
+            self._grants = visibility.get_grants(self.user)
+        return self._grants
+
+    def prime(self):
+        """Load the user's grants up front so a page of manuals resolves without queries"""
+        if self.is_authenticated:
+            self.grants
+
+    async def aprime(self):
+        """Async counterpart of ``prime`` for the ASGI read views"""
+        if self.is_authenticated and self._grants is None:
+            self._grants = await visibility.aget_grants(self.user)
+        return self._grants
+
+    def can_edit(self, manual):
+        if not self.is_authenticated:
+            return False
+        if manual.created_by_id == self.user.pk:
+            return True
+        return manual.pk in self.grants.edit
+
+    def check_edit(self, manual):
+        """
+        can_edit answered from the database, for write permission checks:
+        cached grants can lag behind a removed collaborator in other workers
+        """
+        if not self.is_authenticated:
+            return False
+        if manual.created_by_id == self.user.pk:
+            return True
+        return ManualCollaborator.objects.filter(
+            manual_id=manual.pk, user_id=self.user.pk, role=ManualCollaborator.CollaboratorRole.EDITOR,
+        ).exists()
+
+    def can_view(self, manual):
+        if not self.is_authenticated:
+            return False
+        if manual.created_by_id == self.user.pk:
+            return True
+        return manual.pk in self.grants.view
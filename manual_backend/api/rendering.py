@@ -0,0 +1,213 @@
+"""
+Server-side HTML rendering of manual versions.
+
+Mirrors the block layouts of the frontend ManualViewer so an approved
+version can be stored once in ManualVersion.published_html and served as
+a single row fetch.
+
+The snapshot is served as text/html from the API origin, so block URLs are
+only emitted when ``safe_url`` accepts them: http(s) links and stored assets.
+"""
+import re
+from urllib.parse import urlsplit
+
+from django.utils.html import conditional_escape, format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from .derivatives import variant_urls
+
+
+YOUTUBE_RE = re.compile(r"(?:youtube\.com/watch\?v=|youtu\.be/|youtube\.com/embed/)([^&\n?#]+)")
+VIMEO_RE = re.compile(r"(?:vimeo\.com/)([0-9]+)")
+ASSET_PATH_RE = re.compile(r"^/api/assets/[0-9a-f]{64}/(?:[0-9]+/)?$")
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def safe_url(url):
+    """``url`` if it is an http(s) URL or a stored asset's path, else None"""
+    if not isinstance(url, str):
+        return None
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return None
+    if parts.scheme in ("http", "https") and parts.netloc:
+        return url
+    if not parts.scheme and not parts.netloc and ASSET_PATH_RE.match(url):
+        return url
+    return None
+
+
+def embed_url(url):
+    """Convert YouTube/Vimeo page URLs to their embeddable player URLs"""
+    match = YOUTUBE_RE.search(url)
+    if match:
+        return f"https://www.youtube.com/embed/{match.group(1)}"
+    match = VIMEO_RE.search(url)
+    if match:
+        return f"https://player.vimeo.com/video/{match.group(1)}"
+    return url
+
+
+def _concat(*parts):
+    return mark_safe("".join(conditional_escape(part) for part in parts))
+
+
+def _title(data, tag="h3"):
+    if not data.get("title"):
+        return ""
+    return format_html("<{}>{}</{}>", mark_safe(tag), data["title"], mark_safe(tag))
+
+
+def _items(data):
+    return [item for item in data.get("items") or [] if item is not None]
+
+
+def render_text(data):
+    text = format_html("<p>{}</p>", data["text"]) if data.get("text") else ""
+    return _concat(_title(data), text)
+
+
+def render_image(data):
+    src = safe_url(data.get("src"))
+    if not src:
+        return ""
+    caption = format_html("<figcaption>{}</figcaption>", data["caption"]) if data.get("caption") else ""
+    if isinstance(data.get("asset"), str) and DIGEST_RE.match(data["asset"]):
+        # Let the browser pick the smallest resized variant that fits
+        urls = variant_urls(data["asset"])
+        srcset = ", ".join(f"{url} {url.rstrip('/').rsplit('/', 1)[1]}w" for url in urls.values())
+        return format_html(
+            '<figure><img src="{}" srcset="{}" sizes="(max-width: 768px) 100vw, 768px" alt="{}" loading="lazy">{}</figure>',
+            urls.get("medium", src), srcset, data.get("alt") or "Manual image", caption,
+        )
+    return format_html(
+        '<figure><img src="{}" alt="{}" loading="lazy">{}</figure>',
+        src, data.get("alt") or "Manual image", caption,
+    )
+
+
+def _checklist(items):
+    return format_html(
+        '<ul class="checklist">{}</ul>',
+        format_html_join("", '<li><input type="checkbox" disabled> {}</li>', ((item,) for item in items)),
+    )
+
+
+def render_list(data):
+    items = _items(data)
+    if not items:
+        return _title(data)
+    list_type = data.get("listType")
+    if list_type == "checklist":
+        body = _checklist(items)
+    else:
+        tag = mark_safe("ol" if list_type == "numbered" else "ul")
+        body = format_html("<{}>{}</{}>", tag, format_html_join("", "<li>{}</li>", ((item,) for item in items)), tag)
+    return _concat(_title(data), body)
+
+
+def render_checklist(data):
+    items = _items(data)
+    return _concat(_title(data), _checklist(items) if items else "")
+
+
+def render_table(data):
+    csv_data = data.get("csvData")
+    if not csv_data:
+        return _title(data)
+    rows = []
+    for index, row in enumerate(csv_data.split("\n")):
+        cell_tag = "th" if index == 0 else "td"
+        cells = format_html_join(
+            "", f"<{cell_tag}>{{}}</{cell_tag}>", ((cell.strip(),) for cell in row.split(","))
+        )
+        rows.append(format_html("<tr>{}</tr>", cells))
+    return _concat(_title(data), format_html("<table><tbody>{}</tbody></table>", _concat(*rows)))
+
+
+def render_code(data):
+    if not data.get("code"):
+        return _title(data)
+    language = data.get("language") or ""
+    return _concat(_title(data), format_html(
+        '<pre><code class="language-{}">{}</code></pre>', language, data["code"]
+    ))
+
+
+def render_quote(data):
+    quote = format_html("<blockquote>{}</blockquote>", data["quote"]) if data.get("quote") else ""
+    author = format_html("<cite>— {}</cite>", data["author"]) if data.get("author") else ""
+    return _concat(quote, author)
+
+
+def render_video(data):
+    player = ""
+    url = safe_url(data.get("url"))
+    if url and data.get("asset"):
+        # An uploaded file (see api/assets.py) rather than a hosted video page
+        player = format_html('<video src="{}" controls preload="metadata"></video>', url)
+    elif url:
+        player = format_html(
+            '<iframe src="{}" title="{}" allowfullscreen loading="lazy"></iframe>',
+            embed_url(url), data.get("title") or "Video",
+        )
+    description = format_html("<p>{}</p>", data["description"]) if data.get("description") else ""
+    return _concat(_title(data), player, description)
+
+
+def render_divider(data):
+    return mark_safe("<hr>")
+
+
+def render_diagram(data):
+    if not data.get("data"):
+        return _title(data)
+    return _concat(_title(data), format_html(
+        '<div class="diagram"><div class="diagram-type">{}</div><p>{}</p></div>',
+        data.get("diagramType") or "", data["data"],
+    ))
+
+
+def render_tabs(data):
+    tabs = [tab for tab in data.get("tabs") or [] if isinstance(tab, dict)]
+    if not tabs:
+        return ""
+    panels = format_html_join(
+        "",
+        '<section class="tab"><h4>{}</h4><p>{}</p></section>',
+        ((tab.get("title") or f"Tab {index + 1}", tab.get("content") or "") for index, tab in enumerate(tabs)),
+    )
+    return format_html('<div class="tabs">{}</div>', panels)
+
+
+RENDERERS = {
+    "TEXT": render_text,
+    "IMAGE": render_image,
+    "VIDEO": render_video,
+    "TABLE": render_table,
+    "LIST": render_list,
+    "CODE": render_code,
+    "QUOTE": render_quote,
+    "DIVIDER": render_divider,
+    "CHECKLIST": render_checklist,
+    "DIAGRAM": render_diagram,
+    "TABS": render_tabs,
+}
+
+
+def render_block(block_type, data):
+    """Render one block; the editor's originalType wins over the stored type"""
+    data = data if isinstance(data, dict) else {}
+    block_type = data.get("originalType") or block_type
+    renderer = RENDERERS.get(block_type)
+    if renderer is None:
+        return ""
+    return format_html('<div class="content-block" data-type="{}">{}</div>', block_type, renderer(data))
+
+
+def render_version(version):
+    """Render every block of a version, in order, to one HTML fragment"""
+    blocks = version.blocks.select_related("payload").order_by("order", "created_at")
+    return "".join(render_block(block.type, block.data) for block in blocks)
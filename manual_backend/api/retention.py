@@ -0,0 +1,147 @@
+"""
+Audit log retention and monthly archives.
+
+Each action keeps its rows for ``settings.AUDIT_RETENTION_DAYS[action]`` days
+(falling back to the "default" entry; None keeps them forever). Expired rows
+are moved out of the AuditLog table into one gzip-compressed NDJSON file per
+calendar month, ``audit-YYYY-MM.ndjson.gz`` in ``settings.AUDIT_ARCHIVE_DIR``.
+Later runs append to a month's file as more of its actions expire, so a month
+file is the archived partition for that month. ``read_archive`` scans the
+files back with the same filters the API offers.
+"""
+import datetime
+import gzip
+import json
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .archive import encode
+from .models import AuditLog
+
+
+ARCHIVE_NAME = "audit-{month}.ndjson.gz"
+ARCHIVE_RE = re.compile(r"^audit-(\d{4}-\d{2})\.ndjson\.gz$")
+
+
+def archive_dir():
+    return Path(getattr(settings, "AUDIT_ARCHIVE_DIR", settings.BASE_DIR / "audit_archive"))
+
+
+def retention_days(action):
+    policy = getattr(settings, "AUDIT_RETENTION_DAYS", {})
+    return policy.get(action, policy.get("default"))
+
+
+def expired_filter(now=None):
+    """Q matching rows past their action's retention period, or None if nothing expires"""
+    now = now or timezone.now()
+    condition = None
+    for action in AuditLog.Action.values:
+        days = retention_days(action)
+        if days is None:
+            continue
+        # Served by the (action, created_at) index
+        clause = Q(action=action, created_at__lt=now - datetime.timedelta(days=days))
+        condition = clause if condition is None else condition | clause
+    return condition
+
+
+def month_of(moment):
+    return timezone.localtime(moment, datetime.timezone.utc).strftime("%Y-%m")
+
+
+def to_record(entry):
+    return {
+        "id": entry.pk,
+        "manual": entry.manual_id,
+        "version": entry.version_id,
+        "action": entry.action,
+        "actor": entry.actor_id,
+        "actor_username": entry.actor.username,
+        "metadata": entry.metadata,
+        "created_at": entry.created_at,
+    }
+
+
+def archive_expired(now=None, batch_size=1000, dry_run=False):
+    """
+    Move expired rows into the month files, oldest first, one batch per
+    transaction. Rows are appended to the archive before they are deleted, so
+    an interrupted run can at worst archive a row twice, never lose it.
+    Returns the number of rows archived per month.
+    """
+    condition = expired_filter(now)
+    counts = {}
+    if condition is None:
+        return counts
+    expired = AuditLog.objects.filter(condition).select_related("actor").order_by("created_at", "pk")
+    if dry_run:
+        for created_at in expired.values_list("created_at", flat=True).iterator(chunk_size=batch_size):
+            month = month_of(created_at)
+            counts[month] = counts.get(month, 0) + 1
+        return counts
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    while True:
+        batch = list(expired[:batch_size])
+        if not batch:
+            return counts
+        months = {}
+        for entry in batch:
+            months.setdefault(month_of(entry.created_at), []).append(entry)
+        for month, entries in months.items():
+            # Appending adds a gzip member; readers see one continuous stream
+            with gzip.open(directory / ARCHIVE_NAME.format(month=month), "ab") as archive:
+                for entry in entries:
+                    archive.write(json.dumps(to_record(entry), default=encode, separators=(",", ":")).encode("utf-8") + b"\n")
+            counts[month] = counts.get(month, 0) + len(entries)
+        with transaction.atomic():
+            AuditLog.objects.filter(pk__in=[entry.pk for entry in batch]).delete()
+
+
+def archived_months():
+    directory = archive_dir()
+    if not directory.is_dir():
+        return []
+    return sorted(match.group(1) for match in map(ARCHIVE_RE.match, (path.name for path in directory.iterdir())) if match)
+
+
+def read_archive(months=None, manual=None, actor=None, action=None, since=None, until=None):
+    """
+    Yield archived records (dicts, created_at parsed) matching the filters,
+    month by month. ``months`` limits the scan to those YYYY-MM files; a date
+    range also skips the months outside it.
+    """
+    for month in archived_months():
+        if months and month not in months:
+            continue
+        if since is not None and month < month_of(since):
+            continue
+        if until is not None and month > month_of(until):
+            continue
+        seen = set()
+        with gzip.open(archive_dir() / ARCHIVE_NAME.format(month=month), "rt", encoding="utf-8") as archive:
+            for line in archive:
+                record = json.loads(line)
+                if record["id"] in seen:
+                    # Written twice by an interrupted run
+                    continue
+                seen.add(record["id"])
+                record["created_at"] = parse_datetime(record["created_at"])
+                if manual is not None and record["manual"] != manual:
+                    continue
+                if actor is not None and actor not in (record["actor"], record["actor_username"]):
+                    continue
+                if action is not None and record["action"] != action:
+                    continue
+                if since is not None and record["created_at"] < since:
+                    continue
+                if until is not None and record["created_at"] >= until:
+                    continue
+                yield record
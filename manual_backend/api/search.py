@@ -0,0 +1,228 @@
+"""
+Full-text search over manuals.
+
+The index holds one document per manual: title, department, reference, tag
+and category names, and the text inside the current version's blocks.
+Backends are pluggable through ``settings.MANUAL_SEARCH_BACKEND``; by default
+SQLite uses an FTS5 table and other databases fall back to an icontains scan.
+
+Manual, tag and category changes reindex through signal handlers. Block
+writes don't: a per-row handler would cost a query per block and turn the
+bulk save's delete into a row-by-row one, so the views that write blocks
+call ``schedule_reindex_for_versions`` once per request instead.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Category, ContentBlock, Manual, Tag
+
+
+# Block data keys that hold markup hints or URLs rather than readable text
+SKIP_KEYS = {"originalType", "src", "url", "asset", "listType", "language", "diagramType"}
+
+# Indexed manual fields that should trigger a reindex when saved
+INDEXED_FIELDS = {"title", "department", "reference", "category", "current_version"}
+
+# Ranked candidates fetched per round of the visibility filter
+CANDIDATE_BATCH = 500
+
+
+def extract_text(data):
+    """Collect the human-readable strings from a block's data JSON"""
+    parts = []
+
+    def walk(value, key=None):
+        if key in SKIP_KEYS:
+            return
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, dict):
+            for child_key, child in value.items():
+                walk(child, child_key)
+        elif isinstance(value, list):
+            for child in value:
+                walk(child)
+
+    walk(data)
+    return "\n".join(parts)
+
+
+def build_document(manual):
+    blocks = []
+    if manual.current_version_id:
+        blocks = ContentBlock.objects.filter(version_id=manual.current_version_id).select_related("payload")
+    return {
+        "title": manual.title,
+        "department": manual.department,
+        "reference": manual.reference or "",
+        "tags": " ".join(manual.tags.values_list("name", flat=True)),
+        "category": manual.category.name if manual.category_id else "",
+        "content": "\n".join(extract_text(block.data) for block in blocks),
+    }
+
+
+class BaseSearchBackend:
+    def index_manual(self, manual):
+        pass
+
+    def remove_manual(self, manual_id):
+        pass
+
+    def search(self, query, limit, offset=0):
+        """Return manual ids matching ``query``, best match first, skipping the first ``offset``"""
+        raise NotImplementedError
+
+    def rebuild(self):
+        for manual in Manual.objects.select_related("category").iterator(chunk_size=500):
+            self.index_manual(manual)
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Portable fallback without an index; every term must match some field"""
+
+    def search(self, query, limit, offset=0):
+        queryset = Manual.objects.all()
+        for term in query.split():
+            queryset = queryset.filter(
+                Q(title__icontains=term)
+                | Q(department__icontains=term)
+                | Q(reference__icontains=term)
+                | Q(tags__name__icontains=term)
+                | Q(category__name__icontains=term)
+                | Q(current_version__blocks__payload__data__icontains=term)
+            )
+        return list(queryset.order_by("-updated_at", "id").values_list("id", flat=True).distinct()[offset:offset + limit])
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """FTS5 index keyed by manual id (created by migration 0008)"""
+    table = "api_manual_search"
+    columns = ("title", "department", "reference", "tags", "category", "content")
+    # bm25 column weights, in the order of ``columns``
+    weights = (10.0, 2.0, 5.0, 3.0, 3.0, 1.0)
+
+    def index_manual(self, manual):
+        document = build_document(manual)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [manual.pk])
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, {', '.join(self.columns)}) VALUES (%s, {', '.join(['%s'] * len(self.columns))})",
+                [manual.pk, *(document[column] for column in self.columns)],
+            )
+
+    def remove_manual(self, manual_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [manual_id])
+
+    def search(self, query, limit, offset=0):
+        # Quote each term so user input can't inject FTS syntax; prefix-match the terms
+        match = " ".join('"{}"*'.format(term.replace('"', '""')) for term in query.split())
+        if not match:
+            return []
+        weights = ", ".join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {weights}), rowid LIMIT %s OFFSET %s",
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+        super().rebuild()
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "MANUAL_SEARCH_BACKEND", None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == "sqlite":
+            _backend = SQLiteFTSBackend()
+        else:
+            _backend = DatabaseSearchBackend()
+    return _backend
+
+
+def search_manuals(queryset, query, limit):
+    """
+    Run ``query`` against the index and return matches from ``queryset``,
+    ranked. Candidates are read a batch at a time until ``limit`` of them
+    pass the queryset's filters, so matches the user can't see don't crowd
+    out lower-ranked ones they can.
+    """
+    backend = get_search_backend()
+    results = []
+    offset = 0
+    while len(results) < limit:
+        ids = backend.search(query, CANDIDATE_BATCH, offset)
+        rank = {manual_id: position for position, manual_id in enumerate(ids)}
+        results += sorted(queryset.filter(id__in=ids), key=lambda manual: rank[manual.id])
+        if len(ids) < CANDIDATE_BATCH:
+            break
+        offset += CANDIDATE_BATCH
+    return results[:limit]
+
+
+def reindex_manual(manual_id):
+    manual = Manual.objects.select_related("category").filter(pk=manual_id).first()
+    if manual is None:
+        get_search_backend().remove_manual(manual_id)
+    else:
+        get_search_backend().index_manual(manual)
+
+
+def schedule_reindex(manual_ids):
+    """Reindex the given manuals once the current transaction commits"""
+    for manual_id in set(manual_ids):
+        transaction.on_commit(lambda manual_id=manual_id: reindex_manual(manual_id))
+
+
+def schedule_reindex_for_versions(version_ids):
+    """Reindex manuals whose current version is one of ``version_ids``"""
+    schedule_reindex(Manual.objects.filter(current_version_id__in=version_ids).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Manual)
+def reindex_saved_manual(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or INDEXED_FIELDS.intersection(update_fields):
+        schedule_reindex([instance.pk])
+
+
+@receiver(post_delete, sender=Manual)
+def remove_deleted_manual(sender, instance, **kwargs):
+    manual_id = instance.pk
+    transaction.on_commit(lambda: get_search_backend().remove_manual(manual_id))
+
+
+@receiver(m2m_changed, sender=Manual.tags.through)
+def reindex_retagged_manual(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # instance is a Tag; pk_set holds manual ids (None on clear)
+        schedule_reindex(pk_set or [])
+    else:
+        schedule_reindex([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_manuals(sender, instance, created, **kwargs):
+    if not created:
+        schedule_reindex(instance.manuals.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Tag)
+def reindex_tag_manuals(sender, instance, created, **kwargs):
+    if not created:
+        schedule_reindex(instance.manuals.values_list("id", flat=True))
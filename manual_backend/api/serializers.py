@@ -9,24 +9,54 @@ from .models import (
     ContentBlock,
     ReviewRequest,
     AuditLog,
+    Asset,
+    AssetUpload,
 )
+from .assets import AssetError, asset_url, check_content_type, max_size
+from .derivatives import variant_urls
+from .instrumentation import TimedSerializerMixin
+from .permissions import ManualPermissionResolver
 
 
-class CategorySerializer(serializers.ModelSerializer):
+def requested_fields(request):
+    """Field names from a GET request's ?fields=a,b,c, or None when not given"""
+    if request is None or request.method != "GET":
+        return None
+    fields = request.query_params.get("fields")
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(",") if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Trims the output to the fields listed in ?fields=. Only the top-level
+    serializer of a response is trimmed; nested serializers render in full.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = requested_fields(self.context.get("request"))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+class CategorySerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ["id", "name", "slug", "description", "color", "created_at", "updated_at"]
         read_only_fields = ["created_at", "updated_at"]
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ["id", "name", "slug", "color", "created_at", "updated_at"]
         read_only_fields = ["created_at", "updated_at"]
 
 
-class ManualCollaboratorSerializer(serializers.ModelSerializer):
+class ManualCollaboratorSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     user_id = serializers.IntegerField(write_only=True)
     user_username = serializers.CharField(source='user.username', read_only=True)
     user_email = serializers.CharField(source='user.email', read_only=True)
@@ -53,7 +83,12 @@ class ManualCollaboratorSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at", "updated_at", "added_by"]
 
 
-class ContentBlockSerializer(serializers.ModelSerializer):
+class ContentBlockSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    # Stored on the shared BlockPayload; ContentBlock exposes them as properties
+    type = serializers.ChoiceField(choices=ContentBlock.BlockType.choices)
+    data = serializers.JSONField(required=False)
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = ContentBlock
         fields = [
@@ -62,13 +97,77 @@ class ContentBlockSerializer(serializers.ModelSerializer):
             "order",
             "type",
             "data",
+            "variants",
             "created_at",
             "updated_at",
         ]
 
+    def get_variants(self, obj):
+        """Resized image URLs by variant name for IMAGE blocks backed by an asset"""
+        data = obj.data
+        if obj.type == ContentBlock.BlockType.IMAGE and isinstance(data, dict) and data.get("asset"):
+            return variant_urls(data["asset"])
+        return None
+
+
+class ContentBlockBulkSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """One entry of the ordered block list accepted by the bulk save endpoint"""
+    order = serializers.IntegerField(min_value=0, required=False)
+    type = serializers.ChoiceField(choices=ContentBlock.BlockType.choices)
+    data = serializers.JSONField(required=False)
+
+    class Meta:
+        model = ContentBlock
+        fields = [
+            "order",
+            "type",
+            "data",
+        ]
+
+    def validate_data(self, value):
+        # Renderers and asset extraction read block data as an object
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Expected a JSON object.")
+        return value
+
 
-class ManualVersionSerializer(serializers.ModelSerializer):
+class BlockMoveSerializer(TimedSerializerMixin, serializers.Serializer):
+    """One move for the reorder endpoint: put block ``id`` right after ``after`` (null: first)"""
+    id = serializers.IntegerField()
+    after = serializers.IntegerField(allow_null=True, required=False, default=None)
+
+
+class BlockPatchOperationSerializer(TimedSerializerMixin, serializers.Serializer):
+    """One insert/update/delete/move step of a version patch, keyed by base block id"""
+    op = serializers.ChoiceField(choices=["insert", "update", "delete", "move"])
+    id = serializers.IntegerField(required=False)
+    order = serializers.IntegerField(min_value=0, required=False)
+    type = serializers.ChoiceField(choices=ContentBlock.BlockType.choices, required=False)
+    data = serializers.JSONField(required=False)
+
+    def validate_data(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Expected a JSON object.")
+        return value
+
+    def validate(self, attrs):
+        op = attrs["op"]
+        if op != "insert" and "id" not in attrs:
+            raise serializers.ValidationError({"id": f"This field is required for {op} operations."})
+        if op == "insert" and "type" not in attrs:
+            raise serializers.ValidationError({"type": "This field is required for insert operations."})
+        if op == "move" and "order" not in attrs:
+            raise serializers.ValidationError({"order": "This field is required for move operations."})
+        return attrs
+
+
+class ManualVersionSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     blocks = ContentBlockSerializer(many=True, read_only=True)
+    # Optional copy-on-write creation: start from base_version and apply operations
+    base_version = serializers.PrimaryKeyRelatedField(
+        queryset=ManualVersion.objects.all(), write_only=True, required=False
+    )
+    operations = BlockPatchOperationSerializer(many=True, write_only=True, required=False)
 
     class Meta:
         model = ManualVersion
@@ -81,13 +180,57 @@ class ManualVersionSerializer(serializers.ModelSerializer):
             "is_published",
             "published_html",
             "blocks",
+            "base_version",
+            "operations",
             "created_at",
             "updated_at",
         ]
         read_only_fields = ["created_by", "version_number", "is_published", "published_html", "created_at", "updated_at"]
 
+    def validate(self, attrs):
+        if self.instance is not None:
+            # Patching only applies when a version is created
+            attrs.pop("base_version", None)
+            attrs.pop("operations", None)
+            return attrs
+        manual = attrs.get("manual")
+        base = attrs.get("base_version")
+        if base is None and attrs.get("operations") and manual is not None:
+            base = attrs["base_version"] = manual.current_version
+            if base is None:
+                raise serializers.ValidationError({"base_version": "Manual has no version to patch."})
+        if base is not None:
+            if manual is not None and base.manual_id != manual.id:
+                raise serializers.ValidationError({"base_version": "Base version belongs to a different manual."})
+            block_ids = set(base.blocks.values_list("id", flat=True))
+            # Replay the ids so a step can't target a block an earlier step deleted
+            remaining = set(block_ids)
+            for index, operation in enumerate(attrs.get("operations", [])):
+                if operation["op"] == "insert":
+                    continue
+                if operation["id"] not in block_ids:
+                    raise serializers.ValidationError(
+                        {"operations": f"Block {operation['id']} is not part of version {base.pk}."}
+                    )
+                if operation["id"] not in remaining:
+                    raise serializers.ValidationError(
+                        {"operations": f"Operation {index} targets block {operation['id']}, deleted by an earlier one."}
+                    )
+                if operation["op"] == "delete":
+                    remaining.discard(operation["id"])
+        return attrs
+
+
+class ManualListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    def to_representation(self, data):
+        # Load the user's grants once, so can_edit/can_view resolve each manual without a query
+        request = self.context.get('request')
+        if request and hasattr(request, 'user'):
+            ManualPermissionResolver.for_request(request).prime()
+        return super().to_representation(data)
+
 
-class ManualSerializer(serializers.ModelSerializer):
+class ManualSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     current_version = serializers.PrimaryKeyRelatedField(read_only=True)
     collaborators = ManualCollaboratorSerializer(many=True, read_only=True)
     can_edit = serializers.SerializerMethodField()
@@ -113,21 +256,22 @@ class ManualSerializer(serializers.ModelSerializer):
             "updated_at",
         ]
         read_only_fields = ["created_by", "current_version", "collaborators", "can_edit", "can_view", "reference", "created_at", "updated_at"]
+        list_serializer_class = ManualListSerializer
     
     def get_can_edit(self, obj):
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
-            return obj.can_edit(request.user)
+            return ManualPermissionResolver.for_request(request).can_edit(obj)
         return False
     
     def get_can_view(self, obj):
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
-            return obj.can_view(request.user)
+            return ManualPermissionResolver.for_request(request).can_view(obj)
         return False
 
 
-class ReviewRequestSerializer(serializers.ModelSerializer):
+class ReviewRequestSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     # Nested serializers for related data
     manual_title = serializers.CharField(source='version.manual.title', read_only=True)
     manual_id = serializers.IntegerField(source='version.manual.id', read_only=True)
@@ -183,7 +327,7 @@ class ReviewRequestSerializer(serializers.ModelSerializer):
         return None
 
 
-class AuditLogSerializer(serializers.ModelSerializer):
+class AuditLogSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = AuditLog
         fields = [
@@ -195,4 +339,34 @@ class AuditLogSerializer(serializers.ModelSerializer):
             "metadata",
             "created_at",
         ]
-        read_only_fields = ["created_at"]
\ No newline at end of file
+        read_only_fields = ["created_at"]
+
+
+class AssetSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Asset
+        fields = ["digest", "url", "content_type", "size", "created_at"]
+        read_only_fields = fields
+
+    def get_url(self, obj):
+        return asset_url(obj.digest)
+
+
+class AssetUploadSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = AssetUpload
+        fields = ["id", "filename", "content_type", "size", "received", "created_at", "updated_at"]
+        read_only_fields = ["received", "created_at", "updated_at"]
+
+    def validate_content_type(self, value):
+        try:
+            return check_content_type(value)
+        except AssetError as exc:
+            raise serializers.ValidationError(str(exc))
+
+    def validate_size(self, value):
+        if value > max_size():
+            raise serializers.ValidationError(f"Assets are limited to {max_size()} bytes.")
+        return value
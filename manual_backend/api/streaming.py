@@ -0,0 +1,161 @@
+"""
+Incremental JSON responses for versions and block lists.
+
+A version's blocks are read with ``iterator(chunk_size=...)`` and rendered one
+at a time, so memory stays flat however many blocks a manual has. Every piece
+goes through DRF's JSONRenderer, so the streamed body is byte for byte what
+the equivalent Response would render.
+
+Under ASGI, Django buffers a sync iterator completely before sending it, so
+requests served by the ASGI handler get async iterators instead (see
+``served_by_asgi``).
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .models import ContentBlock
+from .serializers import ContentBlockSerializer, ManualVersionSerializer
+
+
+renderer = JSONRenderer()
+
+
+def chunk_size():
+    return getattr(settings, "STREAMING_BLOCK_CHUNK_SIZE", 500)
+
+
+def render(value):
+    # JSONRenderer renders None as an empty body rather than null
+    return b"null" if value is None else renderer.render(value)
+
+
+def wants_stream(request):
+    """Stream JSON only; the browsable API renders the regular Response"""
+    accepted = getattr(request, "accepted_renderer", None)
+    return accepted is None or accepted.format == "json"
+
+
+def served_by_asgi(request):
+    """Whether ``request`` (Django's or DRF's) came through the ASGI handler"""
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+async def aiterate(chunks):
+    """
+    Drive a sync iterator from the event loop, one item per hop to the thread
+    that runs sync ORM code, so its database connection stays the same
+    """
+    iterator = iter(chunks)
+    done = object()
+    step = sync_to_async(next)
+    while (chunk := await step(iterator, done)) is not done:
+        yield chunk
+
+
+def buffered(chunks):
+    """Join small pieces into writes of roughly STREAMING_BUFFER_SIZE bytes"""
+    limit = getattr(settings, "STREAMING_BUFFER_SIZE", 64 * 1024)
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= limit:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def abuffered(chunks):
+    limit = getattr(settings, "STREAMING_BUFFER_SIZE", 64 * 1024)
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= limit:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def iter_array(items, serializer):
+    yield b"["
+    for index, item in enumerate(items):
+        yield (b"," if index else b"") + render(serializer.to_representation(item))
+    yield b"]"
+
+
+async def aiter_array(items, serializer):
+    yield b"["
+    index = 0
+    async for item in items:
+        yield (b"," if index else b"") + render(serializer.to_representation(item))
+        index += 1
+    yield b"]"
+
+
+def version_parts(version, context):
+    """
+    The version's fields before and after ``blocks`` (rendered in place), or
+    None when ?fields= leaves the blocks out.
+    """
+    serializer = ManualVersionSerializer(version, context=context)
+    names = [name for name, field in serializer.fields.items() if not field.write_only]
+    if "blocks" not in names:
+        return None
+    serializer.fields.pop("blocks")
+    data = serializer.to_representation(version)
+    position = names.index("blocks")
+    items = [render(name) + b":" + render(data[name]) for name in names if name != "blocks"]
+    head = b"{" + b"".join(item + b"," for item in items[:position]) + render("blocks") + b":"
+    tail = b"".join(b"," + item for item in items[position:]) + b"}"
+    return head, tail
+
+
+def version_blocks(version):
+    return ContentBlock.objects.filter(version=version).select_related("payload").order_by("order", "created_at")
+
+
+def stream_version(request, version, context=None):
+    """ManualVersionSerializer output for ``version``, streaming its blocks"""
+    if served_by_asgi(request):
+        return astream_version(version, context)
+    parts = version_parts(version, context or {})
+    if parts is None:
+        return None
+    head, tail = parts
+
+    def chunks():
+        yield head
+        yield from iter_array(version_blocks(version).iterator(chunk_size=chunk_size()), ContentBlockSerializer())
+        yield tail
+
+    return StreamingHttpResponse(buffered(chunks()), content_type="application/json")
+
+
+def astream_version(version, context=None):
+    """Async counterpart of ``stream_version`` for the ASGI read views"""
+    parts = version_parts(version, context or {})
+    if parts is None:
+        return None
+    head, tail = parts
+
+    async def chunks():
+        yield head
+        blocks = version_blocks(version).aiterator(chunk_size=chunk_size())
+        async for chunk in aiter_array(blocks, ContentBlockSerializer()):
+            yield chunk
+        yield tail
+
+    return StreamingHttpResponse(abuffered(chunks()), content_type="application/json")
+
+
+def stream_list(request, queryset, serializer):
+    """A JSON array of ``serializer`` applied to each row of ``queryset``"""
+    if served_by_asgi(request):
+        items = queryset.aiterator(chunk_size=chunk_size())
+        return StreamingHttpResponse(abuffered(aiter_array(items, serializer)), content_type="application/json")
+    items = queryset.iterator(chunk_size=chunk_size())
+    return StreamingHttpResponse(buffered(iter_array(items, serializer)), content_type="application/json")
@@ -1,3 +1,1692 @@
-from django.test import TestCase
+import base64
+import datetime
+import gzip
+import hashlib
+import importlib
+import io
+import json
+import tempfile
+import threading
+import warnings
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from PIL import Image
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from manual_backend.asgi import ManualBackendASGIHandler
+from manual_backend.database import SQLITE_PRAGMAS, database_config
+from .async_views import AsyncReadView
+from .assets import get_storage, storage_name
+from .audit import ThreadedAuditSink, begin_request, end_request, record
+from .benchmarking import compare
+from .derivatives import generate
+from .diff import compute_diff
+from .filters import filter_audit_log, filter_reviews, filter_versions
+from .instrumentation import RequestMetrics, TimedSerializerMixin, begin, current, discard
+from .retention import archive_expired, read_archive
+from .models import (
+    Asset,
+    AssetUpload,
+    AuditLog,
+    BlockPayload,
+    Category,
+    ContentBlock,
+    Manual,
+    ManualCollaborator,
+    ManualVersion,
+    ReviewRequest,
+    Tag,
+    new_reference,
+)
+from .ordering import gapped
+from .rendering import render_block, render_version, safe_url
+from . import serializers as api_serializers
+from .serializers import ContentBlockSerializer, ManualVersionSerializer
+from .views import ManualViewSet
+from . import visibility
+
+
+def content(response):
+    """The body of a regular, streaming or async streaming response"""
+    if not response.streaming:
+        return response.content
+    if response.is_async:
+        async def join():
+            return b"".join([chunk async for chunk in response.streaming_content])
+        return async_to_sync(join)()
+    return b"".join(response.streaming_content)
+
+
+class ManualListQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.other = User.objects.create_user(username="author", password="pass")
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def create_manuals(self, count):
+        for index in range(Manual.objects.count(), Manual.objects.count() + count):
+            Manual.objects.create(title=f"Own {index}", slug=f"own-{index}", created_by=self.user)
+            shared = Manual.objects.create(title=f"Shared {index}", slug=f"shared-{index}", created_by=self.other)
+            ManualCollaborator.objects.create(
+                manual=shared, user=self.user, role=ManualCollaborator.CollaboratorRole.VIEWER, added_by=self.other
+            )
+            Manual.objects.create(
+                title=f"Approved {index}", slug=f"approved-{index}", created_by=self.other,
+                status=Manual.ManualStatus.APPROVED,
+            )
+
+    def list_query_count(self):
+        # Warm the visibility cache first; a cold cache adds two grant queries
+        self.client.get("/api/manuals/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/manuals/")
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data
+
+    def test_list_query_count_is_constant(self):
+        self.create_manuals(2)
+        small_count, _ = self.list_query_count()
+        self.create_manuals(8)
+        large_count, data = self.list_query_count()
+        self.assertEqual(len(data), 30)
+        self.assertEqual(small_count, large_count)
+        # manuals, tags, collaborators (+ users), then the session load
+        self.assertEqual(large_count, 4)
+
+    def test_list_permissions(self):
+        self.create_manuals(1)
+        _, data = self.list_query_count()
+        flags = {manual["title"]: (manual["can_edit"], manual["can_view"]) for manual in data}
+        self.assertEqual(flags["Own 0"], (True, True))
+        self.assertEqual(flags["Shared 0"], (False, True))
+        self.assertEqual(flags["Approved 0"], (False, False))
+
+    def test_sparse_list_without_collaborators(self):
+        self.create_manuals(3)
+        self.client.get("/api/manuals/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/manuals/?fields=id,title,can_edit")
+        self.assertEqual(len(response.data), 9)
+        # manuals and tags, then the session load
+        self.assertEqual(len(queries), 3)
+
+    def test_visibility_cache_invalidation(self):
+        shared = Manual.objects.create(title="Shared", slug="shared", created_by=self.other)
+        self.assertEqual(self.list_query_count()[1], [])
+        collaborator = ManualCollaborator.objects.create(
+            manual=shared, user=self.user, role=ManualCollaborator.CollaboratorRole.EDITOR, added_by=self.other
+        )
+        _, data = self.list_query_count()
+        self.assertEqual([(manual["slug"], manual["can_edit"]) for manual in data], [("shared", True)])
+        collaborator.role = ManualCollaborator.CollaboratorRole.VIEWER
+        collaborator.save()
+        _, data = self.list_query_count()
+        self.assertEqual([(manual["slug"], manual["can_edit"]) for manual in data], [("shared", False)])
+        collaborator.delete()
+        self.assertEqual(self.list_query_count()[1], [])
+        shared.status = Manual.ManualStatus.APPROVED
+        shared.save(update_fields=["status"])
+        self.assertEqual([manual["slug"] for manual in self.list_query_count()[1]], ["shared"])
+
+    def test_large_grants_use_subqueries(self):
+        self.create_manuals(3)
+        _, inlined = self.list_query_count()
+        with mock.patch("api.visibility.INLINE_GRANTS_LIMIT", 2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/api/manuals/")
+        self.assertEqual(response.data, inlined)
+        sql = next(query["sql"] for query in queries if 'FROM "api_manual"' in query["sql"])
+        self.assertIn("EXISTS", sql)
+        self.assertNotIn(" IN (", sql)
+
+    def test_subquery_visibility_plan(self):
+        self.create_manuals(2)
+        with mock.patch("api.visibility.INLINE_GRANTS_LIMIT", 0):
+            queryset = ManualViewSet.visible_queryset(None, self.user, visibility.load_grants(self.user.pk))
+            sql = str(queryset.query)
+            plan = queryset.explain()
+            large_count, data = self.list_query_count()
+        self.assertEqual(len(data), 6)
+        self.assertEqual(large_count, 4)
+        # One correlated EXISTS probe of the (manual, user) unique index per
+        # manual: no join to collaborators fans rows out, so no DISTINCT
+        self.assertNotIn("DISTINCT", sql)
+        self.assertNotRegex(sql, r'JOIN "api_manualcollaborator"')
+        self.assertRegex(plan, r"SEARCH \w+ USING COVERING INDEX api_manualcollaborator_manual_id_user_id_\w+ \(manual_id=\? AND user_id=\?\)")
+
+    def test_write_checks_ignore_stale_grants(self):
+        shared = Manual.objects.create(title="Shared", slug="shared", created_by=self.other)
+        ManualCollaborator.objects.create(
+            manual=shared, user=self.user, role=ManualCollaborator.CollaboratorRole.EDITOR, added_by=self.other
+        )
+        self.assertTrue(self.list_query_count()[1][0]["can_edit"])
+        # Removed in another worker: this process keeps the cached grants
+        with mock.patch("api.visibility.invalidate"):
+            ManualCollaborator.objects.filter(manual=shared).delete()
+        response = self.client.patch("/api/manuals/shared/", {"title": "Renamed"})
+        self.assertEqual(response.status_code, 403)
+
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.client.force_authenticate(self.user)
+        for index in range(11):
+            Manual.objects.create(title=f"Manual {index}", slug=f"manual-{index}", created_by=self.user)
+
+    def follow(self, path):
+        """Slugs of every page reached through ``next``, and the number of pages"""
+        slugs, pages = [], 0
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            slugs += [manual["slug"] for manual in response.data["results"]]
+            pages += 1
+            path = response.data["next"]
+        return slugs, pages
+
+    def test_pages_cover_tied_timestamps_once(self):
+        # cursor_ordering is ("-updated_at", "id"): the cursor positions on
+        # updated_at only and skips tied rows by offset
+        now = timezone.now()
+        manuals = list(Manual.objects.order_by("id"))
+        for index, manual in enumerate(manuals):
+            # Runs of 4 identical timestamps, longer than a page
+            Manual.objects.filter(pk=manual.pk).update(updated_at=now - datetime.timedelta(minutes=index // 4))
+        expected = [manual.slug for manual in manuals]
+        for page_size in (1, 2, 3, 5):
+            slugs, pages = self.follow(f"/api/manuals/?page_size={page_size}")
+            self.assertEqual(slugs, expected, page_size)
+            self.assertEqual(pages, -(-len(expected) // page_size), page_size)
+
+    def test_all_rows_tied(self):
+        Manual.objects.update(updated_at=timezone.now())
+        slugs, _ = self.follow("/api/manuals/?page_size=3")
+        self.assertEqual(slugs, list(Manual.objects.order_by("id").values_list("slug", flat=True)))
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    base_dir = Path("/srv/app")
+
+    def test_sqlite_defaults(self):
+        self.assertEqual(database_config(self.base_dir, {}), {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": self.base_dir / "db.sqlite3",
+            "OPTIONS": {"timeout": 20.0, "init_command": SQLITE_PRAGMAS, "transaction_mode": "IMMEDIATE"},
+        })
+        for pragma in ("journal_mode=WAL", "synchronous=NORMAL", "temp_store=MEMORY"):
+            self.assertIn(f"PRAGMA {pragma};", SQLITE_PRAGMAS)
+
+    def test_sqlite_from_env(self):
+        config = database_config(self.base_dir, {
+            "DB_ENGINE": "SQLite", "DB_NAME": "/data/manuals.db", "DB_BUSY_TIMEOUT": "5", "DB_SQLITE_TUNED": "0",
+        })
+        self.assertEqual(config["NAME"], "/data/manuals.db")
+        # Stock Django behaviour: no PRAGMAs, deferred transactions
+        self.assertEqual(config["OPTIONS"], {"timeout": 5.0})
+
+    def test_postgres_persistent_connections(self):
+        config = database_config(self.base_dir, {
+            "DB_ENGINE": "postgres", "DB_NAME": "manuals", "DB_USER": "app", "DB_PASSWORD": "secret",
+            "DB_HOST": "db", "DB_PORT": "6432", "DB_CONN_MAX_AGE": "120",
+        })
+        self.assertEqual(config, {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": "manuals", "USER": "app", "PASSWORD": "secret", "HOST": "db", "PORT": "6432",
+            "CONN_MAX_AGE": 120, "CONN_HEALTH_CHECKS": True, "OPTIONS": {},
+        })
+        defaults = database_config(self.base_dir, {"DB_ENGINE": "postgresql"})
+        self.assertEqual((defaults["NAME"], defaults["HOST"], defaults["PORT"]), ("manual_backend", "localhost", "5432"))
+        self.assertEqual(defaults["CONN_MAX_AGE"], 60)
+
+    def test_postgres_pool(self):
+        config = database_config(self.base_dir, {"DB_ENGINE": "postgres", "DB_POOL": "yes", "DB_CONN_MAX_AGE": "120"})
+        # Django rejects a pool together with persistent connections
+        self.assertEqual(config["CONN_MAX_AGE"], 0)
+        self.assertEqual(config["OPTIONS"], {"pool": {"min_size": 2, "max_size": 10}})
+        config = database_config(self.base_dir, {
+            "DB_ENGINE": "postgres", "DB_POOL": "1", "DB_POOL_MIN_SIZE": "4", "DB_POOL_MAX_SIZE": "32",
+        })
+        self.assertEqual(config["OPTIONS"]["pool"], {"min_size": 4, "max_size": 32})
+
+    def test_unknown_engine(self):
+        with self.assertRaisesMessage(ValueError, "Unsupported DB_ENGINE 'mysql'"):
+            database_config(self.base_dir, {"DB_ENGINE": "mysql"})
+
+
+class AsyncReadPathTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.other = User.objects.create_user(username="author", password="pass")
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        cache.clear()
+        self.own = Manual.objects.create(title="Own", slug="own", created_by=self.user)
+        shared = Manual.objects.create(title="Shared", slug="shared", created_by=self.other)
+        ManualCollaborator.objects.create(
+            manual=shared, user=self.user, role=ManualCollaborator.CollaboratorRole.EDITOR, added_by=self.other
+        )
+        Manual.objects.create(title="Hidden", slug="hidden", created_by=self.other)
+        self.version = ManualVersion.objects.create(manual=self.own, version_number=1, created_by=self.user)
+        for order, text in enumerate(["First", "Second"]):
+            ContentBlock.objects.create(version=self.version, order=order, type="TEXT", data={"text": text})
+        self.review = ReviewRequest.objects.create(version=self.version, submitted_by=self.user)
+        AuditLog.objects.create(manual=self.own, version=self.version, action=AuditLog.Action.SUBMIT, actor=self.user)
+
+    def get_async(self, path, **kwargs):
+        with override_settings(ROOT_URLCONF="manual_backend.asgi_urls"):
+            return async_to_sync(self.async_client.get)(path, **kwargs)
+
+    def test_matches_drf_responses(self):
+        paths = [
+            "/api/manuals/",
+            "/api/manuals/?fields=id,slug,can_edit",
+            "/api/manuals/shared/",
+            f"/api/versions/{self.version.pk}/preview/",
+            f"/api/reviews/{self.review.pk}/content/",
+            "/api/audit/",
+        ]
+        with mock.patch.object(AsyncReadView, "fallback", side_effect=AssertionError("fell back")):
+            served = [self.get_async(path) for path in paths]
+        for path, response in zip(paths, served):
+            expected = self.client.get(path)
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(response["Content-Type"], "application/json", path)
+            self.assertEqual(content(response), content(expected), path)
+            self.assertEqual(response.get("ETag"), expected.get("ETag"), path)
+
+    def test_middleware_runs_natively_under_asgi(self):
+        # Django reports each sync/async adaptation at debug level when DEBUG is on
+        with override_settings(DEBUG=True), mock.patch("django.core.handlers.base.logger") as logger:
+            ManualBackendASGIHandler()
+        adapted = [call.args[1] for call in logger.debug.call_args_list if "adapted for" in call.args[0]]
+        self.assertEqual([name for name in adapted if name.startswith("middleware api.")], [])
+
+        with override_settings(ROOT_URLCONF="manual_backend.asgi_urls"), self.captureOnCommitCallbacks(execute=True):
+            response = async_to_sync(self.async_client.post)(
+                "/api/manuals/", {"title": "Audited", "slug": "audited"}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(AuditLog.objects.filter(manual__slug="audited", action=AuditLog.Action.CREATE).exists())
+
+    def test_conditional_get(self):
+        etag = self.client.get(f"/api/versions/{self.version.pk}/preview/")["ETag"]
+        response = self.get_async(f"/api/versions/{self.version.pk}/preview/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_falls_back_to_drf(self):
+        self.assertEqual(self.get_async("/api/manuals/hidden/").status_code, 404)
+        self.assertEqual(self.get_async("/api/manuals/?page_size=1").data["results"][0]["slug"], "shared")
+        self.assertEqual(self.get_async("/api/manuals/search/?q=own").status_code, 200)
+        with override_settings(ROOT_URLCONF="manual_backend.asgi_urls"):
+            response = async_to_sync(self.async_client.post)(
+                "/api/manuals/", {"title": "New", "slug": "new"}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 201)
+        self.async_client.logout()
+        self.assertEqual(self.get_async("/api/manuals/").status_code, 403)
+
+
+@override_settings(STREAMING_BLOCK_CHUNK_SIZE=3, STREAMING_BUFFER_SIZE=256)
+class StreamingResponseTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.client.force_authenticate(self.user)
+        manual = Manual.objects.create(title="Long", slug="long", created_by=self.user)
+        self.version = ManualVersion.objects.create(manual=manual, version_number=1, created_by=self.user)
+        for order in range(10):
+            ContentBlock.objects.create(version=self.version, order=order, type="TEXT", data={"text": f"Block {order} \u2028"})
+        self.review = ReviewRequest.objects.create(version=self.version, submitted_by=self.user)
+
+    def rendered_version(self):
+        return JSONRenderer().render(ManualVersionSerializer(self.version).data)
+
+    def test_version_payloads_stream(self):
+        paths = [
+            f"/api/versions/{self.version.pk}/",
+            f"/api/versions/{self.version.pk}/preview/",
+            f"/api/reviews/{self.review.pk}/content/",
+        ]
+        for path in paths:
+            response = self.client.get(path)
+            self.assertTrue(response.streaming, path)
+            self.assertEqual(response["Content-Type"], "application/json", path)
+            self.assertIn("ETag", response, path)
+            self.assertEqual(content(response), self.rendered_version(), path)
+
+    def test_block_list_streams(self):
+        response = self.client.get("/api/blocks/")
+        self.assertTrue(response.streaming)
+        blocks = ContentBlock.objects.all()
+        self.assertEqual(content(response), JSONRenderer().render(ContentBlockSerializer(blocks, many=True).data))
+        self.assertFalse(self.client.get("/api/blocks/?page_size=5").streaming)
+
+    def test_sparse_fields(self):
+        response = self.client.get(f"/api/versions/{self.version.pk}/?fields=id,blocks")
+        self.assertTrue(response.streaming)
+        self.assertTrue(content(response).startswith(f'{{"id":{self.version.pk},"blocks":[{{'.encode()))
+        response = self.client.get(f"/api/versions/{self.version.pk}/?fields=id,version_number")
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.data, {"id": self.version.pk, "version_number": 1})
+
+    def test_asgi_streams_async_iterators(self):
+        # A sync iterator would be read into memory first, with a warning
+        self.async_client.force_login(self.user)
+        expected = {
+            f"/api/versions/{self.version.pk}/": self.rendered_version(),
+            "/api/blocks/": JSONRenderer().render(ContentBlockSerializer(ContentBlock.objects.all(), many=True).data),
+        }
+        for path, body in expected.items():
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                response = async_to_sync(self.async_client.get)(path)
+            self.assertTrue(response.is_async, path)
+            self.assertEqual(content(response), body, path)
+            self.assertEqual([str(warning.message) for warning in caught], [], path)
+
+    def test_browsable_api_is_not_streamed(self):
+        response = self.client.get(f"/api/versions/{self.version.pk}/", HTTP_ACCEPT="text/html")
+        self.assertFalse(response.streaming)
+        self.assertEqual(len(response.data["blocks"]), 10)
+
+
+# A small flush size makes the import span several bulk-insert rounds
+@override_settings(MANUAL_ARCHIVE_FLUSH_SIZE=4)
+class ManualArchiveTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.author = User.objects.create_user(username="author", password="pass")
+        self.client.force_authenticate(self.admin)
+        category = Category.objects.create(name="Safety", slug="safety")
+        self.manual = Manual.objects.create(title="Guide", slug="guide", created_by=self.author, category=category)
+        self.manual.tags.add(Tag.objects.create(name="Ops", slug="ops"))
+        ManualCollaborator.objects.create(manual=self.manual, user=self.admin, added_by=self.author)
+        first = ManualVersion.objects.create(manual=self.manual, version_number=1, created_by=self.author)
+        for order, text in enumerate(["Intro", "Steps", "Outro"]):
+            ContentBlock.objects.create(version=first, order=order, type="TEXT", data={"text": text})
+        second = ManualVersion.objects.create(manual=self.manual, version_number=2, created_by=self.author)
+        second.copy_blocks_from(first, [{"op": "update", "id": first.blocks.get(order=1).pk, "data": {"text": "New"}}])
+        self.manual.current_version = second
+        self.manual.save(update_fields=["current_version"])
+        ReviewRequest.objects.create(version=second, submitted_by=self.author, feedback="Looks good")
+        AuditLog.objects.create(manual=self.manual, version=second, action=AuditLog.Action.SUBMIT, actor=self.author)
+
+    def export(self, query=""):
+        response = self.client.get(f"/api/manuals/export/{query}")
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def import_archive(self, body):
+        upload = SimpleUploadedFile("manuals.ndjson", body)
+        return self.client.post("/api/manuals/import/", {"file": upload}, format="multipart")
+
+    def test_round_trip(self):
+        body = self.export("?slug=guide&compression=gzip")
+        self.assertTrue(body.startswith(b"\x1f\x8b"))
+        lines = gzip.decompress(body).splitlines()
+        # header, category, tag, manual, collaborator, 2 versions, 4 payloads, 6 blocks, review, audit
+        self.assertEqual(len(lines), 19)
+        response = self.import_archive(body)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["manuals"], 1)
+        self.assertEqual(response.data["blocks"], 6)
+
+        copy = Manual.objects.get(slug="guide-2")
+        self.assertNotEqual(copy.reference, self.manual.reference)
+        self.assertEqual((copy.created_by, copy.category.slug), (self.author, "safety"))
+        self.assertEqual(list(copy.tags.values_list("slug", flat=True)), ["ops"])
+        self.assertEqual(list(copy.collaborators.values_list("user__username", flat=True)), ["admin"])
+        self.assertEqual(copy.current_version.version_number, 2)
+        self.assertEqual(
+            [block.data["text"] for block in copy.current_version.blocks.all()], ["Intro", "New", "Outro"]
+        )
+        self.assertEqual(BlockPayload.objects.count(), 4)
+        self.assertEqual(ReviewRequest.objects.get(version__manual=copy).feedback, "Looks good")
+        original_audit = AuditLog.objects.get(manual=self.manual)
+        audit = AuditLog.objects.get(manual=copy)
+        self.assertEqual((audit.version, audit.created_at), (copy.current_version, original_audit.created_at))
+
+    def test_export_queries_do_not_grow_with_manuals(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.export()
+            return len(queries)
+
+        few = count_queries()
+        for index in range(3):
+            manual = Manual.objects.create(title=f"More {index}", slug=f"more-{index}", created_by=self.admin)
+            version = ManualVersion.objects.create(manual=manual, version_number=1, created_by=self.admin)
+            ContentBlock.objects.create(version=version, order=0, type="TEXT", data={"text": f"More {index}"})
+        self.assertEqual(count_queries(), few)
+
+    def test_export_streams_under_asgi(self):
+        self.async_client.force_login(self.admin)
+        expected = self.export("?slug=guide").splitlines()[1:]
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            response = async_to_sync(self.async_client.get)("/api/manuals/export/?slug=guide")
+        self.assertTrue(response.is_async)
+        # Everything but the header's export time
+        self.assertEqual(content(response).splitlines()[1:], expected)
+        self.assertEqual([str(warning.message) for warning in caught], [])
+
+    def test_missing_users_fall_back_to_importer(self):
+        body = self.export().replace(b'"author"', b'"departed"')
+        self.assertEqual(self.import_archive(body).status_code, 201)
+        copy = Manual.objects.get(slug="guide-2")
+        self.assertEqual(copy.created_by, self.admin)
+        # The admin collaborator collapses onto the new owner
+        self.assertFalse(copy.collaborators.exists())
+
+    def test_import_requires_staff(self):
+        body = self.export()
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.import_archive(body).status_code, 403)
+
+    def test_invalid_archive(self):
+        self.assertEqual(self.import_archive(b'{"type":"manual"}\n').status_code, 400)
+        body = self.export().replace(b'"type":"version"', b'"type":"chapter"')
+        response = self.import_archive(body)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Manual.objects.count(), 1)
+
+
+class ManualReferenceTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", password="pass")
+
+    def test_save_needs_no_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            manual = Manual.objects.create(title="One", slug="one", created_by=self.user)
+        self.assertFalse([query for query in queries if query["sql"].startswith("SELECT")])
+        self.assertEqual(len(manual.reference), 16)
+        second = Manual.objects.create(title="Two", slug="two", created_by=self.user)
+        self.assertLess(manual.reference, second.reference)
+
+    def test_bulk_create_assigns_references(self):
+        manuals = Manual.objects.bulk_create(
+            [Manual(title=f"Bulk {index}", slug=f"bulk-{index}", created_by=self.user) for index in range(50)]
+        )
+        references = [manual.reference for manual in manuals]
+        self.assertEqual(len(set(references)), 50)
+        self.assertEqual(references, sorted(references))
+        self.assertFalse(Manual.objects.filter(reference__isnull=True).exists())
+
+    def test_retries_on_reference_clash(self):
+        taken = Manual.objects.create(title="Taken", slug="taken", created_by=self.user).reference
+        with mock.patch("api.models.new_reference", side_effect=[taken, "0" * 16]):
+            manual = Manual.objects.create(title="New", slug="new", created_by=self.user)
+        self.assertEqual(manual.reference, "0" * 16)
+
+    def test_other_integrity_errors_are_not_retried(self):
+        Manual.objects.create(title="Taken", slug="taken", created_by=self.user)
+        with mock.patch("api.models.new_reference", wraps=new_reference) as generate:
+            with self.assertRaises(IntegrityError):
+                Manual.objects.create(title="Again", slug="taken", created_by=self.user)
+        self.assertEqual(generate.call_count, 1)
+
+
+class AuditBufferTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", password="pass")
+        self.client.force_authenticate(self.user)
+        self.manual = Manual.objects.create(title="Guide", slug="guide", created_by=self.user)
+
+    def test_workflow_actions_are_recorded_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/versions/", {"manual": self.manual.pk}, format="json")
+            self.assertEqual(response.status_code, 201)
+            self.assertFalse(AuditLog.objects.exists())
+        entry = AuditLog.objects.get()
+        self.assertEqual((entry.action, entry.version_id), (AuditLog.Action.UPDATE, response.data["id"]))
+
+    def test_request_entries_are_one_insert(self):
+        token = begin_request()
+        with self.captureOnCommitCallbacks(execute=True):
+            before = timezone.now()
+            for action in (AuditLog.Action.UPDATE, AuditLog.Action.SUBMIT, AuditLog.Action.APPROVE):
+                record(self.manual, action, self.user)
+        with CaptureQueriesContext(connection) as queries:
+            end_request(token)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(AuditLog.objects.count(), 3)
+        self.assertTrue(all(entry.created_at >= before for entry in AuditLog.objects.all()))
+
+    def test_rolled_back_entries_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    record(self.manual, AuditLog.Action.UPDATE, self.user)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertFalse(AuditLog.objects.exists())
+
+
+class BlockPayloadMigrationTests(TransactionTestCase):
+    before = [("api", "0006_add_content_block_types")]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.latest = self.executor.loader.graph.leaf_nodes("api")
+        self.addCleanup(self.migrate, self.latest)
+        self.migrate(self.before)
+
+    def migrate(self, targets):
+        self.executor.loader.build_graph()
+        self.executor.migrate(targets)
+        return self.executor.loader.project_state(targets).apps
+
+    def test_backfill_collapses_shared_content_and_keeps_the_wire_format(self):
+        old = self.executor.loader.project_state(self.before).apps
+        user = old.get_model("accounts", "User").objects.create(username="author")
+        manual = old.get_model("api", "Manual").objects.create(title="Guide", slug="guide", created_by_id=user.pk)
+        Version = old.get_model("api", "ManualVersion")
+        Block = old.get_model("api", "ContentBlock")
+        contents = [("TEXT", {"text": "Shared"}), ("LIST", {"items": ["a", "b"]}), ("DIVIDER", {})]
+        versions = [Version.objects.create(manual=manual, version_number=n, created_by_id=user.pk) for n in (1, 2)]
+        for version in versions:
+            for order, (block_type, data) in enumerate(contents):
+                Block.objects.create(version=version, order=order, type=block_type, data=data)
+        Block.objects.create(version=versions[1], order=3, type="TEXT", data={"text": "Only in v2"})
+        expected = {
+            block.pk: {"id": block.pk, "version": block.version_id, "order": block.order, "type": block.type, "data": block.data}
+            for block in Block.objects.all()
+        }
+
+        self.migrate(self.latest)
+        self.assertEqual(BlockPayload.objects.count(), 4)
+        self.assertEqual(
+            [ContentBlock.objects.filter(payload=payload).count() for payload in BlockPayload.objects.order_by("id")],
+            [2, 2, 2, 1],
+        )
+        for payload in BlockPayload.objects.all():
+            self.assertEqual(payload.digest, BlockPayload.compute_digest(payload.type, payload.data))
+
+        self.client.force_login(User.objects.get(pk=user.pk))
+        for version in versions:
+            blocks = json.loads(content(self.client.get(f"/api/versions/{version.pk}/")))["blocks"]
+            for block in blocks:
+                self.assertEqual({key: block[key] for key in expected[block["id"]]}, expected[block["id"]])
+                # The only field added since is the image variants
+                self.assertEqual(set(block) - {"created_at", "updated_at", "variants"}, set(expected[block["id"]]))
+                self.assertIsNone(block["variants"])
+
+
+    def test_backfill_commits_before_the_block_table_is_altered(self):
+        # PostgreSQL checks the payload FK deferred, and refuses to ALTER a table
+        # with FK checks still pending from rows updated in the same transaction
+        old = self.executor.loader.project_state(self.before).apps
+        user = old.get_model("accounts", "User").objects.create(username="author")
+        manual = old.get_model("api", "Manual").objects.create(title="Guide", slug="guide", created_by_id=user.pk)
+        version = old.get_model("api", "ManualVersion").objects.create(manual=manual, version_number=1, created_by_id=user.pk)
+        old.get_model("api", "ContentBlock").objects.create(version=version, order=0, type="TEXT", data={"text": "x"})
+        pending = {}
+
+        def check(execute, sql, params, many, context):
+            transaction_ = connection.atomic_blocks[0] if connection.atomic_blocks else None
+            if pending.get("transaction") is not transaction_:
+                pending.clear()
+            if transaction_ is not None and sql.startswith('UPDATE "api_contentblock"'):
+                pending["transaction"] = transaction_
+            if pending and sql.startswith(("ALTER", "CREATE TABLE", "DROP")) and "api_content" in sql:
+                self.fail(f"Altered the block table with pending FK checks: {sql}")
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(check):
+            self.migrate([("api", "0007_content_addressed_block_payloads")])
+        self.assertEqual(BlockPayload.objects.get().data, {"text": "x"})
+
+class ThreadedAuditSinkTests(TransactionTestCase):
+    def test_no_entries_lost_on_shutdown(self):
+        user = User.objects.create_user(username="author", password="pass")
+        manual = Manual.objects.create(title="Guide", slug="guide", created_by=user)
+        sink = ThreadedAuditSink(batch_size=64, flush_interval=0.05)
+
+        def submit(worker):
+            for index in range(100):
+                sink.submit([AuditLog(manual=manual, action=AuditLog.Action.UPDATE, actor=user, metadata={"n": index})])
+
+        threads = [threading.Thread(target=submit, args=(worker,)) for worker in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        sink.shutdown()
+        self.assertEqual(AuditLog.objects.count(), 800)
+        # After shutdown entries are written inline
+        sink.submit([AuditLog(manual=manual, action=AuditLog.Action.SUBMIT, actor=user)])
+        self.assertEqual(AuditLog.objects.count(), 801)
+
+
+class AuditRetentionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", password="pass")
+        self.client.force_authenticate(self.user)
+        self.manual = Manual.objects.create(title="Guide", slug="guide", created_by=self.user)
+        archive = tempfile.TemporaryDirectory()
+        self.addCleanup(archive.cleanup)
+        self.settings_override = override_settings(
+            AUDIT_ARCHIVE_DIR=archive.name,
+            AUDIT_RETENTION_DAYS={"default": 30, AuditLog.Action.APPROVE: 400, AuditLog.Action.REJECT: None},
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def add(self, action, days_ago, actor=None):
+        return AuditLog.objects.create(
+            manual=self.manual, action=action, actor=actor or self.user,
+            created_at=timezone.now() - datetime.timedelta(days=days_ago),
+        )
+
+    def test_archive_and_query(self):
+        old_update = self.add(AuditLog.Action.UPDATE, 100)
+        old_approve = self.add(AuditLog.Action.APPROVE, 100)
+        self.add(AuditLog.Action.REJECT, 1000)
+        recent = self.add(AuditLog.Action.UPDATE, 5)
+        out = io.StringIO()
+        call_command("audit_archive", "--dry-run", stdout=out)
+        self.assertIn("Would archive 1 audit entries", out.getvalue())
+        self.assertEqual(AuditLog.objects.count(), 4)
+
+        counts = archive_expired()
+        self.assertEqual(sum(counts.values()), 1)
+        self.assertEqual(
+            set(AuditLog.objects.values_list("action", flat=True)),
+            {AuditLog.Action.APPROVE, AuditLog.Action.REJECT, AuditLog.Action.UPDATE},
+        )
+        self.assertFalse(AuditLog.objects.filter(pk=old_update.pk).exists())
+        # A later sweep appends to the same month file
+        with override_settings(AUDIT_RETENTION_DAYS={"default": 30, AuditLog.Action.REJECT: None}):
+            archive_expired()
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list("action", flat=True)), [AuditLog.Action.REJECT, AuditLog.Action.UPDATE]
+        )
+        self.assertTrue(AuditLog.objects.filter(pk=recent.pk).exists())
+
+        records = list(read_archive())
+        self.assertEqual([record["id"] for record in records], [old_update.pk, old_approve.pk])
+        self.assertEqual(records[0]["created_at"], old_update.created_at)
+        self.assertEqual([record["id"] for record in read_archive(action=AuditLog.Action.APPROVE)], [old_approve.pk])
+        self.assertEqual(list(read_archive(manual=self.manual.pk + 1)), [])
+        out = io.StringIO()
+        call_command("audit_archive", "--query", "--actor", "author", "--action", "UPDATE", stdout=out)
+        self.assertEqual([json.loads(line)["id"] for line in out.getvalue().splitlines()], [old_update.pk])
+
+    def test_per_manual_and_per_user_views(self):
+        other = User.objects.create_user(username="other", password="pass")
+        mine = self.add(AuditLog.Action.UPDATE, 1)
+        theirs = self.add(AuditLog.Action.SUBMIT, 0, actor=other)
+        response = self.client.get(f"/api/audit/manual/{self.manual.pk}/")
+        self.assertEqual([entry["id"] for entry in response.data], [theirs.pk, mine.pk])
+        response = self.client.get("/api/audit/mine/?page_size=10")
+        self.assertEqual([entry["id"] for entry in response.data["results"]], [mine.pk])
+
+
+class ListFilterTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", password="pass")
+        self.reviewer = User.objects.create_user(username="reviewer", password="pass")
+        self.client.force_authenticate(self.user)
+        self.safety = Manual.objects.create(title="Safety", slug="safety", department="Ops", created_by=self.user)
+        self.finance = Manual.objects.create(title="Finance", slug="finance", department="Finance", created_by=self.user)
+        self.versions = [
+            ManualVersion.objects.create(manual=manual, version_number=number, created_by=self.user, is_published=number == 2)
+            for manual in (self.safety, self.finance)
+            for number in (1, 2)
+        ]
+        ReviewRequest.objects.create(version=self.versions[0], submitted_by=self.user)
+        ReviewRequest.objects.create(
+            version=self.versions[2], submitted_by=self.user, reviewer=self.reviewer,
+            status=ReviewRequest.ReviewStatus.APPROVED,
+        )
+        now = timezone.now()
+        for days_ago, manual, actor, action in [
+            (10, self.safety, self.user, AuditLog.Action.CREATE),
+            (5, self.safety, self.reviewer, AuditLog.Action.APPROVE),
+            (1, self.finance, self.user, AuditLog.Action.SUBMIT),
+        ]:
+            AuditLog.objects.create(
+                manual=manual, actor=actor, action=action, created_at=now - datetime.timedelta(days=days_ago)
+            )
+
+    def ids(self, path, key="id"):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, path)
+        return [item[key] for item in response.data]
+
+    def test_audit_filters(self):
+        self.assertEqual(self.ids(f"/api/audit/?manual={self.safety.pk}", "action"), ["APPROVE", "CREATE"])
+        self.assertEqual(self.ids(f"/api/audit/?actor={self.user.pk}", "action"), ["SUBMIT", "CREATE"])
+        self.assertEqual(self.ids("/api/audit/?action=create,submit", "action"), ["SUBMIT", "CREATE"])
+        since = (timezone.now() - datetime.timedelta(days=7)).date().isoformat()
+        until = (timezone.now() - datetime.timedelta(days=2)).date().isoformat()
+        self.assertEqual(self.ids(f"/api/audit/?since={since}&until={until}", "action"), ["APPROVE"])
+        self.assertEqual(self.client.get("/api/audit/?action=DELETE").status_code, 400)
+        self.assertEqual(self.client.get("/api/audit/?manual=abc").status_code, 400)
+
+    def test_review_filters(self):
+        self.assertEqual(self.ids("/api/reviews/?status=approved", "manual_title"), ["Finance"])
+        self.assertEqual(self.ids("/api/reviews/?reviewer=none", "manual_title"), ["Safety"])
+        self.assertEqual(self.ids(f"/api/reviews/?reviewer={self.reviewer.pk}", "manual_title"), ["Finance"])
+        self.assertEqual(self.ids("/api/reviews/?department=Ops", "manual_title"), ["Safety"])
+
+    def test_version_filters(self):
+        self.assertEqual(
+            sorted(self.ids(f"/api/versions/?manual={self.finance.pk}&fields=id")),
+            [self.versions[2].pk, self.versions[3].pk],
+        )
+        self.assertEqual(
+            sorted(self.ids("/api/versions/?published=true&fields=id")), [self.versions[1].pk, self.versions[3].pk]
+        )
+        self.assertEqual(self.ids("/api/versions/?until=2000-01-01&fields=id"), [])
+        self.assertEqual(self.client.get("/api/versions/?published=maybe").status_code, 400)
+
+    def test_filters_use_indexes(self):
+        querysets = [
+            filter_audit_log(AuditLog.objects.all(), {"manual": "1"}),
+            filter_audit_log(AuditLog.objects.all(), {"actor": "1"}),
+            filter_audit_log(AuditLog.objects.all(), {"action": "APPROVE"}),
+            filter_audit_log(AuditLog.objects.all(), {"since": "2020-01-01"}),
+            filter_reviews(ReviewRequest.objects.all(), {"status": "PENDING"}),
+            filter_reviews(ReviewRequest.objects.all(), {"reviewer": "1"}),
+            filter_reviews(ReviewRequest.objects.all(), {"department": "Ops"}),
+            filter_versions(ManualVersion.objects.all(), {"manual": "1"}),
+            filter_versions(ManualVersion.objects.all(), {"published": "1"}),
+        ]
+        for queryset in querysets:
+            plan = queryset.explain()
+            self.assertIn("USING", plan, plan)
+            self.assertNotRegex(plan, r"SCAN api_\w+\b(?! USING)", plan)
+
+
+class VersionDiffTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="author", password="pass")
+        self.client.force_authenticate(self.user)
+        self.manual = Manual.objects.create(title="Safety", slug="safety", created_by=self.user)
+        self.published = ManualVersion.objects.create(manual=self.manual, version_number=1, created_by=self.user, is_published=True)
+        blocks = [
+            ContentBlock(version=self.published, order=0, type="TEXT", data={"title": "Intro", "text": "Wear a hard hat on site."}),
+            ContentBlock(version=self.published, order=1, type="LIST", data={"items": ["Gloves", "Boots", "Goggles"]}),
+            ContentBlock(version=self.published, order=2, type="TABLE", data={"csvData": "Item,Qty\nHat,1\nVest,2"}),
+            ContentBlock(version=self.published, order=3, type="DIVIDER", data={}),
+            ContentBlock(version=self.published, order=4, type="QUOTE", data={"quote": "Safety first"}),
+        ]
+        BlockPayload.objects.attach(blocks)
+        ContentBlock.objects.bulk_create(blocks)
+        old = {block.type: block.pk for block in self.published.blocks.all()}
+        self.draft = ManualVersion.objects.create(manual=self.manual, version_number=2, created_by=self.user)
+        self.draft.copy_blocks_from(self.published, [
+            {"op": "update", "id": old["TEXT"], "data": {"title": "Intro", "text": "Wear a helmet on site."}},
+            {"op": "update", "id": old["LIST"], "data": {"items": ["Gloves", "Goggles", "Mask"]}},
+            {"op": "delete", "id": old["TABLE"]},
+            {"op": "move", "id": old["QUOTE"], "order": 0},
+            {"op": "insert", "type": "CODE", "data": {"code": "print()"}},
+        ])
+        self.review = ReviewRequest.objects.create(version=self.draft, submitted_by=self.user)
+
+    def test_diff_against_previous_published_version(self):
+        response = self.client.get(f"/api/versions/{self.draft.pk}/diff/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["from"], self.published.pk)
+        self.assertEqual(
+            response.data["summary"], {"unchanged": 1, "moved": 1, "modified": 2, "inserted": 1, "deleted": 1}
+        )
+        changes = {change["type"]: change for change in response.data["changes"]}
+        self.assertEqual(changes["QUOTE"]["op"], "move")
+        self.assertEqual((changes["QUOTE"]["from_position"], changes["QUOTE"]["to_position"]), (4, 0))
+        self.assertEqual(changes["TEXT"]["fields"], {
+            "text": {"diff": [["=", "Wear a "], ["-", "hard hat"], ["+", "helmet"], ["=", " on site."]]},
+        })
+        self.assertEqual(changes["LIST"]["fields"]["items"]["diff"], [
+            ["=", ["Gloves"]], ["-", ["Boots"]], ["=", ["Goggles"]], ["+", ["Mask"]],
+        ])
+        self.assertEqual(changes["TABLE"]["op"], "delete")
+        self.assertEqual(changes["TABLE"]["data"], {"csvData": "Item,Qty\nHat,1\nVest,2"})
+        self.assertEqual(changes["CODE"], {
+            "op": "insert", "type": "CODE", "to_block": self.draft.blocks.all()[4].pk, "to_position": 4,
+            "data": {"code": "print()"},
+        })
+        self.assertEqual([change["op"] for change in response.data["changes"]], ["delete", "move", "modify", "modify", "insert"])
+
+    def test_table_rows_are_diffed(self):
+        table = self.published.blocks.get(order=2)
+        third = ManualVersion.objects.create(manual=self.manual, version_number=3, created_by=self.user)
+        third.copy_blocks_from(self.published, [{"op": "update", "id": table.pk, "data": {"csvData": "Item,Qty\nHat,3\nVest,2"}}])
+        diff = compute_diff(self.published, third)
+        self.assertEqual(diff["changes"][0]["fields"]["csvData"]["diff"], [
+            ["=", "Item,Qty"], ["-", "Hat,1"], ["+", "Hat,3"], ["=", "Vest,2"],
+        ])
+
+    def test_diff_is_cached_until_a_block_changes(self):
+        path = f"/api/versions/{self.draft.pk}/diff/?from={self.published.pk}"
+        first = self.client.get(path)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(path)
+        self.assertEqual(second.data, first.data)
+        self.assertFalse([query for query in queries if "api_blockpayload" in query["sql"] and "digest" not in query["sql"]])
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+        block = self.draft.blocks.all()[1]
+        block.data = {"title": "Intro", "text": "Wear a helmet at work."}
+        block.save()
+        third = self.client.get(path)
+        self.assertNotEqual(third["ETag"], first["ETag"])
+        text = next(change for change in third.data["changes"] if change["type"] == "TEXT")
+        self.assertIn(["+", "helmet at work"], text["fields"]["text"]["diff"])
+
+    def test_review_diff_and_bad_base(self):
+        response = self.client.get(f"/api/reviews/{self.review.pk}/diff/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["from"], self.published.pk)
+        self.assertEqual(response.data["to"], self.draft.pk)
+
+        other = Manual.objects.create(title="Other", slug="other", created_by=self.user)
+        stranger = ManualVersion.objects.create(manual=other, version_number=1, created_by=self.user)
+        self.assertEqual(self.client.get(f"/api/versions/{self.draft.pk}/diff/?from={stranger.pk}").status_code, 400)
+
+        first = self.client.get(f"/api/versions/{self.published.pk}/diff/")
+        self.assertIsNone(first.data["from"])
+        self.assertEqual(first.data["summary"]["inserted"], 5)
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+class AssetTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        storages = {
+            "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            "assets": {
+                "BACKEND": "django.core.files.storage.FileSystemStorage",
+                "OPTIONS": {"location": f"{directory.name}/assets", "allow_overwrite": True},
+            },
+        }
+        override = override_settings(STORAGES=storages, ASSET_UPLOAD_DIR=f"{directory.name}/uploads")
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username="author", password="pass")
+        self.client.force_authenticate(self.user)
+        self.digest = hashlib.sha256(PNG).hexdigest()
+
+    def upload(self, content, chunk_size=300):
+        upload = self.client.post(
+            "/api/assets/uploads/", {"filename": "diagram.png", "content_type": "image/png", "size": len(content)}, format="json"
+        ).data
+        for offset in range(0, len(content), chunk_size):
+            response = self.client.put(
+                f"/api/assets/uploads/{upload['id']}/chunk/", content[offset:offset + chunk_size],
+                content_type="application/octet-stream", HTTP_UPLOAD_OFFSET=str(offset),
+            )
+            self.assertEqual(response.data["received"], min(offset + chunk_size, len(content)))
+        return self.client.post(f"/api/assets/uploads/{upload['id']}/complete/")
+
+    def test_chunked_upload_is_deduplicated_and_served_immutable(self):
+        response = self.upload(PNG)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["digest"], self.digest)
+        self.assertEqual(response.data["url"], f"/api/assets/{self.digest}/")
+        self.assertEqual(self.upload(PNG, chunk_size=500).data["digest"], self.digest)
+        self.assertEqual(Asset.objects.count(), 1)
+        self.assertFalse(AssetUpload.objects.exists())
+
+        self.client.force_authenticate(None)
+        served = self.client.get(response.data["url"])
+        self.assertEqual(served.status_code, 200)
+        self.assertEqual(b"".join(served.streaming_content), PNG)
+        self.assertEqual(served["Content-Type"], "image/png")
+        self.assertIn("immutable", served["Cache-Control"])
+        self.assertEqual(self.client.get(response.data["url"], HTTP_IF_NONE_MATCH=served["ETag"]).status_code, 304)
+
+    def test_chunks_must_arrive_in_order(self):
+        upload = self.client.post(
+            "/api/assets/uploads/", {"content_type": "image/png", "size": len(PNG)}, format="json"
+        ).data
+        path = f"/api/assets/uploads/{upload['id']}/chunk/"
+        self.client.put(path, PNG[:100], content_type="application/octet-stream", HTTP_UPLOAD_OFFSET="0")
+        response = self.client.put(path, PNG[200:300], content_type="application/octet-stream", HTTP_UPLOAD_OFFSET="200")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["received"], 100)
+        self.assertEqual(self.client.get(f"/api/assets/uploads/{upload['id']}/").data["received"], 100)
+        self.assertEqual(self.client.post(f"/api/assets/uploads/{upload['id']}/complete/").status_code, 400)
+        response = self.client.put(path, PNG, content_type="application/octet-stream", HTTP_UPLOAD_OFFSET="100")
+        self.assertEqual(response.status_code, 400)
+
+    def test_single_request_upload(self):
+        response = self.client.post("/api/assets/", {"file": SimpleUploadedFile("a.png", PNG, "image/png")})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["digest"], self.digest)
+
+    def test_inline_data_urls_become_assets(self):
+        manual = Manual.objects.create(title="Guide", slug="guide", created_by=self.user)
+        version = ManualVersion.objects.create(manual=manual, version_number=1, created_by=self.user)
+        data_url = "data:image/png;base64," + base64.b64encode(PNG).decode()
+        response = self.client.post(
+            f"/api/versions/{version.pk}/blocks/bulk/",
+            [{"type": "IMAGE", "data": {"src": data_url, "alt": "Diagram"}}], format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data[0]["data"], {"src": f"/api/assets/{self.digest}/", "alt": "Diagram", "asset": self.digest})
+        self.assertEqual(Asset.objects.get().size, len(PNG))
+        self.assertIn(f'<img src="/api/assets/{self.digest}/1024/" srcset="/api/assets/{self.digest}/320/ 320w', render_version(version))
+
+    def test_migration_extracts_existing_data_urls(self):
+        manual = Manual.objects.create(title="Guide", slug="guide", created_by=self.user)
+        version = ManualVersion.objects.create(manual=manual, version_number=1, created_by=self.user)
+        data = {"src": "data:image/png;base64," + base64.b64encode(PNG).decode()}
+        payload = BlockPayload.objects.create(digest=BlockPayload.compute_digest("IMAGE", data), type="IMAGE", data=data)
+        block = ContentBlock.objects.create(version=version, order=0, payload=payload)
+        migration = importlib.import_module("api.migrations.0014_extract_inline_assets")
+        migration.extract_inline_assets(apps, None)
+        block.refresh_from_db()
+        self.assertEqual(block.data, {"src": f"/api/assets/{self.digest}/", "asset": self.digest})
+        self.assertEqual(block.payload.digest, BlockPayload.compute_digest("IMAGE", block.data))
+        self.assertTrue(Asset.objects.filter(digest=self.digest).exists())
+
+    def test_only_image_and_video_types_are_stored(self):
+        script = b"<script>alert(document.cookie)</script>"
+        for name, content_type in [("x.html", "text/html"), ("x.svg", "image/svg+xml"), ("x", "")]:
+            response = self.client.post("/api/assets/", {"file": SimpleUploadedFile(name, script, content_type)})
+            self.assertEqual(response.status_code, 400, content_type)
+        response = self.client.post(
+            "/api/assets/uploads/", {"content_type": "text/html", "size": len(script)}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("content_type", response.data)
+
+        manual = Manual.objects.create(title="Guide", slug="guide", created_by=self.user)
+        version = ManualVersion.objects.create(manual=manual, version_number=1, created_by=self.user)
+        data_url = "data:text/html;base64," + base64.b64encode(script).decode()
+        self.client.post(
+            f"/api/versions/{version.pk}/blocks/bulk/", [{"type": "IMAGE", "data": {"src": data_url}}], format="json"
+        )
+        data = {"src": "data:image/svg+xml;base64," + base64.b64encode(script).decode()}
+        BlockPayload.objects.create(digest=BlockPayload.compute_digest("IMAGE", data), type="IMAGE", data=data)
+        importlib.import_module("api.migrations.0014_extract_inline_assets").extract_inline_assets(apps, None)
+        self.assertFalse(Asset.objects.exists())
+
+    def test_legacy_unsafe_assets_are_downloads(self):
+        script = b"<script>alert(document.cookie)</script>"
+        digest = hashlib.sha256(script).hexdigest()
+        get_storage().save(storage_name(digest), io.BytesIO(script))
+        Asset.objects.create(digest=digest, content_type="text/html", size=len(script))
+        self.client.force_authenticate(None)
+        served = self.client.get(f"/api/assets/{digest}/")
+        self.assertEqual(served.status_code, 200)
+        self.assertTrue(served["Content-Disposition"].startswith("attachment;"))
+        self.assertEqual(served["Content-Security-Policy"], "sandbox")
+
+        self.client.force_authenticate(self.user)
+        image = self.client.post("/api/assets/", {"file": SimpleUploadedFile("a.png", PNG, "image/png")}).data
+        served = self.client.get(image["url"])
+        self.assertNotIn("Content-Security-Policy", served)
+        self.assertFalse(served.get("Content-Disposition", "").startswith("attachment"))
+
+    def image(self, size=(2000, 1000), mode="RGB"):
+        buffer = io.BytesIO()
+        Image.new(mode, size, "red").save(buffer, "PNG")
+        return self.client.post(
+            "/api/assets/", {"file": SimpleUploadedFile("photo.png", buffer.getvalue(), "image/png")}
+        ).data
+
+    @override_settings(ASSET_DERIVATIVE_WORKERS=0)
+    def test_first_reference_renders_image_variants(self):
+        asset = self.image()
+        manual = Manual.objects.create(title="Guide", slug="guide", created_by=self.user)
+        version = ManualVersion.objects.create(manual=manual, version_number=1, created_by=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/api/versions/{version.pk}/blocks/bulk/",
+                [{"type": "IMAGE", "data": {"src": asset["url"], "asset": asset["digest"]}}, {"type": "DIVIDER"}],
+                format="json",
+            )
+        base = f"/api/assets/{asset['digest']}/"
+        self.assertEqual(
+            response.data[0]["variants"], {"thumbnail": f"{base}320/", "medium": f"{base}1024/", "full": f"{base}2048/"}
+        )
+        self.assertIsNone(response.data[1]["variants"])
+        variants = Asset.objects.get(digest=asset["digest"]).variants
+        self.assertEqual({key: value["width"] for key, value in variants.items()}, {"320": 320, "1024": 1024, "2048": 2000})
+        self.assertEqual(variants["320"]["height"], 160)
+
+        self.client.force_authenticate(None)
+        served = self.client.get(f"{base}320/")
+        self.assertEqual(served["Content-Type"], "image/webp")
+        self.assertIn("immutable", served["Cache-Control"])
+        with Image.open(io.BytesIO(b"".join(served.streaming_content))) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ("WEBP", (320, 160)))
+
+    def test_variants_render_on_demand(self):
+        asset = self.image(size=(600, 600), mode="RGBA")
+        served = self.client.get(f"/api/assets/{asset['digest']}/320/")
+        self.assertEqual(served.status_code, 200)
+        self.assertEqual(list(Asset.objects.get(digest=asset["digest"]).variants), ["320"])
+        self.assertEqual(self.client.get(f"/api/assets/{asset['digest']}/500/").status_code, 404)
+
+        video = self.client.post("/api/assets/", {"file": SimpleUploadedFile("clip.mp4", b"\x00" * 64, "video/mp4")}).data
+        served = self.client.get(f"/api/assets/{video['digest']}/320/")
+        self.assertEqual((served["Content-Type"], b"".join(served.streaming_content)), ("video/mp4", b"\x00" * 64))
+
+    @override_settings(ASSET_DERIVATIVE_WORKERS=1)
+    def test_variants_render_in_worker_process(self):
+        asset = Asset.objects.get(digest=self.image(size=(400, 200))["digest"])
+        generate(asset, [320], pool=True)
+        self.assertEqual(asset.variants["320"]["width"], 320)
+
+
+class BlockReorderTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", password="pass")
+        self.client.force_authenticate(self.user)
+        self.manual = Manual.objects.create(title="Guide", slug="guide", created_by=self.user)
+        self.version = ManualVersion.objects.create(manual=self.manual, version_number=1, created_by=self.user)
+        self.client.post(
+            f"/api/versions/{self.version.pk}/blocks/bulk/",
+            [{"type": "TEXT", "data": {"text": text}} for text in "ABCDE"], format="json",
+        )
+        self.ids = {block.data["text"]: block.pk for block in self.version.blocks.all()}
+
+    def texts(self):
+        return "".join(block.data["text"] for block in self.version.blocks.all())
+
+    def reorder(self, *moves):
+        return self.client.post(
+            f"/api/versions/{self.version.pk}/reorder/",
+            {"moves": [{"id": self.ids[block], "after": self.ids.get(after)} for block, after in moves]},
+            format="json",
+        )
+
+    def test_move_writes_only_the_moved_block(self):
+        self.assertEqual(list(self.version.blocks.values_list("order", flat=True)), [1024, 2048, 3072, 4096, 5120])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reorder(("E", "A"), ("A", None))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.texts(), "AEBCD")
+        self.assertEqual(response.data, {"rebalanced": False, "blocks": [{"id": self.ids["E"], "order": 1536}]})
+        self.assertEqual(len([query for query in queries if query["sql"].startswith("UPDATE")]), 1)
+
+    def test_exhausted_gap_rebalances(self):
+        rebalanced = []
+        for _ in range(6):
+            # Each move halves the gap right after A
+            rebalanced.append(self.reorder(("D", "A")).data["rebalanced"])
+            rebalanced.append(self.reorder(("C", "A")).data["rebalanced"])
+        self.assertIn(True, rebalanced)
+        self.assertEqual(self.texts(), "ACDBE")
+        orders = list(self.version.blocks.values_list("order", flat=True))
+        self.assertEqual(orders, sorted(set(orders)))
+
+    def test_unknown_block_is_rejected(self):
+        response = self.client.post(
+            f"/api/versions/{self.version.pk}/reorder/", {"moves": [{"id": 999999, "after": None}]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.texts(), "ABCDE")
+
+    def test_editor_collaborators_can_reorder(self):
+        for role, expected in [(ManualCollaborator.CollaboratorRole.EDITOR, 200), (ManualCollaborator.CollaboratorRole.VIEWER, 403)]:
+            collaborator = User.objects.create_user(username=role.lower(), password="pass")
+            ManualCollaborator.objects.create(manual=self.manual, user=collaborator, role=role, added_by=self.user)
+            self.client.force_authenticate(collaborator)
+            self.assertEqual(self.reorder(("E", None)).status_code, expected, role)
+        self.assertEqual(self.texts(), "EABCD")
+
+
+@override_settings(REQUEST_INSTRUMENTATION=True, REQUEST_SLOW_MS=60_000)
+class InstrumentationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="timed", password="pass")
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        cache.clear()
+        for index in range(3):
+            Manual.objects.create(title=f"Manual {index}", slug=f"manual-{index}", created_by=self.user)
+
+    def timings(self, response):
+        entries = {}
+        for entry in response["Server-Timing"].split(", "):
+            name, *params = entry.split(";")
+            entries[name] = dict(param.split("=", 1) for param in params)
+        return entries
+
+    def test_server_timing_header(self):
+        response = self.client.get("/api/manuals/")
+        self.assertEqual(response.status_code, 200)
+        timings = self.timings(response)
+        self.assertEqual(list(timings), ["db", "serialize", "view", "total"])
+        self.assertRegex(timings["db"]["desc"], r'^"[1-9]\d* queries"$')
+        self.assertGreater(float(timings["serialize"]["dur"]), 0)
+        self.assertGreaterEqual(float(timings["total"]["dur"]), float(timings["view"]["dur"]))
+
+    def test_async_server_timing_header(self):
+        with override_settings(ROOT_URLCONF="manual_backend.asgi_urls"):
+            response = async_to_sync(self.async_client.get)("/api/manuals/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("total", self.timings(response))
+
+    def test_logs_slow_requests(self):
+        with override_settings(REQUEST_SLOW_MS=0), self.assertLogs("api.instrumentation", "WARNING") as logs:
+            self.client.get("/api/manuals/")
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], "/api/manuals/")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["queries"], 0)
+        self.assertIsInstance(record["duplicates"], list)
+
+    def test_fast_requests_not_logged(self):
+        with self.assertNoLogs("api.instrumentation"):
+            self.client.get("/api/manuals/")
+
+    def test_duplicates_group_repeated_statements(self):
+        metrics = RequestMetrics()
+        for count in (1, 2, 3):
+            metrics.record_query("SELECT * FROM t WHERE id IN (%s" + ", %s" * count + ")", 0.001)
+        metrics.record_query("SELECT 1", 0.001)
+        self.assertEqual(metrics.queries, 4)
+        self.assertEqual(metrics.duplicates(), [{"sql": "SELECT * FROM t WHERE id IN (%s, ...)", "count": 3, "ms": 3.0}])
+
+    def test_every_serializer_is_timed(self):
+        serializers = [
+            value for value in vars(api_serializers).values()
+            if isinstance(value, type) and issubclass(value, BaseSerializer) and value.__module__ == api_serializers.__name__
+        ]
+        self.assertEqual([cls.__name__ for cls in serializers if not issubclass(cls, TimedSerializerMixin)], [])
+        token = begin()
+        try:
+            api_serializers.AssetSerializer(Asset(digest="0" * 64, content_type="image/png", size=1)).data
+            self.assertGreater(current().serialize_time, 0)
+        finally:
+            discard(token)
+
+    @override_settings(REQUEST_INSTRUMENTATION=False)
+    def test_disabled(self):
+        self.assertNotIn("Server-Timing", self.client.get("/api/manuals/"))
+
+
+class BenchmarkSuiteTests(APITestCase):
+    def seed(self, **options):
+        options = {
+            "users": 6, "categories": 2, "tags": 3, "manuals": 8, "versions": 2, "blocks": 5, "audit": 2, **options
+        }
+        arguments = [f"--{name}={value}" for name, value in options.items() if value is not True]
+        arguments += [f"--{name}" for name, value in options.items() if value is True]
+        out = io.StringIO()
+        call_command("seed_benchmark_data", "--prefix", "t", *arguments, stdout=out)
+        return out.getvalue()
+
+    def snapshot(self):
+        manuals = Manual.objects.filter(slug__startswith="t-").order_by("slug")
+        blocks = ContentBlock.objects.filter(version__manual__slug__startswith="t-").order_by(
+            "version__manual__slug", "version__version_number", "order"
+        )
+        return (
+            list(manuals.values_list("slug", "title", "status", "created_by__username")),
+            list(blocks.values_list("payload__digest", flat=True)),
+        )
+
+    def test_seed_is_reproducible(self):
+        self.assertIn("8 manuals, 16 versions, 80 blocks", self.seed())
+        first = self.snapshot()
+        self.assertEqual(User.objects.filter(username__startswith="t-").count(), 6)
+        self.assertTrue(ManualCollaborator.objects.filter(manual__slug__startswith="t-").exists())
+        self.assertEqual(AuditLog.objects.filter(manual__slug__startswith="t-").count(), 16)
+        self.assertTrue(self.client.login(username="t-0", password="bench"))
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+        self.seed(seed=1)
+        self.assertNotEqual(self.snapshot(), first)
+        self.seed(clear=True)
+        self.assertFalse(Manual.objects.filter(slug__startswith="t-").exists())
+        self.assertFalse(User.objects.filter(username__startswith="t-").exists())
+
+    def test_run_and_compare(self):
+        self.seed()
+        pending = ReviewRequest.objects.filter(status=ReviewRequest.ReviewStatus.PENDING).count()
+        with tempfile.TemporaryDirectory() as directory:
+            output = f"{directory}/results.json"
+            call_command(
+                "run_benchmarks", "--prefix", "t", "--requests", "3", "--warmup", "1", "--output", output,
+                stdout=io.StringIO(),
+            )
+            with open(output) as results_file:
+                results = json.load(results_file)
+            self.assertEqual(list(results["scenarios"]), ["manual_list", "version_detail", "block_save", "review_approve"])
+            for name, summary in results["scenarios"].items():
+                self.assertEqual(summary["errors"], 0, name)
+                self.assertGreater(summary["queries"], 0, name)
+                self.assertLessEqual(summary["p50_ms"], summary["p95_ms"], name)
+            self.assertEqual(results["scenarios"]["review_approve"]["requests"], min(3, pending))
+            self.assertEqual(
+                ReviewRequest.objects.filter(status=ReviewRequest.ReviewStatus.PENDING).count(), pending - min(3, pending)
+            )
+
+            for summary in results["scenarios"].values():
+                summary.update(p50_ms=0.01, p95_ms=0.01, queries=1)
+            with open(output, "w") as results_file:
+                json.dump(results, results_file)
+            with self.assertRaisesMessage(CommandError, "regressions"):
+                call_command(
+                    "run_benchmarks", "--prefix", "t", "--scenarios", "manual_list", "--requests", "2",
+                    "--baseline", output, stdout=io.StringIO(),
+                )
+
+    def test_compare(self):
+        def results(errors, p50, p95, queries, rss):
+            return {"scenarios": {"list": {
+                "errors": errors, "p50_ms": p50, "p95_ms": p95, "queries": queries, "peak_rss_kb": rss,
+            }}}
+
+        baseline = results(0, 10.0, 20.0, 4, 1000)
+        self.assertEqual(compare(results(0, 11.0, 20.5, 4, 1100), baseline), [])
+        worse = results(1, 13.0, 20.5, 5, 1300)
+        self.assertEqual(
+            compare(worse, baseline),
+            [
+                "list: 1 errors (was 0)", "list: p50_ms 13.0 (was 10.0)",
+                "list: 5 queries per request (was 4)", "list: peak RSS 1300 KiB (was 1000)",
+            ],
+        )
+
+    def test_requires_dataset(self):
+        with self.assertRaisesMessage(CommandError, "seed it first"):
+            call_command("run_benchmarks", "--prefix", "missing", stdout=io.StringIO())
+
+
+class SearchIndexTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", password="pass")
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        self.manual = self.create_manual("Pump guide", "pump-guide", self.user)
+        self.version = self.manual.current_version
+
+    def search(self, query):
+        return [manual["slug"] for manual in self.client.get("/api/manuals/search/", {"q": query}).data]
+
+    def save_blocks(self, count, word="gasket"):
+        blocks = [{"type": "TEXT", "data": {"text": f"{word} step {index}"}} for index in range(count)]
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/versions/{self.version.pk}/blocks/bulk/", blocks, format="json")
+        self.assertEqual(response.status_code, 201)
+        return queries
+
+    def test_bulk_save_queries_do_not_grow_with_blocks(self):
+        self.save_blocks(20)
+        few = len(self.save_blocks(20, "flange"))
+        self.save_blocks(200)
+        queries = self.save_blocks(200, "flange")
+        # Only the block INSERT grows: SQLite's parameter limit splits 200 rows in two batches
+        inserts = [query for query in queries if query["sql"].startswith('INSERT INTO "api_contentblock"')]
+        self.assertEqual(len(queries) - len(inserts), few - 1)
+        manual_selects = [query for query in queries if query["sql"].startswith('SELECT "api_manual"."id"')]
+        self.assertLessEqual(len(manual_selects), 2)
+        self.assertEqual(self.search("flange"), ["pump-guide"])
+        self.assertEqual(self.search("gasket"), [])
+
+    def test_single_block_writes_reindex(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/blocks/", {"version": self.version.pk, "order": 0, "type": "TEXT", "data": {"text": "impeller"}},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.search("impeller"), ["pump-guide"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/api/blocks/{response.data['id']}/", {"data": {"text": "volute"}}, format="json")
+        self.assertEqual((self.search("impeller"), self.search("volute")), ([], ["pump-guide"]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/blocks/{response.data['id']}/")
+        self.assertEqual(self.search("volute"), [])
+
+    def create_manual(self, title, slug, owner, text="", **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            manual = Manual.objects.create(title=title, slug=slug, created_by=owner, **fields)
+            version = ManualVersion.objects.create(manual=manual, version_number=1, created_by=owner)
+            if text:
+                data = {"text": text, "url": "https://pump.example"}
+                ContentBlock.objects.create(version=version, order=0, type="TEXT", data=data)
+            manual.current_version = version
+            manual.save(update_fields=["current_version"])
+        return manual
+
+    def test_results_are_ranked_and_prefix_matched(self):
+        self.create_manual("Boiler checks", "boiler", self.user, text="Inspect the pump seals weekly.")
+        self.create_manual("Pumping station", "station", self.user)
+        self.assertEqual(self.search("pump"), ["pump-guide", "station", "boiler"])
+        self.assertEqual(self.search("seal week"), ["boiler"])
+        self.assertEqual(self.search("example"), [])  # URLs aren't indexed
+        self.assertEqual(self.search('pump" OR "x'), [])
+        self.assertEqual(self.client.get("/api/manuals/search/", {"q": "pump", "limit": 1}).data[0]["slug"], "pump-guide")
+
+    def test_results_are_filtered_by_visibility(self):
+        other = User.objects.create_user(username="other", password="pass")
+        self.create_manual("Pump draft", "draft", other)
+        self.create_manual("Pump approved", "approved", other, status=Manual.ManualStatus.APPROVED)
+        shared = self.create_manual("Pump shared", "shared", other)
+        ManualCollaborator.objects.create(
+            manual=shared, user=self.user, role=ManualCollaborator.CollaboratorRole.VIEWER, added_by=other
+        )
+        self.assertEqual(sorted(self.search("pump")), ["approved", "pump-guide", "shared"])
+
+    def test_hidden_matches_do_not_crowd_out_visible_ones(self):
+        other = User.objects.create_user(username="other", password="pass")
+        for index in range(5):
+            self.create_manual(f"Pump pump draft {index}", f"draft-{index}", other)
+        self.create_manual("Boiler", "boiler", self.user, text="Check the pump")
+        with mock.patch("api.search.CANDIDATE_BATCH", 2), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.search("pump"), ["pump-guide", "boiler"])
+        # Four rounds of two candidates: the last one comes back short
+        self.assertEqual(len([query for query in queries if "MATCH" in query["sql"]]), 4)
+
+    def test_manual_changes_update_the_index(self):
+        category = Category.objects.create(name="Hydraulics", slug="hydraulics")
+        tag = Tag.objects.create(name="rotating", slug="rotating")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.manual.title = "Compressor guide"
+            self.manual.category = category
+            self.manual.save()
+            self.manual.tags.add(tag)
+        self.assertEqual(self.search("pump"), [])
+        self.assertEqual(self.search("compressor hydraulics rotating"), ["pump-guide"])
+        with self.captureOnCommitCallbacks(execute=True):
+            category.name = "Pneumatics"
+            category.save()
+            tag.name = "static"
+            tag.save()
+        self.assertEqual(self.search("pneumatics static"), ["pump-guide"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.manual.delete()
+        self.assertEqual(self.search("compressor"), [])
+
+    def test_migration_indexes_existing_manuals(self):
+        self.create_manual("Boiler checks", "boiler", self.user, text="Inspect the seals weekly.")
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM api_manual_search")
+        schema_editor = mock.Mock(connection=connection)
+        schema_editor.execute.side_effect = lambda sql, params=(): connection.cursor().execute(sql, params)
+        importlib.import_module("api.migrations.0008_manual_search_index").create_search_index(apps, schema_editor)
+        self.assertEqual(self.search("seals"), ["boiler"])
+        self.assertEqual(self.search("pump"), ["pump-guide"])
+
+
+class BlockBulkSaveTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", password="pass")
+        self.client.force_authenticate(self.user)
+        self.manual = Manual.objects.create(title="Guide", slug="guide", created_by=self.user)
+        self.version = ManualVersion.objects.create(manual=self.manual, version_number=1, created_by=self.user)
+        for order, text in enumerate(["Old A", "Old B"]):
+            ContentBlock.objects.create(version=self.version, order=order, type="TEXT", data={"text": text})
+
+    def save(self, blocks):
+        return self.client.post(f"/api/versions/{self.version.pk}/blocks/bulk/", blocks, format="json")
+
+    def stored(self):
+        return list(self.version.blocks.order_by("order").values_list("order", "payload__data"))
+
+    def test_replaces_blocks_in_list_order(self):
+        response = self.save({"blocks": [
+            {"type": "TEXT", "data": {"text": "First"}},
+            {"type": "DIVIDER"},
+            {"type": "TEXT", "data": {"text": "Last"}, "order": 5000},
+        ]})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([(block["order"], block["type"]) for block in response.data], [
+            (gapped(0), "TEXT"), (gapped(1), "DIVIDER"), (5000, "TEXT"),
+        ])
+        self.assertEqual(self.stored(), [(gapped(0), {"text": "First"}), (gapped(1), {}), (5000, {"text": "Last"})])
+
+    def test_invalid_item_rejects_the_whole_save(self):
+        before = self.stored()
+        for blocks in [
+            [{"type": "TEXT", "data": {"text": "Fine"}}, {"type": "TEXT", "data": "not an object"}],
+            [{"type": "TEXT", "data": {"text": "Fine"}}, {"type": "NOPE"}],
+            [{"type": "TEXT", "order": -1}],
+        ]:
+            response = self.save(blocks)
+            self.assertEqual(response.status_code, 400, blocks)
+            self.assertTrue(response.data[len(blocks) - 1], blocks)
+            self.assertEqual(self.stored(), before)
+
+    def test_editor_collaborators_can_save(self):
+        for role, expected in [(ManualCollaborator.CollaboratorRole.EDITOR, 201), (ManualCollaborator.CollaboratorRole.VIEWER, 403)]:
+            collaborator = User.objects.create_user(username=role.lower(), password="pass")
+            ManualCollaborator.objects.create(manual=self.manual, user=collaborator, role=role, added_by=self.user)
+            self.client.force_authenticate(collaborator)
+            self.assertEqual(self.save([{"type": "TEXT", "data": {"text": role}}]).status_code, expected, role)
+
+
+class VersionPatchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", password="pass")
+        self.client.force_authenticate(self.user)
+        self.manual = Manual.objects.create(title="Guide", slug="guide", created_by=self.user)
+        self.base = ManualVersion.objects.create(manual=self.manual, version_number=1, created_by=self.user)
+        self.client.post(
+            f"/api/versions/{self.base.pk}/blocks/bulk/",
+            [{"type": "TEXT", "data": {"text": text}} for text in "ABCD"], format="json",
+        )
+        self.manual.current_version = self.base
+        self.manual.save(update_fields=["current_version"])
+        self.ids = dict(zip("ABCD", self.base.blocks.order_by("order").values_list("id", flat=True)))
+
+    def patch(self, operations):
+        return self.client.post("/api/versions/", {"manual": self.manual.pk, "operations": operations}, format="json")
+
+    def texts(self, version_id):
+        blocks = ContentBlock.objects.filter(version_id=version_id).order_by("order")
+        return "".join(block.data["text"] for block in blocks)
+
+    def test_operations(self):
+        response = self.patch([
+            {"op": "insert", "type": "TEXT", "data": {"text": "X"}, "order": 1},
+            {"op": "update", "id": self.ids["C"], "data": {"text": "c"}},
+            {"op": "delete", "id": self.ids["B"]},
+            {"op": "move", "id": self.ids["D"], "order": 0},
+            {"op": "insert", "type": "TEXT", "data": {"text": "Z"}},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["version_number"], 2)
+        self.assertEqual(self.texts(response.data["id"]), "DAXcZ")
+        self.assertEqual(self.texts(self.base.pk), "ABCD")
+        self.manual.refresh_from_db()
+        self.assertEqual(self.manual.current_version_id, response.data["id"])
+        # Unchanged blocks share their payload with the base version
+        copied = ContentBlock.objects.filter(version_id=response.data["id"])
+        shared = {block.payload_id for block in copied} & set(self.base.blocks.values_list("payload_id", flat=True))
+        self.assertEqual(len(shared), 2)
+
+    def test_invalid_operations_are_rejected(self):
+        stranger = ManualVersion.objects.create(manual=self.manual, version_number=9, created_by=self.user)
+        block = ContentBlock.objects.create(version=stranger, order=0, type="TEXT", data={"text": "S"})
+        for operations in [
+            [{"op": "delete", "id": self.ids["A"]}, {"op": "update", "id": self.ids["A"], "data": {"text": "a"}}],
+            [{"op": "delete", "id": self.ids["A"]}, {"op": "move", "id": self.ids["A"], "order": 0}],
+            [{"op": "delete", "id": self.ids["A"]}, {"op": "delete", "id": self.ids["A"]}],
+            [{"op": "update", "id": block.pk, "data": {"text": "s"}}],
+            [{"op": "move", "id": self.ids["A"]}],
+            [{"op": "insert", "data": {"text": "X"}}],
+            [{"op": "insert", "type": "TEXT", "data": "notadict"}],
+            [{"op": "update", "id": self.ids["A"], "data": ["a"]}],
+        ]:
+            response = self.patch(operations)
+            self.assertEqual(response.status_code, 400, operations)
+            self.assertIn("operations", response.data)
+        self.assertEqual(self.manual.versions.count(), 2)
+
+
+class PublishedHtmlTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", password="pass")
+        self.reviewer = User.objects.create_user(username="reviewer", password="pass", role=User.Role.SUPERVISOR)
+        self.client.force_authenticate(self.user)
+        self.manual = Manual.objects.create(title="Guide", slug="guide", created_by=self.user)
+        self.version = ManualVersion.objects.create(manual=self.manual, version_number=1, created_by=self.user)
+        self.manual.current_version = self.version
+        self.manual.save(update_fields=["current_version"])
+
+    def test_renders_blocks(self):
+        digest = "a" * 64
+        blocks = [
+            ("TEXT", {"title": "Intro", "text": "<b>Hi</b>"}),
+            ("LIST", {"items": ["One", None, "Two"], "listType": "numbered"}),
+            ("TABLE", {"csvData": "Part,Qty\nSeal,2"}),
+            ("IMAGE", {"src": "https://cdn.example/a.png", "alt": "A"}),
+            ("IMAGE", {"src": f"/api/assets/{digest}/", "asset": digest}),
+            ("VIDEO", {"url": "https://youtu.be/abc123"}),
+            ("DIVIDER", {}),
+            ("UNKNOWN", {"text": "ignored"}),
+        ]
+        html = "".join(render_block(block_type, data) for block_type, data in blocks)
+        self.assertIn('<div class="content-block" data-type="TEXT"><h3>Intro</h3><p>&lt;b&gt;Hi&lt;/b&gt;</p></div>', html)
+        self.assertIn("<ol><li>One</li><li>Two</li></ol>", html)
+        self.assertIn("<tr><th>Part</th><th>Qty</th></tr><tr><td>Seal</td><td>2</td></tr>", html)
+        self.assertIn('<img src="https://cdn.example/a.png" alt="A"', html)
+        self.assertIn(f'srcset="/api/assets/{digest}/320/ 320w', html)
+        self.assertIn('<iframe src="https://www.youtube.com/embed/abc123"', html)
+        self.assertIn("<hr>", html)
+        self.assertNotIn("ignored", html)
+
+    def test_only_http_and_asset_urls_are_rendered(self):
+        for url in [
+            "javascript:alert(document.cookie)", " JavaScript:alert(1)", "java\tscript:alert(1)",
+            "data:text/html,<script>alert(1)</script>", "vbscript:msgbox(1)", "//evil.example/x", "/admin/",
+        ]:
+            blocks = [("VIDEO", {"url": url}), ("VIDEO", {"url": url, "asset": "x"}), ("IMAGE", {"src": url})]
+            for block_type, data in blocks:
+                html = render_block(block_type, data)
+                self.assertNotIn("src=", html, (block_type, url))
+        html = render_block("IMAGE", {"src": "https://cdn.example/a.png", "asset": '" onerror="alert(1)'})
+        self.assertIn('<img src="https://cdn.example/a.png"', html)
+        self.assertNotIn("onerror", html)
+        self.assertEqual(safe_url(" https://example.com/v.mp4"), "https://example.com/v.mp4")
+
+    def test_approval_renders_snapshot_served_by_html_endpoint(self):
+        ContentBlock.objects.create(version=self.version, order=0, type="TEXT", data={"text": "Published text"})
+        ContentBlock.objects.create(version=self.version, order=1, type="VIDEO", data={"url": "javascript:alert(1)"})
+        path = f"/api/versions/{self.version.pk}/html/"
+        self.assertEqual(self.client.get(path).status_code, 404)
+
+        review = ReviewRequest.objects.create(version=self.version, submitted_by=self.user)
+        self.assertEqual(self.client.post(f"/api/reviews/{review.pk}/approve/").status_code, 403)
+        self.client.force_authenticate(self.reviewer)
+        self.assertEqual(self.client.post(f"/api/reviews/{review.pk}/approve/").status_code, 200)
+        self.version.refresh_from_db()
+        self.assertTrue(self.version.is_published)
+        self.assertIn("<p>Published text</p>", self.version.published_html)
+        self.assertNotIn("javascript", self.version.published_html)
+
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/html; charset=utf-8")
+        self.assertEqual(response.content.decode(), self.version.published_html)
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get(path, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304)
+
+        ManualVersion.objects.filter(pk=self.version.pk).update(published_html="")
+        version_etag_before = self.client.get(f"/api/versions/{self.version.pk}/")["ETag"]
+        changed = self.client.get(path, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], response["ETag"])
+        self.assertIn("<p>Published text</p>", changed.content.decode())
+        # The re-render is stamped like an approval: later GETs agree, and the
+        # version payload, which includes the snapshot, gets a new ETag too
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=changed["ETag"]).status_code, 304)
+        self.assertNotEqual(self.client.get(f"/api/versions/{self.version.pk}/")["ETag"], version_etag_before)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", password="pass")
+        self.other = User.objects.create_user(username="other", password="pass")
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        self.manual = Manual.objects.create(title="Guide", slug="guide", created_by=self.user)
+        self.version = ManualVersion.objects.create(manual=self.manual, version_number=1, created_by=self.user)
+        self.manual.current_version = self.version
+        self.manual.save(update_fields=["current_version"])
+        self.client.post(
+            f"/api/versions/{self.version.pk}/blocks/bulk/",
+            [{"type": "TEXT", "data": {"text": text}} for text in "ABC"], format="json",
+        )
+        self.blocks = list(self.version.blocks.order_by("order").values_list("id", flat=True))
+
+    def assert_changes(self, path, change):
+        """``path`` answers 304 to its own ETag, then 200 with a new one after ``change``"""
+        etag = self.client.get(path)["ETag"]
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304, path)
+        change()
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200, path)
+        self.assertNotEqual(response["ETag"], etag, path)
+
+    def test_version_etag_follows_blocks(self):
+        review = ReviewRequest.objects.create(version=self.version, submitted_by=self.user)
+        for path in [f"/api/versions/{self.version.pk}/", f"/api/reviews/{review.pk}/content/"]:
+            with self.subTest(path=path):
+                self.assert_changes(path, lambda: self.client.patch(
+                    f"/api/blocks/{self.blocks[0]}/", {"data": {"text": f"edited {path}"}}, format="json"
+                ))
+        path = f"/api/versions/{self.version.pk}/preview/"
+        self.assert_changes(path, lambda: self.client.delete(f"/api/blocks/{self.blocks[1]}/"))
+        self.assert_changes(path, lambda: self.client.post(
+            f"/api/versions/{self.version.pk}/reorder/", {"moves": [{"id": self.blocks[2], "after": None}]}, format="json"
+        ))
+        self.assert_changes(path, lambda: self.client.post(
+            f"/api/versions/{self.version.pk}/blocks/bulk/", [{"type": "TEXT", "data": {"text": "A"}}], format="json"
+        ))
+
+    def test_version_etag_follows_publication(self):
+        path = f"/api/versions/{self.version.pk}/"
+        approver = User.objects.create_user(username="supervisor", password="pass", role=User.Role.SUPERVISOR)
+        review = ReviewRequest.objects.create(version=self.version, submitted_by=self.user)
+
+        def approve():
+            self.client.force_authenticate(approver)
+            self.client.post(f"/api/reviews/{review.pk}/approve/")
+            self.client.force_authenticate(self.user)
+
+        self.assert_changes(path, approve)
+
+    def test_manual_etag_follows_status_collaborators_and_tags(self):
+        path = "/api/manuals/guide/"
+        self.assert_changes(path, lambda: self.client.post("/api/manuals/guide/submit/"))
+        self.assertEqual(self.client.get(path).data["status"], "SUBMITTED")
+        self.assert_changes(path, lambda: ManualCollaborator.objects.create(
+            manual=self.manual, user=self.other, added_by=self.user
+        ))
+        self.assert_changes(path, lambda: ManualCollaborator.objects.filter(manual=self.manual).update(
+            role=ManualCollaborator.CollaboratorRole.VIEWER, updated_at=timezone.now()
+        ))
+
+        category = Category.objects.create(name="Safety", slug="safety")
+        tag = Tag.objects.create(name="Ops", slug="ops")
+        self.assert_changes(path, lambda: self.manual.tags.add(tag))
+        self.assert_changes(path, lambda: self.manual.tags.set([Tag.objects.create(name="Dev", slug="dev")]))
+        self.assert_changes(path, lambda: Tag.objects.filter(slug="dev").update(name="Development"))
+        self.assert_changes(path, lambda: Manual.objects.filter(pk=self.manual.pk).update(category=category))
+        self.assert_changes(path, lambda: Category.objects.filter(pk=category.pk).update(name="Safety first"))
+
+        # can_edit differs per user, so users never share a tag
+        etag = self.client.get(path)["ETag"]
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
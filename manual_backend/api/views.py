@@ -1,6 +1,12 @@
+import io
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db import models
-from rest_framework import viewsets, permissions, status
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.db import models, transaction
+from rest_framework import mixins, viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
@@ -11,8 +17,11 @@ from .models import (
     ManualVersion,
     ManualCollaborator,
     ContentBlock,
+    BlockPayload,
     ReviewRequest,
     AuditLog,
+    Asset,
+    AssetUpload,
 )
 from .serializers import (
     CategorySerializer,
@@ -21,9 +30,50 @@ from .serializers import (
     ManualVersionSerializer,
     ManualCollaboratorSerializer,
     ContentBlockSerializer,
+    ContentBlockBulkSerializer,
+    BlockMoveSerializer,
     ReviewRequestSerializer,
     AuditLogSerializer,
+    AssetSerializer,
+    AssetUploadSerializer,
+    requested_fields,
+)
+from . import audit
+from .assets import (
+    AssetError, UploadOffsetError, append_chunk, complete_upload, discard_upload, get_storage, is_allowed_type, save,
+    storage_name,
 )
+from .archive import COMPRESSIONS, CONTENT_TYPES, EXTENSIONS, ArchiveError, export_archive, import_archive, open_archive
+from .permissions import ManualPermissionResolver
+from .conditional import manual_etag, not_modified, version_etag, with_etag
+from .derivatives import generate, variant_sizes
+from .diff import diff_etag, get_diff, previous_published
+from .filters import filter_audit_log, filter_reviews, filter_versions, int_param
+from .ordering import apply_moves, gapped
+from .rendering import render_version
+from .search import schedule_reindex_for_versions, search_manuals
+from .visibility import visible_filter
+from .streaming import aiterate, served_by_asgi, stream_list, stream_version, wants_stream
+
+
+def version_response(request, version, context=None):
+    """ManualVersionSerializer output, streaming the blocks of JSON responses"""
+    if wants_stream(request):
+        response = stream_version(request, version, context)
+        if response is not None:
+            return response
+    return Response(ManualVersionSerializer(version, context=context).data)
+
+
+def diff_response(request, from_version, to_version):
+    """The cached diff between two versions, conditional on both versions' ETags"""
+    from_etag = version_etag(from_version.pk) if from_version is not None else ""
+    to_etag = version_etag(to_version.pk)
+    etag = diff_etag(from_etag, to_etag)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    return with_etag(Response(get_diff(from_version, to_version, from_etag, to_etag)), etag)
 
 
 class IsAuthorOrCollaboratorOrReadOnly(permissions.BasePermission):
@@ -32,8 +82,8 @@ class IsAuthorOrCollaboratorOrReadOnly(permissions.BasePermission):
             return True
         
         # For Manual objects, check if user can edit
-        if hasattr(obj, 'can_edit'):
-            return obj.can_edit(request.user) or request.user.is_staff
+        if isinstance(obj, Manual):
+            return ManualPermissionResolver.for_request(request).check_edit(obj) or request.user.is_staff
         
         # For other objects, check if user is the creator
         if hasattr(obj, "created_by"):
@@ -41,16 +91,25 @@ class IsAuthorOrCollaboratorOrReadOnly(permissions.BasePermission):
         return request.user.is_staff
 
 
+class CanEditVersionManual(permissions.BasePermission):
+    """Block-editing actions on a version: anyone who can edit its manual, editor collaborators included"""
+
+    def has_object_permission(self, request, view, obj):
+        return ManualPermissionResolver.for_request(request).check_edit(obj.manual) or request.user.is_staff
+
+
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ("name", "id")
 
 
 class TagViewSet(viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ("name", "id")
 
 
 class ManualViewSet(viewsets.ModelViewSet):
@@ -58,6 +117,7 @@ class ManualViewSet(viewsets.ModelViewSet):
     serializer_class = ManualSerializer
     permission_classes = [permissions.IsAuthenticated, IsAuthorOrCollaboratorOrReadOnly]
     lookup_field = 'slug'  # Use slug instead of ID for URL lookups
+    cursor_ordering = ("-updated_at", "id")
     
     def get_queryset(self):
         """
@@ -69,21 +129,78 @@ class ManualViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if not user.is_authenticated:
             return Manual.objects.none()
-        
+        grants = ManualPermissionResolver.for_request(self.request).grants
+        return self.visible_queryset(requested_fields(self.request), user, grants)
+
+    @staticmethod
+    def visible_queryset(fields, user, grants):
+        """The manuals visible under ``grants``, loading what ``fields`` will render"""
         # Base queryset with optimizations
-        queryset = Manual.objects.select_related("category", "current_version", "created_by").prefetch_related("tags", "collaborators__user")
+        queryset = Manual.objects.select_related("category", "current_version", "created_by").prefetch_related("tags")
+        if fields is None or "collaborators" in fields:
+            queryset = queryset.prefetch_related(
+                models.Prefetch("collaborators", queryset=ManualCollaborator.objects.select_related("user", "added_by"))
+            )
         
         # Filter conditions:
         # 1. APPROVED manuals (public)
         # 2. User's own manuals (any status)
         # 3. Manuals where user is a collaborator (any status)
-        from django.db.models import Q
-        
-        return queryset.filter(
-            Q(status=Manual.ManualStatus.APPROVED) |  # Public approved manuals
-            Q(created_by=user) |  # User's own manuals
-            Q(collaborators__user=user)  # Manuals where user is collaborator
-        ).distinct()
+        # 2 and 3 come from the user's cached grants while they are few, and
+        # from an EXISTS subquery otherwise (see api.visibility).
+        return queryset.filter(visible_filter(user.pk, grants))
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = manual_etag(self.get_queryset().filter(slug=kwargs[self.lookup_field]), request.user)
+        return not_modified(request, etag) or with_etag(super().retrieve(request, *args, **kwargs), etag)
+
+    @action(detail=False, methods=["get"], url_path="search")
+    def search(self, request):
+        """Full-text search over the manuals visible to the user (?q=...&limit=...)"""
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response([])
+        try:
+            limit = min(max(int(request.query_params.get("limit", 50)), 1), 200)
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        manuals = search_manuals(self.get_queryset(), query, limit)
+        return Response(self.get_serializer(manuals, many=True).data)
+
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        """
+        Stream the visible manuals (or those named by ?slug=a,b) with their full
+        history as an NDJSON archive; ?compression=gzip|zstd compresses it.
+        """
+        compression = request.query_params.get("compression", "none")
+        if compression not in COMPRESSIONS:
+            return Response({"detail": f"compression must be one of {', '.join(COMPRESSIONS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        manuals = self.get_queryset()
+        slugs = [slug for slug in request.query_params.get("slug", "").split(",") if slug]
+        if slugs:
+            manuals = manuals.filter(slug__in=slugs)
+        try:
+            chunks = export_archive(manuals, compression)
+        except ArchiveError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if served_by_asgi(request):
+            chunks = aiterate(chunks)
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[compression])
+        response["Content-Disposition"] = f'attachment; filename="manuals{EXTENSIONS[compression]}"'
+        return response
+
+    @action(detail=False, methods=["post"], url_path="import", permission_classes=[permissions.IsAdminUser])
+    def import_manuals(self, request):
+        """Import an uploaded archive (multipart ``file``); archived users missing here become the importer"""
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"detail": "file is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            counts = import_archive(open_archive(upload.file), default_user=request.user)
+        except ArchiveError as exc:
+            return Response({"detail": f"Invalid archive: {exc}"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(counts, status=status.HTTP_201_CREATED)
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -95,7 +212,7 @@ class ManualViewSet(viewsets.ModelViewSet):
         )
         manual.current_version = version
         manual.save(update_fields=["current_version"])
-        AuditLog.objects.create(manual=manual, version=version, action=AuditLog.Action.CREATE, actor=self.request.user)
+        audit.record(manual=manual, version=version, action=AuditLog.Action.CREATE, actor=self.request.user)
 
     @action(detail=True, methods=["post"], url_path="submit")
     def submit_for_review(self, request, slug=None):
@@ -108,7 +225,7 @@ class ManualViewSet(viewsets.ModelViewSet):
             version=manual.current_version,
             submitted_by=request.user,
         )
-        AuditLog.objects.create(manual=manual, version=manual.current_version, action=AuditLog.Action.SUBMIT, actor=request.user)
+        audit.record(manual=manual, version=manual.current_version, action=AuditLog.Action.SUBMIT, actor=request.user)
         return Response(ReviewRequestSerializer(review).data)
 
 
@@ -123,7 +240,7 @@ class ManualViewSet(viewsets.ModelViewSet):
         manual.current_version = version
         manual.status = Manual.ManualStatus.DRAFT
         manual.save(update_fields=["current_version", "status"])
-        AuditLog.objects.create(manual=manual, version=version, action=AuditLog.Action.ROLLBACK, actor=request.user)
+        audit.record(manual=manual, version=version, action=AuditLog.Action.ROLLBACK, actor=request.user)
         return Response(ManualSerializer(manual).data)
 
     @action(detail=True, methods=["post"], url_path="add-collaborator")
@@ -187,29 +304,181 @@ class ManualViewSet(viewsets.ModelViewSet):
 
 
 class ManualVersionViewSet(viewsets.ModelViewSet):
-    queryset = ManualVersion.objects.select_related("manual", "created_by").prefetch_related("blocks")
+    queryset = ManualVersion.objects.select_related("manual", "created_by").prefetch_related("blocks__payload")
     serializer_class = ManualVersionSerializer
     permission_classes = [permissions.IsAuthenticated, IsAuthorOrCollaboratorOrReadOnly]
+    cursor_ordering = ("-created_at", "id")
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return queryset if self.detail else filter_versions(queryset, self.request.query_params)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = requested_fields(self.request)
+        streamed = self.action in ("retrieve", "preview") and wants_stream(self.request)
+        if (fields is not None and "blocks" not in fields) or self.action in ("published_html", "diff") or streamed:
+            # Sparse list without blocks / HTML snapshot / diff / streamed blocks: skip loading every block payload
+            queryset = queryset.prefetch_related(None)
+        return queryset
 
     def perform_create(self, serializer):
         manual = serializer.validated_data["manual"]
+        base = serializer.validated_data.pop("base_version", None)
+        operations = serializer.validated_data.pop("operations", [])
         next_version = (manual.versions.aggregate(models.Max("version_number")).get("version_number__max") or 0) + 1
-        instance = serializer.save(created_by=self.request.user, version_number=next_version)
-        manual.current_version = instance
-        manual.status = Manual.ManualStatus.DRAFT
-        manual.save(update_fields=["current_version", "status"])
-        AuditLog.objects.create(manual=manual, version=instance, action=AuditLog.Action.UPDATE, actor=self.request.user)
+        with transaction.atomic():
+            instance = serializer.save(created_by=self.request.user, version_number=next_version)
+            metadata = {}
+            if base is not None:
+                # Copy-on-write: only inserted/updated blocks carry new content. Making
+                # the copy current below reindexes the manual with it.
+                instance.copy_blocks_from(base, operations)
+                metadata = {"base_version": base.pk, "operations": len(operations)}
+            manual.current_version = instance
+            manual.status = Manual.ManualStatus.DRAFT
+            manual.save(update_fields=["current_version", "status"])
+            audit.record(manual=manual, version=instance, action=AuditLog.Action.UPDATE, actor=self.request.user, metadata=metadata)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = version_etag(kwargs["pk"])
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        return with_etag(version_response(request, self.get_object(), self.get_serializer_context()), etag)
 
     @action(detail=True, methods=["get"], url_path="preview")
     def preview(self, request, pk=None):
+        etag = version_etag(pk)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        return with_etag(version_response(request, self.get_object()), etag)
+
+    @action(detail=True, methods=["get"], url_path="diff")
+    def diff(self, request, pk=None):
+        """
+        Changes to this version since ?from=<version id>, by default since
+        the manual's previous published version
+        """
         version = self.get_object()
-        return Response(ManualVersionSerializer(version).data)
+        from_id = int_param(request.query_params, "from")
+        if from_id is None:
+            base = previous_published(version)
+        else:
+            base = ManualVersion.objects.filter(pk=from_id, manual_id=version.manual_id).first()
+            if base is None:
+                return Response({"from": "Not a version of this manual."}, status=status.HTTP_400_BAD_REQUEST)
+        return diff_response(request, base, version)
+
+    @action(detail=True, methods=["get"], url_path="html")
+    def published_html(self, request, pk=None):
+        """Serve the rendered HTML snapshot of a published version"""
+        version = self.get_object()
+        if not version.is_published and not version.review_requests.filter(
+            status=ReviewRequest.ReviewStatus.APPROVED
+        ).exists():
+            return Response({"detail": "Version is not published."}, status=status.HTTP_404_NOT_FOUND)
+        if not version.published_html:
+            # Approved before snapshots were rendered on approval. Stamp
+            # updated_at like approve does, so both the HTML and the version
+            # payload ETags move with the new snapshot.
+            version.published_html = render_version(version)
+            version.save(update_fields=["published_html", "updated_at"])
+        etag = quote_etag(f"{version.pk}-{version.updated_at.timestamp()}")
+        last_modified = int(version.updated_at.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(version.published_html, content_type="text/html; charset=utf-8")
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    @action(
+        detail=True, methods=["post"], url_path="reorder",
+        permission_classes=[permissions.IsAuthenticated, CanEditVersionManual],
+    )
+    def reorder(self, request, pk=None):
+        """
+        Apply {"moves": [{"id": block, "after": block or null}, ...]} in order
+        in one transaction. Only moved blocks are written unless their
+        neighbours' orders have no gap left, which renumbers the version.
+        """
+        version = self.get_object()
+        moves = request.data.get("moves", []) if isinstance(request.data, dict) else request.data
+        serializer = BlockMoveSerializer(data=moves, many=True)
+        serializer.is_valid(raise_exception=True)
+        try:
+            reorder = apply_moves(version, serializer.validated_data)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "rebalanced": reorder.rebalanced,
+            "blocks": [{"id": block_id, "order": order} for block_id, order in reorder.orders().items()],
+        })
+
+    @action(
+        detail=True, methods=["post"], url_path="blocks/bulk",
+        permission_classes=[permissions.IsAuthenticated, CanEditVersionManual],
+    )
+    def bulk_save_blocks(self, request, pk=None):
+        """
+        Replace the blocks of this version with the given ordered list.
+        Accepts either a bare list or {"blocks": [...]}; entries without an
+        explicit order take their position in the list.
+        """
+        version = self.get_object()
+        payload = request.data.get("blocks", []) if isinstance(request.data, dict) else request.data
+        serializer = ContentBlockBulkSerializer(data=payload, many=True)
+        serializer.is_valid(raise_exception=True)
+        blocks = [
+            ContentBlock(
+                version=version,
+                order=item.get("order", gapped(index)),
+                type=item["type"],
+                data=item.get("data", {}),
+            )
+            for index, item in enumerate(serializer.validated_data)
+        ]
+        with transaction.atomic():
+            BlockPayload.objects.attach(blocks)
+            ContentBlock.objects.filter(version=version).delete()
+            created = ContentBlock.objects.bulk_create(blocks)
+            # One reindex for the whole save (see api/search.py)
+            schedule_reindex_for_versions([version.pk])
+        return Response(ContentBlockSerializer(created, many=True).data, status=status.HTTP_201_CREATED)
 
 
 class ContentBlockViewSet(viewsets.ModelViewSet):
-    queryset = ContentBlock.objects.select_related("version")
+    queryset = ContentBlock.objects.select_related("version", "payload")
     serializer_class = ContentBlockSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ("id",)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        if wants_stream(request):
+            return stream_list(request, queryset, self.get_serializer())
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    # Blocks have no reindexing signal handlers (see api/search.py)
+    def perform_create(self, serializer):
+        block = serializer.save()
+        schedule_reindex_for_versions([block.version_id])
+
+    def perform_update(self, serializer):
+        previous_version_id = serializer.instance.version_id
+        block = serializer.save()
+        schedule_reindex_for_versions({previous_version_id, block.version_id})
+
+    def perform_destroy(self, instance):
+        version_id = instance.version_id
+        instance.delete()
+        schedule_reindex_for_versions([version_id])
 
 
 class ReviewRequestViewSet(viewsets.ModelViewSet):
@@ -221,14 +490,31 @@ class ReviewRequestViewSet(viewsets.ModelViewSet):
     ).order_by("-submitted_at")
     serializer_class = ReviewRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ("-submitted_at", "id")
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return queryset if self.detail else filter_reviews(queryset, self.request.query_params)
 
     @action(detail=True, methods=["get"], url_path="content")
     def get_content(self, request, pk=None):
         """Get the content blocks for the manual version being reviewed"""
         review = self.get_object()
-        version = review.version
+        etag = version_etag(review.version_id)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        versions = ManualVersion.objects.all()
+        if not wants_stream(request):
+            versions = versions.prefetch_related("blocks__payload")
         # Use the existing ManualVersionSerializer which includes blocks
-        return Response(ManualVersionSerializer(version).data)
+        return with_etag(version_response(request, versions.get(pk=review.version_id)), etag)
+
+    @action(detail=True, methods=["get"], url_path="diff")
+    def diff(self, request, pk=None):
+        """Changes in the version under review since the manual's last published version"""
+        version = self.get_object().version
+        return diff_response(request, previous_published(version), version)
 
     @action(detail=True, methods=["post"], url_path="approve")
     def approve(self, request, pk=None):
@@ -243,10 +529,14 @@ class ReviewRequestViewSet(viewsets.ModelViewSet):
         review.reviewer = request.user
         review.decided_at = timezone.now()
         review.save(update_fields=["status", "reviewer", "decided_at"])
-        manual = review.version.manual
+        version = review.version
+        version.published_html = render_version(version)
+        version.is_published = True
+        version.save(update_fields=["published_html", "is_published", "updated_at"])
+        manual = version.manual
         manual.status = Manual.ManualStatus.APPROVED
         manual.save(update_fields=["status"])
-        AuditLog.objects.create(manual=manual, version=review.version, action=AuditLog.Action.APPROVE, actor=request.user)
+        audit.record(manual=manual, version=review.version, action=AuditLog.Action.APPROVE, actor=request.user)
         return Response(ReviewRequestSerializer(review).data)
 
     @action(detail=True, methods=["post"], url_path="reject")
@@ -267,7 +557,7 @@ class ReviewRequestViewSet(viewsets.ModelViewSet):
         manual = review.version.manual
         manual.status = Manual.ManualStatus.REJECTED
         manual.save(update_fields=["status"])
-        AuditLog.objects.create(manual=manual, version=review.version, action=AuditLog.Action.REJECT, actor=request.user)
+        audit.record(manual=manual, version=review.version, action=AuditLog.Action.REJECT, actor=request.user)
         return Response(ReviewRequestSerializer(review).data)
 
 
@@ -275,3 +565,149 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = AuditLog.objects.select_related("manual", "version", "actor")
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ("-created_at", "id")
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return queryset if self.detail else filter_audit_log(queryset, self.request.query_params)
+
+    @action(detail=False, methods=["get"], url_path=r"manual/(?P<manual_id>[0-9]+)")
+    def for_manual(self, request, manual_id=None):
+        """Audit trail of one manual, newest first (served by the (manual, created_at) index)"""
+        return self.list_entries(self.get_queryset().filter(manual_id=manual_id))
+
+    @action(detail=False, methods=["get"], url_path="mine")
+    def mine(self, request):
+        """The requesting user's actions, newest first (served by the (actor, created_at) index)"""
+        return self.list_entries(self.get_queryset().filter(actor=request.user))
+
+    def list_entries(self, queryset):
+        queryset = self.filter_queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
+
+class AssetViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Content-addressed files for IMAGE/VIDEO blocks. Anyone holding a digest
+    may fetch the file, which never changes, so it is cached as immutable.
+    """
+    queryset = Asset.objects.all()
+    serializer_class = AssetSerializer
+    lookup_field = "digest"
+    lookup_value_regex = "[0-9a-f]{64}"
+
+    def get_permissions(self):
+        if self.action in ("retrieve", "variant"):
+            return [permissions.AllowAny()]
+        return [permissions.IsAuthenticated()]
+
+    def create(self, request, *args, **kwargs):
+        """Store a small file in one request (multipart ``file``)"""
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"file": "This field is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            asset = save(upload, upload.content_type, request.user)
+        except AssetError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(AssetSerializer(asset).data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        asset = self.get_object()
+        return self.immutable_file(request, asset.digest, storage_name(asset.digest), asset.content_type, asset.size)
+
+    @action(detail=True, methods=["get"], url_path=r"(?P<width>[0-9]+)")
+    def variant(self, request, digest=None, width=None):
+        """An image resized to one of ASSET_IMAGE_VARIANTS, rendered now if it isn't yet"""
+        if int(width) not in variant_sizes().values():
+            return Response({"detail": "Unknown variant size."}, status=status.HTTP_404_NOT_FOUND)
+        asset = self.get_object()
+        info = asset.variants.get(width) or generate(asset, [int(width)]).get(width)
+        if info is None:
+            # Not an image Pillow can resize: the original is the only variant
+            return self.immutable_file(request, asset.digest, storage_name(asset.digest), asset.content_type, asset.size)
+        return self.immutable_file(request, f"{asset.digest}-{width}", info["name"], info["content_type"], info["size"])
+
+    @classmethod
+    def immutable_file(cls, request, tag, name, content_type, size):
+        etag = quote_etag(tag)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = cls.file_response(name, content_type, size)
+        response["ETag"] = etag
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+        if not is_allowed_type(content_type):
+            # Stored before types were checked: never render it on this origin
+            response["Content-Disposition"] = f'attachment; filename="{tag}"'
+            response["Content-Security-Policy"] = "sandbox"
+        return response
+
+    @staticmethod
+    def file_response(name, content_type, size):
+        """Hand the file to the front-end server if ASSET_SENDFILE_HEADER is set, else stream it"""
+        header = getattr(settings, "ASSET_SENDFILE_HEADER", None)
+        storage = get_storage()
+        if header == "X-Accel-Redirect":
+            response = HttpResponse(content_type=content_type)
+            response[header] = getattr(settings, "ASSET_ACCEL_REDIRECT_PREFIX", "/protected-assets/") + name
+            return response
+        if header:
+            try:
+                path = storage.path(name)
+            except NotImplementedError:
+                path = None
+            if path is not None:
+                response = HttpResponse(content_type=content_type)
+                response[header] = path
+                return response
+        response = FileResponse(storage.open(name, "rb"), content_type=content_type)
+        response["Content-Length"] = size
+        return response
+
+
+class AssetUploadViewSet(
+    mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+):
+    """
+    Chunked uploads: create with the file's size and type, PUT the bytes in
+    order to ``chunk/`` (Upload-Offset header = bytes sent so far; a GET
+    tells a resuming client where to continue), then POST ``complete/``.
+    """
+    serializer_class = AssetUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return AssetUpload.objects.filter(created_by=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+    def perform_destroy(self, instance):
+        discard_upload(instance)
+
+    @action(detail=True, methods=["put"], url_path="chunk")
+    def chunk(self, request, pk=None):
+        offset = request.headers.get("Upload-Offset", request.query_params.get("offset", ""))
+        if not offset.isdigit():
+            return Response({"detail": "Upload-Offset header is required."}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            upload = self.get_queryset().select_for_update().filter(pk=self.get_object().pk).get()
+            try:
+                received = append_chunk(upload, int(offset), request.stream or io.BytesIO())
+            except UploadOffsetError as exc:
+                return Response({"detail": str(exc), "received": exc.expected}, status=status.HTTP_409_CONFLICT)
+            except AssetError as exc:
+                return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"received": received})
+
+    @action(detail=True, methods=["post"], url_path="complete")
+    def complete(self, request, pk=None):
+        upload = self.get_object()
+        try:
+            asset = complete_upload(upload)
+        except AssetError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(AssetSerializer(asset).data, status=status.HTTP_201_CREATED)
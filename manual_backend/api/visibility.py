@@ -0,0 +1,125 @@
+"""
+Per-user cache of the manuals a user owns or collaborates on.
+
+Approved manuals are visible to everyone and stay a plain status filter in
+SQL, so only each user's private grants are cached. Entries live in the
+Django cache named by ``settings.MANUAL_VISIBILITY_CACHE`` and are dropped by
+the post_save/post_delete handlers below.
+
+The handlers only clear the cache of the process that made the change, so a
+per-process cache (LocMemCache) lags up to MANUAL_VISIBILITY_CACHE_TIMEOUT in
+other workers. Edit permission checks therefore read the database (see
+ManualPermissionResolver.check_edit); point the setting at a shared cache to
+keep reads current too.
+"""
+from typing import FrozenSet, NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Manual, ManualCollaborator
+
+
+CACHE_KEY = "manual-visibility:{user_id}"
+
+# Grants larger than this are matched with subqueries instead of inlined ids,
+# which cost one bound parameter each
+INLINE_GRANTS_LIMIT = 100
+
+
+class ManualGrants(NamedTuple):
+    own: FrozenSet[int]
+    edit: FrozenSet[int]  # collaborator with EDITOR role
+    view: FrozenSet[int]  # collaborator with any role
+
+    @property
+    def visible(self):
+        return self.own | self.view
+
+    @property
+    def editable(self):
+        return self.own | self.edit
+
+
+def get_cache():
+    return caches[getattr(settings, "MANUAL_VISIBILITY_CACHE", "default")]
+
+
+def load_grants(user_id):
+    own = frozenset(Manual.objects.filter(created_by_id=user_id).values_list("id", flat=True))
+    edit, view = set(), set()
+    for manual_id, role in ManualCollaborator.objects.filter(user_id=user_id).values_list("manual_id", "role"):
+        view.add(manual_id)
+        if role == ManualCollaborator.CollaboratorRole.EDITOR:
+            edit.add(manual_id)
+    return ManualGrants(own=own, edit=frozenset(edit), view=frozenset(view))
+
+
+async def aload_grants(user_id):
+    own = frozenset([manual_id async for manual_id in Manual.objects.filter(created_by_id=user_id).values_list("id", flat=True)])
+    edit, view = set(), set()
+    async for manual_id, role in ManualCollaborator.objects.filter(user_id=user_id).values_list("manual_id", "role"):
+        view.add(manual_id)
+        if role == ManualCollaborator.CollaboratorRole.EDITOR:
+            edit.add(manual_id)
+    return ManualGrants(own=own, edit=frozenset(edit), view=frozenset(view))
+
+
+def get_grants(user):
+    """Return the user's cached grants, loading them on a miss"""
+    key = CACHE_KEY.format(user_id=user.pk)
+    cache = get_cache()
+    grants = cache.get(key)
+    if grants is None:
+        grants = load_grants(user.pk)
+        cache.set(key, grants, getattr(settings, "MANUAL_VISIBILITY_CACHE_TIMEOUT", 300))
+    return grants
+
+
+async def aget_grants(user):
+    key = CACHE_KEY.format(user_id=user.pk)
+    cache = get_cache()
+    grants = await cache.aget(key)
+    if grants is None:
+        grants = await aload_grants(user.pk)
+        await cache.aset(key, grants, getattr(settings, "MANUAL_VISIBILITY_CACHE_TIMEOUT", 300))
+    return grants
+
+
+def visible_filter(user_id, grants):
+    """Q for the manuals visible to a user: approved, owned or collaborated on"""
+    approved = Q(status=Manual.ManualStatus.APPROVED)
+    if len(grants.visible) <= INLINE_GRANTS_LIMIT:
+        return approved | Q(pk__in=grants.visible)
+    # Correlated EXISTS on the (manual, user) unique index: no join fans out rows
+    collaborations = ManualCollaborator.objects.filter(manual=OuterRef("pk"), user_id=user_id)
+    return approved | Q(created_by_id=user_id) | Exists(collaborations)
+
+
+def invalidate(user_ids):
+    """
+    Drop cached grants now and again on commit, so a reader that refilled the
+    cache from pre-commit data doesn't keep it.
+    """
+    keys = [CACHE_KEY.format(user_id=user_id) for user_id in set(user_ids) if user_id is not None]
+    if not keys:
+        return
+    get_cache().delete_many(keys)
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+@receiver(post_save, sender=Manual)
+@receiver(post_delete, sender=Manual)
+def invalidate_manual_owner(sender, instance, **kwargs):
+    # Status changes need no invalidation: approved manuals are filtered in SQL
+    invalidate([instance.created_by_id, getattr(instance, "_loaded_created_by_id", None)])
+
+
+@receiver(post_save, sender=ManualCollaborator)
+@receiver(post_delete, sender=ManualCollaborator)
+def invalidate_collaborator(sender, instance, **kwargs):
+    invalidate([instance.user_id])
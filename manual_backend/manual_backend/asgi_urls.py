@@ -0,0 +1,18 @@
+"""
+URL configuration for the ASGI app: the async read views from api.async_views
+in front of the regular routes in manual_backend.urls.
+"""
+from django.urls import re_path
+
+from api import async_views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    re_path(r'^api/manuals/$', async_views.ManualListView.as_view()),
+    # "search", "export" and "import" are list actions on the DRF router, not slugs
+    re_path(r'^api/manuals/(?!(?:search|export|import)/)(?P<slug>[^/.]+)/$', async_views.ManualDetailView.as_view()),
+    re_path(r'^api/versions/(?P<pk>[0-9]+)/preview/$', async_views.VersionPreviewView.as_view()),
+    re_path(r'^api/reviews/(?P<pk>[0-9]+)/content/$', async_views.ReviewContentView.as_view()),
+    re_path(r'^api/audit/$', async_views.AuditLogListView.as_view()),
+] + sync_urlpatterns
@@ -0,0 +1,84 @@
+"""
+Environment-driven database configuration.
+
+DB_ENGINE picks the profile:
+
+sqlite (default)
+    DB_NAME          database file (default: BASE_DIR / db.sqlite3)
+    DB_BUSY_TIMEOUT  seconds to wait on a locked database (default: 20)
+    DB_SQLITE_TUNED  "0" falls back to Django's stock SQLite settings
+                     (rollback journal, deferred transactions), for comparison
+
+postgres
+    DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+    DB_CONN_MAX_AGE  seconds to keep persistent connections (default: 60)
+    DB_POOL          "1" uses psycopg's connection pool instead of persistent
+                     connections (requires psycopg[pool])
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE  pool bounds (default: 2 / 10)
+"""
+import os
+
+
+# Applied on every new SQLite connection. WAL lets readers proceed while a
+# writer commits; NORMAL sync is safe under WAL and avoids an fsync per commit.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;"
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA temp_store=MEMORY;"
+    "PRAGMA cache_size=-20000;"
+    "PRAGMA mmap_size=134217728;"
+)
+
+
+def env_flag(env, name, default):
+    return env.get(name, default).lower() in ("1", "true", "yes", "on")
+
+
+def sqlite_config(env, base_dir):
+    config = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": env.get("DB_NAME") or base_dir / "db.sqlite3",
+        "OPTIONS": {
+            "timeout": float(env.get("DB_BUSY_TIMEOUT", "20")),
+        },
+    }
+    if env_flag(env, "DB_SQLITE_TUNED", "1"):
+        config["OPTIONS"].update({
+            "init_command": SQLITE_PRAGMAS,
+            # Take the write lock at BEGIN so concurrent writers queue on
+            # busy_timeout instead of failing with "database is locked"
+            "transaction_mode": "IMMEDIATE",
+        })
+    return config
+
+
+def postgres_config(env):
+    config = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": env.get("DB_NAME", "manual_backend"),
+        "USER": env.get("DB_USER", ""),
+        "PASSWORD": env.get("DB_PASSWORD", ""),
+        "HOST": env.get("DB_HOST", "localhost"),
+        "PORT": env.get("DB_PORT", "5432"),
+        "CONN_MAX_AGE": int(env.get("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
+    }
+    if env_flag(env, "DB_POOL", "0"):
+        # Pooling replaces persistent connections; Django rejects both at once
+        config["CONN_MAX_AGE"] = 0
+        config["OPTIONS"]["pool"] = {
+            "min_size": int(env.get("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(env.get("DB_POOL_MAX_SIZE", "10")),
+        }
+    return config
+
+
+def database_config(base_dir, env=None):
+    env = os.environ if env is None else env
+    engine = env.get("DB_ENGINE", "sqlite").lower()
+    if engine in ("postgres", "postgresql"):
+        return postgres_config(env)
+    if engine == "sqlite":
+        return sqlite_config(env, base_dir)
+    raise ValueError(f"Unsupported DB_ENGINE {engine!r}; expected 'sqlite' or 'postgres'.")
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.InstrumentationMiddleware',  # Server-Timing; inactive unless REQUEST_INSTRUMENTATION
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -53,6 +56,7 @@ MIDDLEWARE = [
     'accounts.middleware.SessionTimeoutMiddleware',  # Custom session timeout middleware
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.AuditBufferMiddleware',  # Batches the request's audit entries
 ]
 
 
@@ -72,6 +76,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Cursor pagination is opt-in per request (?cursor= / ?page_size=), see api.pagination
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.OptionalCursorPagination',
 }
 
 # Enable cross-site cookies for local dev (Next.js on 3000)
@@ -81,12 +87,17 @@ CSRF_COOKIE_SAMESITE = 'Lax'
 
 # Session Timeout Settings
 SESSION_COOKIE_AGE = 1800  # 30 minutes in seconds
-SESSION_SAVE_EVERY_REQUEST = True  # Extend session on every request
+# Sessions are saved only when modified; SessionTimeoutMiddleware refreshes the
+# activity timestamp (and so the expiry) at most once per write interval
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_ACTIVITY_WRITE_INTERVAL = 60  # seconds
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True  # Session expires when browser closes
 SESSION_COOKIE_HTTPONLY = True  # Prevent JavaScript access to session cookie
 SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
 
 ROOT_URLCONF = 'manual_backend.urls'
+# Used by manual_backend.asgi: async read views in front of ROOT_URLCONF
+ASGI_URLCONF = 'manual_backend.asgi_urls'
 
 TEMPLATES = [
     {
@@ -108,14 +119,84 @@ WSGI_APPLICATION = 'manual_backend.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Profile is chosen by DB_ENGINE (sqlite/postgres), see manual_backend/database.py
 
 DATABASES = {
+    'default': database_config(BASE_DIR),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process: with several workers, point this at a shared
+# backend (Redis, Memcached) so visibility invalidations reach every worker.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Per-user manual visibility grants (see api/visibility.py)
+# Invalidation only reaches the local process' cache: with several workers use a
+# shared backend, or non-approved visibility lags by up to the timeout. Edit
+# permission checks always read the database.
+MANUAL_VISIBILITY_CACHE = 'default'
+MANUAL_VISIBILITY_CACHE_TIMEOUT = 300  # seconds
+
+# Version and block list JSON is streamed (see api/streaming.py)
+STREAMING_BLOCK_CHUNK_SIZE = 500  # blocks fetched per database round trip
+STREAMING_BUFFER_SIZE = 64 * 1024  # bytes per write
+
+# Per-request SQL/serializer/view timing in a Server-Timing header, and a JSON
+# log line on the api.instrumentation logger for requests slower than
+# REQUEST_SLOW_MS (see api/instrumentation.py)
+REQUEST_INSTRUMENTATION = False
+REQUEST_SLOW_MS = 500
+
+# Version diffs (see api/diff.py), keyed by content so they never go stale
+VERSION_DIFF_CACHE = 'default'
+VERSION_DIFF_CACHE_TIMEOUT = 24 * 60 * 60  # seconds
+
+# Files behind IMAGE/VIDEO blocks, stored once per SHA-256 (see api/assets.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'assets': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': BASE_DIR / 'assets', 'allow_overwrite': True},
+    },
+}
+ASSET_STORAGE = 'assets'
+ASSET_UPLOAD_DIR = BASE_DIR / 'asset_uploads'  # part files of chunked uploads
+ASSET_MAX_SIZE = 200 * 1024 * 1024  # bytes
+# 'X-Sendfile' (Apache) or 'X-Accel-Redirect' (nginx, internal location at
+# ASSET_ACCEL_REDIRECT_PREFIX) to let the front-end server send asset files
+ASSET_SENDFILE_HEADER = None
+ASSET_ACCEL_REDIRECT_PREFIX = '/protected-assets/'
+# Resized image variants, name -> maximum width in pixels (see api/derivatives.py)
+ASSET_IMAGE_VARIANTS = {'thumbnail': 320, 'medium': 1024, 'full': 2048}
+ASSET_IMAGE_QUALITY = 80  # WebP/JPEG quality of variants
+ASSET_DERIVATIVE_WORKERS = 2  # rendering processes; 0 renders inline after commit
+
+# NDJSON manual archives (see api/archive.py)
+MANUAL_ARCHIVE_BATCH_SIZE = 200  # manuals exported per batch of related-row queries
+MANUAL_ARCHIVE_FLUSH_SIZE = 5000  # records buffered per bulk insert on import
+
+# Audit entries are written in batches after commit (see api/audit.py).
+# 'api.audit.ThreadedAuditSink' moves the writes off the request thread.
+AUDIT_SINK = 'api.audit.InlineAuditSink'
+AUDIT_BATCH_SIZE = 500  # entries per bulk insert
+AUDIT_FLUSH_INTERVAL = 0.5  # seconds the threaded sink waits to fill a batch
+
+# Days each audit action stays in the database before `manage.py audit_archive`
+# moves it to a monthly archive file; "default" covers unlisted actions and
+# None keeps rows forever (see api/retention.py)
+AUDIT_RETENTION_DAYS = {
+    'default': 365,
+}
+AUDIT_ARCHIVE_DIR = BASE_DIR / 'audit_archive'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
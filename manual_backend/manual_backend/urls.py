@@ -11,6 +11,8 @@ from api.views import (
     ContentBlockViewSet,
     ReviewRequestViewSet,
     AuditLogViewSet,
+    AssetViewSet,
+    AssetUploadViewSet,
 )
 
 router = DefaultRouter()
@@ -21,6 +23,8 @@ router.register(r'versions', ManualVersionViewSet)
 router.register(r'blocks', ContentBlockViewSet)
 router.register(r'reviews', ReviewRequestViewSet)
 router.register(r'audit', AuditLogViewSet, basename='audit')
+router.register(r'assets/uploads', AssetUploadViewSet, basename='asset-upload')
+router.register(r'assets', AssetViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),